@@ -14,15 +14,13 @@
 
 from __future__ import absolute_import, unicode_literals
 
-import errno
 import logging
-import os
+import tempfile
+import uuid
 from collections import OrderedDict, defaultdict
 from datetime import date
 from decimal import Decimal
 
-import requests
-from PyPDF2 import PdfFileReader, PdfFileMerger
 from dal import autocomplete
 from django.contrib.admin.utils import model_ngettext
 from django_fsm import TransitionNotAllowed
@@ -36,20 +34,21 @@ from django.contrib.admin import (
 from django.contrib.admin.actions import delete_selected as delete_selected_
 from django.contrib.admin.models import LogEntry, CHANGE
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ValidationError
-from django.db.models import BLANK_CHOICE_DASH, F, Value, fields
-from django.db.models.functions import ExtractYear, ExtractMonth, Concat
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import BLANK_CHOICE_DASH, Count, F, Sum, Value, fields
+from django.db.models.functions import Coalesce, ExtractYear, ExtractMonth, Concat
 from django.forms import ChoiceField
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponseRedirect
 from django.shortcuts import render
-from django.urls import reverse
+from django.urls import path, reverse
 from django.utils import timezone
 from django.utils.encoding import force_str
-from django.utils.html import escape, conditional_escape
+from django.utils.html import escape, conditional_escape, format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from silver.documents_generator import DocumentsGenerator
+from silver.documents_transitions import bulk_transition
 from silver.models import (
     Plan, MeteredFeature, Subscription, Customer, Provider,
     MeteredFeatureUnitsLog, Invoice, DocumentEntry,
@@ -58,6 +57,11 @@ from silver.models import (
 )
 from silver.models.bonuses import Bonus
 from silver.payment_processors.mixins import PaymentProcessorTypes
+from silver.pdf_export import (
+    PDF_EXPORT_MAX_DOCUMENTS, get_documents_export_storage, get_export_name, get_export_report,
+    merge_documents_pdfs
+)
+from silver.tasks import export_documents_pdfs
 from silver.utils.admin import get_admin_url
 from silver.utils.international import currencies
 from silver.utils.payments import get_payment_url
@@ -314,7 +318,7 @@ class DiscountFilter(SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value():
-            return Discount.objects.get(pk=self.value()).matching_subscriptions() & queryset
+            return queryset.filter(matched_discounts=self.value())
 
         return queryset
 
@@ -328,7 +332,7 @@ class BonusFilter(SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value():
-            return Bonus.objects.get(pk=self.value()).matching_subscriptions() & queryset
+            return queryset.filter(matched_bonuses=self.value())
 
         return queryset
 
@@ -535,8 +539,10 @@ class ProviderAdmin(LiveModelAdmin):
         unpaid_documents = documents.filter(state=BillingDocumentBase.STATES.DRAFT)
         draft_totals = totals[klass_name_plural]['draft'] = defaultdict(Decimal)
 
-        for doc in unpaid_documents:
-            draft_totals[doc.currency] += doc.total
+        for currency, total in unpaid_documents.order_by().values_list('currency').annotate(
+            total=Sum(F('_total_before_tax') + F('_tax_value'))
+        ):
+            draft_totals[currency] += total
 
         totals[klass_name_plural]['currencies'] = documents_currencies
 
@@ -750,6 +756,39 @@ class DueDateFilter(SimpleListFilter):
         return queryset
 
 
+class ArchivedFilter(SimpleListFilter):
+    title = _('archived')
+    parameter_name = 'archived'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', _('Archived')),
+            ('all', _('All')),
+        )
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': _('Not archived'),
+        }
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # Archived documents are left out unless explicitly asked for
+        if self.value() == 'yes':
+            return queryset.cold()
+        if self.value() == 'all':
+            return queryset
+
+        return queryset.hot()
+
+
 class InvoiceFilter(SimpleListFilter):
     title = _('invoice')
     parameter_name = 'invoice'
@@ -848,8 +887,12 @@ class DiscountAdmin(ModelAdmin):
         ),
     ]
 
+    def get_queryset(self, request):
+        return super(DiscountAdmin, self).get_queryset(request) \
+            .annotate(matched_subscriptions_count=Count('matched_subscriptions'))
+
     def get_matching_subscriptions(self, discount):
-        count = discount.matching_subscriptions().count()
+        count = discount.matched_subscriptions_count
 
         return mark_safe(
             f'<a href="{get_admin_url(Subscription, anchored=False)}?discount={discount.id}">'
@@ -858,6 +901,7 @@ class DiscountAdmin(ModelAdmin):
         )
 
     get_matching_subscriptions.short_description = "Matching Subscriptions"
+    get_matching_subscriptions.admin_order_field = "matched_subscriptions_count"
 
     def get_amount_description(self, discount):
         return discount.amount_description
@@ -919,8 +963,12 @@ class BonusAdmin(ModelAdmin):
         ),
     ]
 
+    def get_queryset(self, request):
+        return super(BonusAdmin, self).get_queryset(request) \
+            .annotate(matched_subscriptions_count=Count('matched_subscriptions'))
+
     def get_matching_subscriptions(self, bonus):
-        count = bonus.matching_subscriptions().count()
+        count = bonus.matched_subscriptions_count
 
         return mark_safe(
             f'<a href="{get_admin_url(Subscription, anchored=False)}?bonus={bonus.id}">'
@@ -929,6 +977,7 @@ class BonusAdmin(ModelAdmin):
         )
 
     get_matching_subscriptions.short_description = "Matching Subscriptions"
+    get_matching_subscriptions.admin_order_field = "matched_subscriptions_count"
 
     def get_amount_description(self, bonus):
         return bonus.amount_description
@@ -942,7 +991,8 @@ class BillingDocumentAdmin(ModelAdmin):
                     'cancel_date', tax, 'total', 'transactions', 'is_storno',
                     'get_related_document']
 
-    list_filter = ('provider__company', 'state', 'customer', DueDateFilter, 'is_storno')
+    list_filter = ('provider__company', 'state', 'customer', DueDateFilter, 'is_storno',
+                   ArchivedFilter)
 
     common_fields = ['company', 'address_1', 'address_2', 'city',
                      'country', 'zip_code', 'state', 'email']
@@ -1046,11 +1096,44 @@ class BillingDocumentAdmin(ModelAdmin):
             self.message_user(request, 'Illegal action.', level=messages.ERROR)
             return
 
+        results = self._call_method_on_queryset(request, method, queryset, action)
+
+        self._message_results(request, results, action, readable_action, readable_past_action)
+
+    def perform_transition(self, request, queryset, transition, readable_past_action=None):
+        """
+        Issues, pays or cancels the selected documents in bulk (see `bulk_transition`).
+        """
+
+        transitioned_documents, errors = bulk_transition(
+            list(queryset.values_list('pk', flat=True)), transition
+        )
+
+        content_type_id = ContentType.objects.get_for_model(self._model).pk
+        LogEntry.objects.bulk_create([
+            LogEntry(user_id=request.user.id, content_type_id=content_type_id,
+                     object_id=str(document.id), object_repr=force_str(document)[:200],
+                     action_flag=CHANGE,
+                     change_message='{action} action initiated by user.'.format(
+                         action=transition.capitalize()
+                     ))
+            for document in transitioned_documents
+        ])
+
+        results = {document: {'success': True, 'result': None}
+                   for document in transitioned_documents}
+        results.update({document: {'success': False, 'result': error}
+                        for document, error in errors.items()})
+
+        self._message_results(request, results, transition,
+                              readable_past_action=readable_past_action)
+
+    def _message_results(self, request, results, action,
+                         readable_action=None, readable_past_action=None):
         readable_action = readable_action or action.replace('_', ' ').strip()
         readable_past_action = (readable_past_action if readable_past_action else
                                 "executed {action}".format(action=action))
 
-        results = self._call_method_on_queryset(request, method, queryset, action)
         error_results = {document: result for document, result in results.items()
                          if not result['success']}
         success_results = {document: result for document, result in results.items()
@@ -1091,6 +1174,32 @@ class BillingDocumentAdmin(ModelAdmin):
         if success_message:
             self.message_user(request, mark_safe(success_message))
 
+    def _mark_pdfs_for_generation(self, request, queryset):
+        documents = list(queryset.filter(pdf__isnull=False))
+        skipped_count = queryset.count() - len(documents)
+
+        queryset.mark_pdfs_for_generation()
+
+        content_type_id = ContentType.objects.get_for_model(self._model).pk
+        LogEntry.objects.bulk_create([
+            LogEntry(user_id=request.user.id, content_type_id=content_type_id,
+                     object_id=str(document.id), object_repr=force_str(document)[:200],
+                     action_flag=CHANGE,
+                     change_message='Mark for generation action initiated by user.')
+            for document in documents
+        ])
+
+        model_name_plural = self._model_name.lower() + "s"
+        if documents:
+            self.message_user(request, 'Successfully marked {count} {documents} for PDF '
+                                       'generation.'.format(count=len(documents),
+                                                            documents=model_name_plural))
+        if skipped_count:
+            self.message_user(request, "Couldn't mark {count} {documents} for PDF generation, "
+                                       "because they have no PDF.".format(
+                                           count=skipped_count, documents=model_name_plural
+                                       ), level=messages.WARNING)
+
     def has_delete_permission(self, request, obj=None):
         if request.user.is_superuser:
             return True
@@ -1106,7 +1215,7 @@ class BillingDocumentAdmin(ModelAdmin):
     def total(self, obj):
         return '{:.2f} {currency}'.format(obj.total, currency=obj.currency)
 
-    total.admin_order_field = '_total'
+    total.admin_order_field = Coalesce('_total', F('_total_before_tax') + F('_tax_value'))
 
     def transactions(self, obj):
         if obj.transaction_xe_rate:
@@ -1125,71 +1234,93 @@ class BillingDocumentAdmin(ModelAdmin):
     transactions.allow_tags = True
     transactions.admin_order_field = '_total_in_transaction_currency'
 
-    def _download_pdf(self, url, base_path):
-        local_file_path = os.path.join(base_path, 'billing-temp-document.pdf')
-        response = requests.get(url)
-        response.encoding = 'utf-8'
-
-        with open(local_file_path, 'wb') as out_file:
-            content = response.content
-            pdf_header_pos = content.find(b'%PDF-')
-            if pdf_header_pos > 0:
-                content = content[pdf_header_pos:]
-            out_file.write(content)
-            out_file.flush()
-
-        return local_file_path
-
     def download_selected_documents(self, request, queryset):
-        # NOTE (important): this works only if the pdf is not stored on local
-        # disk as it is fetched via HTTP
         now = timezone.now()
 
-        queryset = queryset.filter(
+        documents = queryset.filter(
             state__in=[BillingDocumentBase.STATES.ISSUED,
                        BillingDocumentBase.STATES.CANCELED,
-                       BillingDocumentBase.STATES.PAID]
+                       BillingDocumentBase.STATES.PAID],
+            pdf__pdf_file__isnull=False
+        ).exclude(pdf__pdf_file='').select_related('pdf')
+        filename = 'Billing-Documents-{now}.pdf'.format(now=now.strftime('%Y-%m-%d-%H%M%S'))
+
+        documents_ids = list(documents.values_list('id', flat=True))
+        if len(documents_ids) > PDF_EXPORT_MAX_DOCUMENTS:
+            # Large selections are merged in the background, into the PDFs' storage. The storage
+            # may save the PDF under another name, so the link leads to the export's report.
+            export_id = uuid.uuid4().hex
+            name = get_export_name('{uuid}/{filename}'.format(uuid=export_id, filename=filename))
+            export_documents_pdfs.delay(documents_ids, name, export_id)
+
+            self.message_user(request, format_html(
+                'The {count} documents are being merged in the background. The PDF will be '
+                'available <a href="{url}">here</a>.',
+                count=len(documents_ids), url=reverse(
+                    'admin:%s_%s_export' % self._get_url_info(), args=[export_id]
+                )
+            ))
+            return
+
+        output_file = tempfile.TemporaryFile()
+        try:
+            merged_documents, errors = merge_documents_pdfs(documents, output_file)
+        except Exception:
+            output_file.close()
+            raise
+
+        logger.debug('Admin aggregate PDF generation: %s', {
+            'merged': len(merged_documents),
+            'failed': [document.series_number for document in errors]
+        })
+        self._warn_about_left_out_documents(
+            request, [document.series_number for document in errors]
         )
 
-        base_path = '/tmp'
-        merger = PdfFileMerger()
-        for document in queryset:
-            if document.pdf:
-                local_file_path = self._download_pdf(document.pdf.url, base_path)
-                try:
-                    reader = PdfFileReader(open(local_file_path, 'rb'))
-                    merger.append(reader)
-                    logging_ctx = {
-                        'number': document.series_number,
-                        'status': 'ok'
-                    }
-                except Exception as e:
-                    logging_ctx = {
-                        'number': document.series_number,
-                        'status': 'failed',
-                        'error': e
-                    }
-
-                logger.debug('Admin aggregate PDF generation: %s', logging_ctx)
-
-                try:
-                    os.remove(local_file_path)
-                except OSError as e:
-                    if e.errno != errno.ENOENT:
-                        raise
-
-        response = HttpResponse(content_type='application/pdf')
-        filename = 'Billing-Documents-{now}.pdf'.format(now=now)
-        content_disposition = 'attachment; filename="{fn}'.format(fn=filename)
-        response['Content-Disposition'] = content_disposition
-
-        merger.write(response)
-        merger.close()
-
-        return response
+        output_file.seek(0)
+        return FileResponse(output_file, as_attachment=True, filename=filename,
+                            content_type='application/pdf')
 
     download_selected_documents.short_description = 'Download selected documents'
 
+    def _warn_about_left_out_documents(self, request, series_numbers):
+        if series_numbers:
+            self.message_user(request, "The PDFs of these documents couldn't be merged and were "
+                                       "left out: {documents}.".format(
+                                           documents=', '.join(series_numbers)
+                                       ), level=messages.WARNING)
+
+    def _get_url_info(self):
+        return self.model._meta.app_label, self.model._meta.model_name
+
+    def get_urls(self):
+        return [
+            path('exports/<str:export_id>/', self.admin_site.admin_view(self.export_view),
+                 name='%s_%s_export' % self._get_url_info()),
+        ] + super(BillingDocumentAdmin, self).get_urls()
+
+    def export_view(self, request, export_id):
+        """
+        Links to the PDF merged in the background by the "Download selected documents" action,
+        once it's saved, and lists the documents which were left out.
+        """
+
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        report = get_export_report(export_id)
+        if report:
+            self.message_user(request, format_html(
+                'The merged PDF is available <a href="{url}">here</a>.',
+                url=get_documents_export_storage().url(report['name'])
+            ))
+            self._warn_about_left_out_documents(request, report['left_out'])
+        else:
+            self.message_user(request, 'The documents are still being merged. Please try again '
+                                       'later.', level=messages.WARNING)
+
+        return HttpResponseRedirect(reverse('admin:%s_%s_changelist' % self._get_url_info()))
+
     def get_related_document(self, obj):
         return obj.related_document.admin_change_url if obj.related_document else None
 
@@ -1224,17 +1355,17 @@ class InvoiceAdmin(BillingDocumentAdmin):
     actions = BillingDocumentAdmin.actions + ['create_storno']
 
     def issue(self, request, queryset):
-        self.perform_action(request, queryset, 'issue', readable_past_action='issued')
+        self.perform_transition(request, queryset, 'issue', readable_past_action='issued')
 
     issue.short_description = 'Issue the selected invoice(s)'
 
     def pay(self, request, queryset):
-        self.perform_action(request, queryset, 'pay', readable_past_action='paid')
+        self.perform_transition(request, queryset, 'pay', readable_past_action='paid')
 
     pay.short_description = 'Pay the selected invoice(s)'
 
     def cancel(self, request, queryset):
-        self.perform_action(request, queryset, 'cancel', readable_past_action='canceled')
+        self.perform_transition(request, queryset, 'cancel', readable_past_action='canceled')
 
     cancel.short_description = 'Cancel the selected invoice(s)'
 
@@ -1252,8 +1383,7 @@ class InvoiceAdmin(BillingDocumentAdmin):
     clone.short_description = 'Clone the selected invoice(s) into draft'
 
     def mark_pdf_for_generation(self, request, queryset):
-        self.perform_action(request, queryset, 'mark_for_generation',
-                            readable_past_action='marked for generation')
+        self._mark_pdfs_for_generation(request, queryset)
 
     mark_pdf_for_generation.short_description = 'Mark the selected invoice(s) for PDF generation'
 
@@ -1289,7 +1419,7 @@ class ProformaAdmin(BillingDocumentAdmin):
     actions = BillingDocumentAdmin.actions + ['create_invoice']
 
     def issue(self, request, queryset):
-        self.perform_action(request, queryset, 'issue')
+        self.perform_transition(request, queryset, 'issue')
 
     issue.short_description = 'Issue the selected proforma(s)'
 
@@ -1299,12 +1429,12 @@ class ProformaAdmin(BillingDocumentAdmin):
     create_invoice.short_description = 'Create invoice from proforma(s)'
 
     def pay(self, request, queryset):
-        self.perform_action(request, queryset, 'pay')
+        self.perform_transition(request, queryset, 'pay')
 
     pay.short_description = 'Pay the selected proforma(s)'
 
     def cancel(self, request, queryset):
-        self.perform_action(request, queryset, 'cancel')
+        self.perform_transition(request, queryset, 'cancel')
 
     cancel.short_description = 'Cancel the selected proforma(s)'
 
@@ -1314,7 +1444,7 @@ class ProformaAdmin(BillingDocumentAdmin):
     clone.short_description = 'Clone the selected proforma(s) into draft'
 
     def mark_pdf_for_generation(self, request, queryset):
-        self.perform_action(request, queryset, 'mark_for_generation')
+        self._mark_pdfs_for_generation(request, queryset)
 
     mark_pdf_for_generation.short_description = 'Mark the selected proforma(s) for PDF generation'
 
@@ -119,12 +119,15 @@ class BillingDocumentFilter(FilterSet):
     provider_company = CharFilter(field_name='provider__company',
                                   lookup_expr='icontains')
     issue_date = DateFilter(field_name='issue_date', lookup_expr='iexact')
+    min_issue_date = DateFilter(field_name='issue_date', lookup_expr='gte')
+    max_issue_date = DateFilter(field_name='issue_date', lookup_expr='lte')
     due_date = DateFilter(field_name='due_date', lookup_expr='iexact')
     paid_date = DateFilter(field_name='due_date', lookup_expr='iexact')
     cancel_date = DateFilter(field_name='cancel_date', lookup_expr='iexact')
     currency = MultipleCharFilter(field_name='currency')
     sales_tax_name = MultipleCharFilter(field_name='sales_tax_name')
     is_overdue = BooleanFilter(field_name='overdue', method='filter_is_overdue')
+    archived = BooleanFilter(field_name='archived')
 
     def filter_is_overdue(self, queryset, _, value):
         if value:
@@ -134,9 +137,10 @@ class BillingDocumentFilter(FilterSet):
     class Meta:
         model = BillingDocumentBase
         fields = ['id', 'state', 'number', 'customer_name', 'customer_company',
-                  'provider_name', 'provider_company', 'issue_date', 'due_date',
+                  'provider_name', 'provider_company', 'issue_date', 'min_issue_date',
+                  'max_issue_date', 'due_date',
                   'paid_date', 'cancel_date', 'currency', 'sales_tax_name',
-                  'is_overdue']
+                  'is_overdue', 'archived']
 
 
 class BonusFilter(FilterSet):
@@ -107,7 +107,9 @@ class DocumentSerializer(serializers.HyperlinkedModelSerializer):
                   'customer', 'due_date', 'issue_date', 'paid_date',
                   'cancel_date', 'sales_tax_name', 'sales_tax_percent',
                   'transaction_currency', 'currency', 'state', 'total',
-                  'total_in_transaction_currency', 'pdf_url', 'transactions')
+                  'total_in_transaction_currency', 'amount_paid_in_transaction_currency',
+                  'amount_pending_in_transaction_currency',
+                  'amount_to_be_charged_in_transaction_currency', 'pdf_url', 'transactions')
         read_only_fields = fields
 
 
@@ -126,6 +128,15 @@ class InvoiceSerializer(AutoCleanSerializerMixin,
     total = serializers.DecimalField(
         max_digits=None, decimal_places=2, coerce_to_string=True, read_only=True
     )
+    amount_paid_in_transaction_currency = serializers.DecimalField(
+        max_digits=None, decimal_places=2, coerce_to_string=True, read_only=True
+    )
+    amount_pending_in_transaction_currency = serializers.DecimalField(
+        max_digits=None, decimal_places=2, coerce_to_string=True, read_only=True
+    )
+    amount_to_be_charged_in_transaction_currency = serializers.DecimalField(
+        max_digits=None, decimal_places=2, coerce_to_string=True, read_only=True
+    )
 
     class Meta:
         model = Invoice
@@ -135,8 +146,12 @@ class InvoiceSerializer(AutoCleanSerializerMixin,
                   'sales_tax_percent', 'currency', 'transaction_currency',
                   'transaction_xe_rate', 'transaction_xe_date', 'state', 'proforma',
                   'invoice_entries', 'total', 'total_in_transaction_currency',
-                  'pdf_url', 'transactions')
-        read_only_fields = ('total', 'total_in_transaction_currency')
+                  'amount_paid_in_transaction_currency', 'amount_pending_in_transaction_currency',
+                  'amount_to_be_charged_in_transaction_currency', 'pdf_url', 'transactions')
+        read_only_fields = ('total', 'total_in_transaction_currency',
+                            'amount_paid_in_transaction_currency',
+                            'amount_pending_in_transaction_currency',
+                            'amount_to_be_charged_in_transaction_currency')
         extra_kwargs = {
             'transaction_currency': {'required': False},
             'number': {'required': False},
@@ -211,9 +226,13 @@ class ProformaSerializer(AutoCleanSerializerMixin,
                   'sales_tax_percent', 'currency', 'transaction_currency',
                   'transaction_xe_rate', 'transaction_xe_date', 'state', 'invoice',
                   'proforma_entries', 'total', 'total_in_transaction_currency',
-                  'pdf_url', 'transactions')
+                  'amount_paid_in_transaction_currency', 'amount_pending_in_transaction_currency',
+                  'amount_to_be_charged_in_transaction_currency', 'pdf_url', 'transactions')
         read_only_fields = ('archived_provider', 'archived_customer', 'total',
-                            'total_in_transaction_currency')
+                            'total_in_transaction_currency',
+                            'amount_paid_in_transaction_currency',
+                            'amount_pending_in_transaction_currency',
+                            'amount_to_be_charged_in_transaction_currency')
         extra_kwargs = {
             'transaction_currency': {'required': False},
             'number': {'required': False},
@@ -119,5 +119,9 @@ urlpatterns = [
             documents_views.PDFRetrieve.as_view(),
             name='pdf'),
     re_path(r'^documents/$',
-            documents_views.DocumentList.as_view(), name='document-list')
+            documents_views.DocumentList.as_view(), name='document-list'),
+    re_path(r'^documents/state/$',
+            documents_views.DocumentsStateHandler.as_view(), name='documents-state'),
+    re_path(r'^documents/pdfs/$',
+            documents_views.DocumentsPDFArchive.as_view(), name='documents-pdfs')
 ]
@@ -31,6 +31,8 @@ class BonusList(generics.ListAPIView):
 
     def get_queryset(self):
         customer_pk = self.kwargs.get('customer_pk', None)
-        queryset = Bonus.for_customer(Customer(pk=customer_pk))
+        queryset = Bonus.for_customer(Customer(pk=customer_pk)) \
+            .select_related('product_code') \
+            .prefetch_related('filter_product_codes')
 
         return queryset.order_by('start_date').distinct()
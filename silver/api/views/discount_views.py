@@ -31,6 +31,8 @@ class DiscountList(generics.ListAPIView):
 
     def get_queryset(self):
         customer_pk = self.kwargs.get('customer_pk', None)
-        queryset = Discount.for_customer(Customer(pk=customer_pk))
+        queryset = Discount.for_customer(Customer(pk=customer_pk)) \
+            .select_related('product_code') \
+            .prefetch_related('filter_product_codes')
 
         return queryset.order_by('start_date').distinct()
@@ -19,7 +19,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 import django
 
 from django.db.models import Q
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
 
 from rest_framework import generics, permissions, filters, status
 from rest_framework.generics import get_object_or_404, ListAPIView
@@ -30,7 +31,10 @@ from silver.api.filters import InvoiceFilter, ProformaFilter, BillingDocumentFil
 from silver.api.serializers.documents_serializers import (
     InvoiceSerializer, DocumentEntrySerializer, ProformaSerializer, DocumentSerializer
 )
+from silver.documents_transitions import bulk_transition
 from silver.models import Invoice, BillingDocumentBase, DocumentEntry, Proforma, PDF
+from silver.pdf_export import stream_documents_pdfs_zip
+from silver.pdf_rendering import get_up_to_date_pdf
 
 
 class InvoiceListCreate(generics.ListCreateAPIView):
@@ -38,7 +42,8 @@ class InvoiceListCreate(generics.ListCreateAPIView):
     serializer_class = InvoiceSerializer
     queryset = Invoice.objects.all()\
         .select_related('related_document')\
-        .prefetch_related('invoice_transactions')
+        .prefetch_related('invoice_transactions')\
+        .with_transactions_amounts()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = InvoiceFilter
 
@@ -46,7 +51,7 @@ class InvoiceListCreate(generics.ListCreateAPIView):
 class InvoiceRetrieveUpdate(generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = InvoiceSerializer
-    queryset = Invoice.objects.all()
+    queryset = Invoice.objects.with_transactions_amounts()
 
 
 class DocEntryCreate(generics.CreateAPIView):
@@ -229,7 +234,8 @@ class ProformaListCreate(generics.ListCreateAPIView):
     serializer_class = ProformaSerializer
     queryset = Proforma.objects.all()\
         .select_related('related_document')\
-        .prefetch_related('proforma_transactions')
+        .prefetch_related('proforma_transactions')\
+        .with_transactions_amounts()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProformaFilter
 
@@ -237,7 +243,7 @@ class ProformaListCreate(generics.ListCreateAPIView):
 class ProformaRetrieveUpdate(generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = ProformaSerializer
-    queryset = Proforma.objects.all()
+    queryset = Proforma.objects.with_transactions_amounts()
 
 
 class ProformaEntryCreate(DocEntryCreate):
@@ -381,7 +387,78 @@ class DocumentList(ListAPIView):
             .filter(kind='proforma', related_document=None) \
             .prefetch_related('proforma_transactions__payment_method')
 
-        return (invoices | proformas).select_related('customer', 'provider', 'pdf')
+        return (invoices | proformas).select_related('customer', 'provider', 'pdf') \
+            .with_transactions_amounts()
+
+
+class DocumentsPDFArchive(DocumentList):
+    """
+    Streams a ZIP archive with the PDFs of the documents matching the same filters as
+    DocumentList.
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        documents = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+
+        response = StreamingHttpResponse(stream_documents_pdfs_zip(documents.iterator()),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="{filename}"'.format(
+            filename='Billing-Documents-{now}.zip'.format(
+                now=timezone.now().strftime('%Y-%m-%d-%H%M%S')
+            )
+        )
+
+        return response
+
+
+class DocumentsStateHandler(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    transitions = {
+        BillingDocumentBase.STATES.ISSUED: ('issue', ('issue_date', 'due_date')),
+        BillingDocumentBase.STATES.PAID: ('pay', ('paid_date', )),
+        BillingDocumentBase.STATES.CANCELED: ('cancel', ('cancel_date', )),
+    }
+
+    def put(self, request, *args, **kwargs):
+        state = request.data.get('state', None)
+        if not state:
+            msg = "You have to provide a value for the state field."
+            return Response({"detail": msg}, status=status.HTTP_403_FORBIDDEN)
+        elif state not in self.transitions:
+            msg = "Illegal state value."
+            return Response({"detail": msg}, status=status.HTTP_403_FORBIDDEN)
+
+        documents_ids = request.data.get('documents', None)
+        if not isinstance(documents_ids, list) or not documents_ids:
+            msg = "You have to provide a list of documents ids."
+            return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            documents_ids = [int(document_id) for document_id in documents_ids]
+        except (TypeError, ValueError):
+            msg = "The documents ids must be integers."
+            return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        transition, transition_fields = self.transitions[state]
+        transitioned_documents, errors = bulk_transition(
+            documents_ids, transition,
+            **{field: request.data.get(field, None) for field in transition_fields}
+        )
+
+        errors = {str(document.pk): error for document, error in errors.items()}
+        found_ids = {document.pk for document in transitioned_documents} | {
+            int(document_id) for document_id in errors
+        }
+        errors.update({str(document_id): "Document not found."
+                       for document_id in documents_ids if document_id not in found_ids})
+
+        return Response({
+            "transitioned": sorted(document.pk for document in transitioned_documents),
+            "errors": errors
+        })
 
 
 class PDFRetrieve(generics.RetrieveAPIView):
@@ -391,4 +468,13 @@ class PDFRetrieve(generics.RetrieveAPIView):
 
     def get(self, *args, **kwargs):
         pdf = self.get_object()
+
+        document = BillingDocumentBase.objects.filter(pdf=pdf).first()
+        if document:
+            document.pdf = pdf
+            get_up_to_date_pdf(document)
+
+        if not pdf.url:
+            raise Http404
+
         return HttpResponseRedirect(pdf.url)
@@ -20,7 +20,6 @@ from collections import defaultdict
 from dataclasses import dataclass
 
 from decimal import Decimal
-from fractions import Fraction
 from typing import Tuple, Dict, List, Union, Optional
 
 from django.utils import timezone
@@ -32,7 +31,7 @@ from silver.models.bonuses import Bonus
 from silver.models.discounts import Discount
 from silver.models.documents.entries import OriginType, EntryInfo
 from silver.utils.dates import ONE_DAY
-from silver.utils.numbers import quantize_fraction
+from silver.utils.numbers import multiply_to_minor_units, to_minor_units, from_minor_units
 
 logger = logging.getLogger(__name__)
 
@@ -166,6 +165,8 @@ class DocumentsGenerator(object):
                 else:
                     discounts[discount.id].matching_subscriptions.append(subscription)
 
+        Discount.prefetch_filters(discounts.values())
+
         # group entries_info by start_date - end_date intervals
         entries_by_interval = defaultdict(lambda: [])
         for entry_info in entries_info:
@@ -229,12 +230,13 @@ class DocumentsGenerator(object):
                     discount_to_entries[discount].append(entry_info)
                     entry_to_discounts[entry_info].append(discount)
 
-        discounts = defaultdict(lambda: Decimal(0.0))
+        # All the amounts below are computed in minor units (see silver.utils.numbers)
+        discounts = defaultdict(int)
 
-        additive_discounts_amount = Decimal(0.0)
+        additive_discounts_amount = 0
         # cumulative_entries_discount_amounts keeps track of how much entries have been discounted
         # it is used mainly for calculating multiplicative discounts
-        cumulative_entries_discount_amounts = defaultdict(lambda: Decimal("0.0"))
+        cumulative_entries_discount_amounts = defaultdict(int)
 
         # Only calculate noncumulative and additive discounts here
         for discount, entries in discount_to_entries.items():
@@ -249,8 +251,8 @@ class DocumentsGenerator(object):
                     entry.subscription, start_date, end_date, entry.origin_type
                 )
 
-                entry_discount_amount = quantize_fraction(
-                    Fraction(str(discount.as_additive)) * Fraction(str(entry.amount)) * extra_proration_fraction
+                entry_discount_amount = multiply_to_minor_units(
+                    discount.as_additive, entry.amount, extra_proration_fraction
                 )
 
                 discounts[discount] += entry_discount_amount
@@ -262,7 +264,7 @@ class DocumentsGenerator(object):
                     additive_discounts_amount += entry_discount_amount
 
         # Then calculate multiplicative discounts based on the additive ones
-        multiplicative_discounts_amount = Decimal(0.0)
+        multiplicative_discounts_amount = 0
 
         for discount, entries in discount_to_entries.items():
             if discount.discount_stacking_type != Discount.STACKING_TYPES.MULTIPLICATIVE:
@@ -276,13 +278,15 @@ class DocumentsGenerator(object):
                     entry.subscription, start_date, end_date, entry.origin_type
                 )
 
-                remaining_entry_amount = max(Decimal(0.0), entry.amount - cumulative_entries_discount_amounts[entry])
+                remaining_entry_amount = max(
+                    0, to_minor_units(entry.amount) - cumulative_entries_discount_amounts[entry]
+                )
                 if not remaining_entry_amount:
                     continue
 
-                entry_discount_amount = quantize_fraction(
-                    Fraction(str(discount.as_additive)) *
-                    Fraction(str(remaining_entry_amount)) *
+                entry_discount_amount = multiply_to_minor_units(
+                    discount.as_additive,
+                    from_minor_units(remaining_entry_amount),
                     extra_proration_fraction
                 )
 
@@ -292,7 +296,7 @@ class DocumentsGenerator(object):
                 multiplicative_discounts_amount += entry_discount_amount
 
         # Then compare the noncumulative discounts with the cumulative ones, and decide which to keep
-        max_noncumulative_discount_per_document = Decimal(0.0)
+        max_noncumulative_discount_per_document = 0
         noncumulative_discount_per_document = None
         for discount in Discount.filter_noncumulative(discounts):
             amount = discounts[discount]
@@ -303,11 +307,11 @@ class DocumentsGenerator(object):
 
         additive_discounts = {}
         for discount in Discount.filter_additive(discounts):
-            additive_discounts[discount] = discounts[discount]
+            additive_discounts[discount] = from_minor_units(discounts[discount])
 
         multiplicative_discounts = {}
         for discount in Discount.filter_multiplicative(discounts):
-            multiplicative_discounts[discount] = discounts[discount]
+            multiplicative_discounts[discount] = from_minor_units(discounts[discount])
 
         extra_context = {
             'start_date': start_date,
@@ -336,7 +340,8 @@ class DocumentsGenerator(object):
             return [
                 DocumentEntry.objects.create(
                     invoice=invoice, proforma=proforma, description=description,
-                    unit_price=-max_noncumulative_discount_per_document, unit=unit, quantity=Decimal('1.00'),
+                    unit_price=-from_minor_units(max_noncumulative_discount_per_document), unit=unit,
+                    quantity=Decimal('1.00'),
                     product_code=noncumulative_discount_per_document.product_code,
                     start_date=start_date, end_date=end_date,
                 )
@@ -638,7 +643,7 @@ class DocumentsGenerator(object):
         if not should_bill_metered_features:
             return None, []
 
-        bonuses = Bonus.for_subscription(subscription)
+        bonuses = Bonus.prefetch_filters(Bonus.for_subscription(subscription))
 
         if subscription.on_trial(relative_start_date):
             subscription._add_mfs_for_trial(
@@ -0,0 +1,256 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import uuid
+
+from django_fsm import TransitionNotAllowed
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+
+from silver.models import (
+    BillingDocumentBase, DocumentEntry, DocumentNumberCounter, PDF, Transaction
+)
+from silver.models.documents.base import create_transactions_for_documents
+
+
+STATES = BillingDocumentBase.STATES
+
+TRANSITIONS = {
+    # transition: (source state, target state, past participle)
+    'issue': (STATES.DRAFT, STATES.ISSUED, 'issued'),
+    'pay': (STATES.ISSUED, STATES.PAID, 'paid'),
+    'cancel': (STATES.ISSUED, STATES.CANCELED, 'canceled'),
+}
+
+TRANSITIONED_FIELDS = {
+    'issue': ['issue_date', 'due_date', 'sales_tax_name', 'sales_tax_percent', 'number',
+              'archived_customer', 'archived_provider', '_total',
+              '_total_in_transaction_currency', 'transaction_xe_rate', 'transaction_xe_date'],
+    'pay': ['paid_date'],
+    'cancel': ['cancel_date'],
+}
+
+
+def _goes_through_single_transition(document, transition):
+    # Transitions cascading to related documents are left to the documents themselves
+    return bool(document.related_document_id) or (
+        transition == 'pay' and document.kind == 'proforma'
+    )
+
+
+def _single_transition(document, transition, **kwargs):
+    try:
+        with transaction.atomic():
+            getattr(document, transition)(**kwargs)
+    except (TransitionNotAllowed, ValidationError, ValueError) as error:
+        return str(error)
+
+
+def _prefetch_entries(documents):
+    documents_by_id = {document.pk: document for document in documents}
+
+    for document in documents:
+        document._document_entries = []
+
+    entries = DocumentEntry.objects.filter(
+        Q(invoice__in=documents_by_id.keys()) | Q(proforma__in=documents_by_id.keys())
+    )
+    for entry in entries:
+        for field_name in ('invoice', 'proforma'):
+            document = documents_by_id.get(getattr(entry, field_name + '_id'))
+            if document:
+                setattr(entry, field_name, document)
+
+                if document.kind == field_name:
+                    document._document_entries.append(entry)
+
+
+def _apply_transition(documents, transition, errors, **kwargs):
+    if transition == 'issue':
+        valid_documents = []
+        for document in documents:
+            try:
+                document.archived_provider = document.provider.get_archivable_field_values()
+                document._prepare_issue(issue_date=kwargs.get('issue_date'),
+                                        due_date=kwargs.get('due_date'))
+            except (TransitionNotAllowed, ValueError) as error:
+                errors[document] = str(error)
+            else:
+                valid_documents.append(document)
+
+        documents = valid_documents
+
+        # Numbers are reserved only for the documents that will be issued, to avoid gaps
+        DocumentNumberCounter.assign_numbers(documents)
+
+        _prefetch_entries([
+            document for document in documents
+            if document.currency != document.transaction_currency or
+            document.saved_state.get('sales_tax_percent') != document.sales_tax_percent
+        ])
+
+        for document in documents:
+            document._complete_issue(maintained_totals_are_fresh=True)
+    else:
+        valid_documents = []
+        for document in documents:
+            try:
+                if transition == 'pay':
+                    document._pay(kwargs.get('paid_date'))
+                else:
+                    document._cancel(kwargs.get('cancel_date'))
+            except ValueError as error:
+                errors[document] = str(error)
+            else:
+                valid_documents.append(document)
+
+        documents = valid_documents
+
+    return documents
+
+
+def _exclude_documents_with_foreign_currency_transactions(documents, errors):
+    """
+    Batched counterpart of the transactions currency check of `BillingDocumentBase.clean`,
+    which bulk_update bypasses.
+    """
+
+    documents_by_id = {document.pk: document for document in documents}
+
+    invalid_documents = set()
+    for invoice_id, proforma_id, currency in Transaction.objects.filter(
+        Q(invoice__in=[document.pk for document in documents if document.kind == 'invoice']) |
+        Q(proforma__in=[document.pk for document in documents if document.kind == 'proforma'])
+    ).values_list('invoice_id', 'proforma_id', 'currency'):
+        for document_id in (invoice_id, proforma_id):
+            document = documents_by_id.get(document_id)
+            if document and currency != document.transaction_currency:
+                invalid_documents.add(document)
+
+    for document in invalid_documents:
+        errors[document] = 'There are unfinished transactions of this document that use a ' \
+                           'different currency.'
+
+    return [document for document in documents if document not in invalid_documents]
+
+
+def _create_missing_pdfs(documents):
+    documents_by_pdf_uuid = {
+        uuid.uuid4(): document for document in documents if not document.pdf_id
+    }
+
+    PDF.objects.bulk_create([
+        PDF(uuid=pdf_uuid, upload_path=document.get_pdf_upload_path(), dirty=1)
+        for pdf_uuid, document in documents_by_pdf_uuid.items()
+    ])
+
+    # bulk_create doesn't set the primary keys on every database
+    for pdf in PDF.objects.filter(uuid__in=documents_by_pdf_uuid.keys()):
+        documents_by_pdf_uuid[pdf.uuid].pdf = pdf
+
+
+def bulk_transition(documents, transition, **kwargs):
+    """
+    Issues, pays or cancels the given documents (or documents' ids), using a fixed number of
+    queries for the whole batch: the documents are locked in one query, numbers are allocated
+    in blocks, the totals come from the entries' maintained totals and the transactions and
+    PDF generation are batched. Documents whose transition cascades to a related document go
+    through their regular transition.
+
+    :param transition: one of 'issue', 'pay' or 'cancel'.
+    :param kwargs: the transition's arguments (issue_date and due_date, paid_date or
+        cancel_date).
+    :returns: a (transitioned documents, {document: error message}) tuple.
+    """
+
+    source_state, target_state, past_participle = TRANSITIONS[transition]
+
+    documents_ids = [getattr(document, 'pk', document) for document in documents]
+    transitioned_documents, errors = [], {}
+
+    with transaction.atomic():
+        locked_documents = list(
+            BillingDocumentBase.objects.filter(pk__in=documents_ids)
+            .select_for_update().order_by('pk')
+        )
+
+        bulk_documents = []
+        for document in locked_documents:
+            if document.state != source_state:
+                errors[document] = '{kind} can be {past_participle} only if it is in {state} ' \
+                                   'state.'.format(kind=document.kind.capitalize(),
+                                                   past_participle=past_participle,
+                                                   state=source_state)
+            elif _goes_through_single_transition(document, transition):
+                error = _single_transition(document, transition, **kwargs)
+                if error is not None:
+                    errors[document] = error
+                else:
+                    transitioned_documents.append(document)
+            else:
+                bulk_documents.append(document)
+
+        bulk_documents = _exclude_documents_with_foreign_currency_transactions(
+            bulk_documents, errors
+        )
+        bulk_documents = _apply_transition(bulk_documents, transition, errors, **kwargs)
+        if not bulk_documents:
+            return transitioned_documents, errors
+
+        for document in bulk_documents:
+            document.state = target_state
+
+        _create_missing_pdfs(bulk_documents)
+
+        update_fields = ['state', 'pdf'] + TRANSITIONED_FIELDS[transition]
+        BillingDocumentBase.objects.bulk_update(bulk_documents, update_fields, batch_size=500)
+
+        for document in bulk_documents:
+            if document.sales_tax_percent != document.saved_state.get('sales_tax_percent'):
+                document.refresh_totals()
+
+            document.saved_state = document.current_state.copy()
+            document.initial_state = document.current_state.copy()
+
+        if transition == 'issue' and settings.SILVER_AUTOMATICALLY_CREATE_TRANSACTIONS:
+            create_transactions_for_documents(bulk_documents)
+
+        PDF.objects.filter(pk__in=[document.pdf_id for document in bulk_documents]) \
+                   .mark_as_dirty()
+
+        # bulk_update doesn't send post_save, which the hooks and the other receivers rely on
+        update_fields = frozenset(update_fields)
+        for document in bulk_documents:
+            post_save.send(sender=document.__class__, instance=document, created=False,
+                           update_fields=update_fields, raw=False, using=document._state.db)
+
+    return transitioned_documents + bulk_documents, errors
+
+
+def bulk_issue(documents, issue_date=None, due_date=None):
+    return bulk_transition(documents, 'issue', issue_date=issue_date, due_date=due_date)
+
+
+def bulk_pay(documents, paid_date=None):
+    return bulk_transition(documents, 'pay', paid_date=paid_date)
+
+
+def bulk_cancel(documents, cancel_date=None):
+    return bulk_transition(documents, 'cancel', cancel_date=cancel_date)
@@ -208,6 +208,8 @@ class InvoiceFactory(factory.django.DjangoModelFactory):
             for invoice_entry in extracted:
                 self.invoice_entries.add(invoice_entry)
 
+            self.refresh_totals()
+
         if self.state != 'draft':
             self._total = self.compute_total()
             self._total_in_transaction_currency = self.compute_total_in_transaction_currency()
@@ -260,6 +262,8 @@ class ProformaFactory(factory.django.DjangoModelFactory):
             for proforma_entry in extracted:
                 self.proforma_entries.add(proforma_entry)
 
+            self.refresh_totals()
+
         if self.state != Proforma.STATES.DRAFT:
             self._total = self.compute_total()
             self._total_in_transaction_currency = self.compute_total_in_transaction_currency()
@@ -0,0 +1,52 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from silver.models import BillingDocumentBase
+
+
+class Command(BaseCommand):
+    help = ('Archives the billing documents that were paid or canceled before the archive '
+            'horizon (SILVER_DOCUMENTS_ARCHIVE_HORIZON), leaving them out of the default '
+            'API and admin listings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days',
+                            action='store', dest='days', type=int,
+                            help='Overrides the archive horizon, in days.')
+        parser.add_argument('--batch-size',
+                            action='store', dest='batch_size', type=int, default=1000,
+                            help='The number of documents archived by each query.')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None:
+            horizon = timedelta(days=options['days'])
+        else:
+            horizon = getattr(settings, 'SILVER_DOCUMENTS_ARCHIVE_HORIZON', None)
+
+        if horizon is None:
+            raise CommandError('No archive horizon was given. Use the --days option or the '
+                               'SILVER_DOCUMENTS_ARCHIVE_HORIZON setting.')
+
+        archived = BillingDocumentBase.objects.archivable(horizon).archive(
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write('Archived %d billing documents.' % archived)
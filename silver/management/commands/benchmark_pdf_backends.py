@@ -0,0 +1,144 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import datetime
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+
+from silver.models import Customer, DocumentEntry, Invoice, Proforma, Provider
+from silver.pdf_backends import get_pdf_backend
+
+
+DEFAULT_BACKENDS = ['silver.pdf_backends.XHTML2PDFBackend',
+                    'silver.pdf_backends.ReportLabBackend']
+
+
+class Command(BaseCommand):
+    help = 'Renders the bundled invoice and proforma templates with each PDF backend and ' \
+           'reports the rendering times and PDF sizes. Nothing is saved to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents',
+                            action='store', dest='documents', type=int, default=20,
+                            help='The number of documents rendered per backend, half of them '
+                                 'invoices and half proformas.')
+        parser.add_argument('--entries',
+                            action='store', dest='entries', type=int, default=10,
+                            help='The number of entries per document.')
+        parser.add_argument('--backend',
+                            action='append', dest='backends',
+                            help='A PDF backend\'s dotted path. Can be repeated; defaults to '
+                                 'all the bundled backends.')
+        parser.add_argument('--memory',
+                            action='store_true', dest='memory', default=False,
+                            help='Also report the peak memory allocated while rendering.')
+
+    def get_html_documents(self, documents_count, entries_count):
+        provider = Provider(name='Provider', company='Provider SRL', email='billing@provider',
+                            address_1='Address 1', city='City', state='State',
+                            zip_code='000000', country='RO', invoice_series='IS',
+                            proforma_series='PS')
+        customer = Customer(first_name='First', last_name='Last', company='Customer SRL',
+                            email='customer@customer', address_1='Address 1', city='City',
+                            country='RO', sales_tax_number='RO000000')
+
+        html_documents = []
+        for index in range(documents_count):
+            document_class = Invoice if index % 2 == 0 else Proforma
+            document = document_class(
+                provider=provider, customer=customer, number=index + 1,
+                series=provider.invoice_series, currency='USD', transaction_currency='USD',
+                issue_date=datetime.date(2024, 1, 1), due_date=datetime.date(2024, 1, 31),
+                sales_tax_name='VAT', sales_tax_percent=Decimal('19.00'),
+                state=document_class.STATES.ISSUED
+            )
+
+            entries = [
+                DocumentEntry(**{
+                    document.kind: document,
+                    'description': 'Entry %d of %s %d' % (entry_index + 1, document.kind,
+                                                          index + 1),
+                    'unit': 'hours', 'quantity': Decimal(entry_index % 5 + 1),
+                    'unit_price': Decimal('12.50')
+                })
+                for entry_index in range(entries_count)
+            ]
+            document._total = sum(entry.total for entry in entries)
+
+            template = get_template('billing_documents/%s_pdf.html' % document.kind)
+            html_documents.append(template.render({
+                'document': document,
+                'provider': provider,
+                'customer': customer,
+                'entries': entries,
+                'state': document.state,
+                'filename': document.get_pdf_filename(),
+            }))
+
+        return html_documents
+
+    def benchmark(self, backend, html_documents, memory):
+        if memory:
+            tracemalloc.start()
+
+        total_time, total_size = 0.0, 0
+        try:
+            for html in html_documents:
+                start_time = time.monotonic()
+                pdf_file_object, error = backend.render(html)
+                total_time += time.monotonic() - start_time
+
+                if error:
+                    raise CommandError('The %s backend could not render the PDF: %s' % (
+                        backend.name, error
+                    ))
+
+                total_size += len(pdf_file_object.getvalue())
+        finally:
+            peak_memory = tracemalloc.get_traced_memory()[1] if memory else None
+            if memory:
+                tracemalloc.stop()
+
+        return total_time, total_size, peak_memory
+
+    def handle(self, *args, **options):
+        if options['documents'] < 1:
+            raise CommandError('At least one document must be rendered.')
+
+        html_documents = self.get_html_documents(options['documents'], options['entries'])
+
+        for backend_path in options['backends'] or DEFAULT_BACKENDS:
+            backend = get_pdf_backend(backend_path)
+
+            # The first rendering loads the fonts and the libraries' caches
+            backend.render(html_documents[0])
+
+            total_time, total_size, peak_memory = self.benchmark(backend, html_documents,
+                                                                 options['memory'])
+
+            report = '%s: rendered %d PDFs in %.3fs (%.1fms per PDF, %.1fKB per PDF)' % (
+                backend.name or backend_path, len(html_documents), total_time,
+                total_time * 1000 / len(html_documents),
+                total_size / 1024 / len(html_documents)
+            )
+            if peak_memory is not None:
+                report += ', peak memory %.1fMB' % (peak_memory / 1024 / 1024)
+
+            self.stdout.write(report + '.')
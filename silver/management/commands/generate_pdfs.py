@@ -14,26 +14,65 @@
 
 from __future__ import absolute_import
 
-import logging
-
-from itertools import chain
+import time
 
 from django.core.management.base import BaseCommand
 
-from silver.models import Invoice, Proforma
-
-
-logger = logging.getLogger(__name__)
+from silver.models import BillingDocumentBase
+from silver.pdf_rendering import PDFRenderingPool
 
 
 class Command(BaseCommand):
     help = 'Generates the billing documents (Invoices, Proformas).'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--processes',
+                            action='store', dest='processes', type=int,
+                            help='The number of rendering processes (0 renders in the current '
+                                 'process). Defaults to SILVER_PDF_RENDERING_PROCESSES or the '
+                                 'number of CPUs.')
+        parser.add_argument('--batch-size',
+                            action='store', dest='batch_size', type=int,
+                            help='The number of documents rendered per batch.')
+        parser.add_argument('--interval',
+                            action='store', dest='interval', type=float,
+                            help='Keep running, with the same warm rendering processes, and '
+                                 'render the dirty PDFs again every this many seconds.')
+
     def handle(self, *args, **options):
-        for document in chain(Invoice.objects.filter(pdf__dirty__gt=0),
-                              Proforma.objects.filter(pdf__dirty__gt=0)):
+        with PDFRenderingPool(processes=options['processes'],
+                              batch_size=options['batch_size']) as pool:
             try:
-                document.generate_pdf()
-            except:
-                logger.exception('Encountered exception while generating PDF for document '
-                                 'with id=%s.', document.id)
+                while True:
+                    self.generate_pdfs(pool, options['verbosity'])
+
+                    if not options['interval']:
+                        break
+
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                pass
+
+    def generate_pdfs(self, pool, verbosity):
+        dirty_documents = BillingDocumentBase.objects.with_dirty_pdfs_by_priority() \
+                                                     .select_related('pdf')
+
+        generated, unchanged, total_render_time = 0, 0, 0.0
+        for rendered_document in pool.generate_pdfs(dirty_documents):
+            document = rendered_document.document
+            if rendered_document.error:
+                continue
+
+            if rendered_document.unchanged:
+                unchanged += 1
+                continue
+
+            generated += 1
+            total_render_time += rendered_document.render_time
+            if verbosity > 1:
+                self.stdout.write('Rendered the PDF of the %s with id=%s in %.3fs.' % (
+                    document.kind, document.id, rendered_document.render_time
+                ))
+
+        self.stdout.write('Generated %d PDFs in %.3fs of rendering time, skipped %d unchanged '
+                          'PDFs.' % (generated, total_render_time, unchanged))
@@ -0,0 +1,66 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from silver.models import PaymentMethod
+from silver.utils.encryption import rotate_encrypted_data
+
+
+class Command(BaseCommand):
+    help = ('Re-encrypts the payment methods\' data encrypted with one of the '
+            'PAYMENT_METHOD_OLD_SECRETS, using the PAYMENT_METHOD_SECRET. Can be interrupted '
+            'and run again, since the already rotated data is skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            action='store', dest='batch_size', type=int, default=500,
+                            help='The number of payment methods loaded and updated at once.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('The batch size must be positive.')
+
+        last_pk, updated = 0, 0
+        while True:
+            # The batch's rows are locked until updated, so that concurrent changes of the
+            # payment methods' data aren't overwritten
+            with transaction.atomic():
+                payment_methods = list(
+                    PaymentMethod.objects.select_for_update().filter(
+                        pk__gt=last_pk
+                    ).order_by('pk').only('pk', 'payment_processor', 'data')[:batch_size]
+                )
+                if not payment_methods:
+                    break
+
+                last_pk = payment_methods[-1].pk
+
+                rotated_payment_methods = []
+                for payment_method in payment_methods:
+                    data, rotated_values = rotate_encrypted_data(payment_method.data or {})
+                    if rotated_values:
+                        payment_method.data = data
+                        rotated_payment_methods.append(payment_method)
+
+                if rotated_payment_methods:
+                    PaymentMethod.objects.bulk_update(rotated_payment_methods, ['data'])
+
+            updated += len(rotated_payment_methods)
+
+        self.stdout.write('Re-encrypted the data of %d payment methods.' % updated)
@@ -0,0 +1,33 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from silver.models import Discount, Bonus
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the materialized Discount and Bonus matching subscriptions, '
+            'e.g. after filters or subscriptions were changed through bulk updates.')
+
+    def handle(self, *args, **options):
+        for model in (Discount, Bonus):
+            for instance in model.objects.all():
+                instance.refresh_matched_subscriptions()
+
+            self.stdout.write('Refreshed matching subscriptions for %d %s.' % (
+                model.objects.count(), model._meta.verbose_name_plural
+            ))
@@ -0,0 +1,29 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from silver.models import DocumentNumberCounter
+
+
+class Command(BaseCommand):
+    help = ('Seeds the billing documents number counters from the existing documents, '
+            'e.g. after documents were imported or renumbered through bulk updates.')
+
+    def handle(self, *args, **options):
+        seeded = DocumentNumberCounter.seed()
+
+        self.stdout.write('Seeded %d document number counters.' % seeded)
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:54
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_matched_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model('silver', 'Subscription')
+
+    for model_name in ('Discount', 'Bonus'):
+        Model = apps.get_model('silver', model_name)
+        Through = Model.matched_subscriptions.through
+
+        for instance in Model.objects.all():
+            subscriptions = instance.filter_subscriptions.all()
+            if not subscriptions.exists():
+                subscriptions = Subscription.objects.all()
+
+            if instance.filter_customers.exists():
+                subscriptions = subscriptions.filter(customer__in=instance.filter_customers.all())
+
+            if instance.filter_plans.exists():
+                subscriptions = subscriptions.filter(plan__in=instance.filter_plans.all())
+
+            if instance.filter_product_codes.exists():
+                product_codes = instance.filter_product_codes.all()
+                subscriptions = subscriptions.filter(
+                    Q(plan__product_code__in=product_codes) |
+                    Q(plan__metered_features__product_code__in=product_codes)
+                )
+
+            Through.objects.bulk_create([
+                Through(**{f'{model_name.lower()}_id': instance.pk, 'subscription_id': subscription_id})
+                for subscription_id in set(subscriptions.values_list('pk', flat=True))
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0063_auto_20240807_1247'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonus',
+            name='matched_subscriptions',
+            field=models.ManyToManyField(blank=True, editable=False, help_text='Materialized result of `matching_subscriptions()`, kept up to date on filter changes.', related_name='matched_bonuses', to='silver.Subscription'),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='matched_subscriptions',
+            field=models.ManyToManyField(blank=True, editable=False, help_text='Materialized result of `matching_subscriptions()`, kept up to date on filter changes.', related_name='matched_discounts', to='silver.Subscription'),
+        ),
+        migrations.RunPython(populate_matched_subscriptions, migrations.RunPython.noop),
+    ]
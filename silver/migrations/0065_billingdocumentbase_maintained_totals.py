@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:12
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_maintained_totals(apps, schema_editor):
+    BillingDocumentBase = apps.get_model('silver', 'BillingDocumentBase')
+    DocumentEntry = apps.get_model('silver', 'DocumentEntry')
+
+    sales_tax_percents = dict(BillingDocumentBase.objects.values_list('id', 'sales_tax_percent'))
+    totals = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])
+
+    for invoice_id, proforma_id, quantity, unit_price in DocumentEntry.objects.values_list(
+        'invoice_id', 'proforma_id', 'quantity', 'unit_price'
+    ).iterator():
+        total_before_tax = Decimal(quantity * unit_price).quantize(Decimal('0.00'))
+
+        for document_id in (invoice_id, proforma_id):
+            if not document_id:
+                continue
+
+            sales_tax_percent = sales_tax_percents[document_id]
+            tax_value = (
+                (total_before_tax * sales_tax_percent / 100).quantize(Decimal('0.00'))
+                if sales_tax_percent else Decimal('0.00')
+            )
+
+            totals[document_id][0] += total_before_tax
+            totals[document_id][1] += tax_value
+
+    documents = []
+    for document_id, (total_before_tax, tax_value) in totals.items():
+        documents.append(BillingDocumentBase(id=document_id, _total_before_tax=total_before_tax,
+                                             _tax_value=tax_value))
+
+    BillingDocumentBase.objects.bulk_update(documents, ['_total_before_tax', '_tax_value'],
+                                            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0064_discount_bonus_matched_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdocumentbase',
+            name='_tax_value',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=19),
+        ),
+        migrations.AddField(
+            model_name='billingdocumentbase',
+            name='_total_before_tax',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=19),
+        ),
+        migrations.RunPython(populate_maintained_totals, migrations.RunPython.noop),
+    ]
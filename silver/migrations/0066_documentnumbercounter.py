@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:31
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def seed_document_number_counters(apps, schema_editor):
+    BillingDocumentBase = apps.get_model('silver', 'BillingDocumentBase')
+    DocumentNumberCounter = apps.get_model('silver', 'DocumentNumberCounter')
+
+    max_numbers = {}
+    for kind, provider_id, series, max_number in BillingDocumentBase.objects.order_by().filter(
+        number__isnull=False
+    ).values_list('kind', 'provider_id', 'series').annotate(Max('number')):
+        key = (kind, provider_id, series or '')
+        max_numbers[key] = max(max_numbers.get(key, 0), max_number)
+
+    DocumentNumberCounter.objects.bulk_create([
+        DocumentNumberCounter(kind=kind, provider_id=provider_id, series=series,
+                              last_number=max_number)
+        for (kind, provider_id, series), max_number in max_numbers.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0065_billingdocumentbase_maintained_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentNumberCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=8)),
+                ('series', models.CharField(blank=True, max_length=20)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_number_counters', to='silver.provider')),
+            ],
+            options={
+                'unique_together': {('kind', 'provider', 'series')},
+            },
+        ),
+        migrations.RunPython(seed_document_number_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0066_documentnumbercounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdocumentbase',
+            name='archived',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='billingdocumentbase',
+            index=models.Index(fields=['archived', 'issue_date'], name='silver_doc_archived_issue'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0067_billingdocumentbase_archived'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdf',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0068_pdf_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='status_fetched_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
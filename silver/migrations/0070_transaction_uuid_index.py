@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:40
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver', '0069_transaction_status_fetched_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='uuid',
+            field=models.UUIDField(db_index=True, default=uuid.uuid4),
+        ),
+    ]
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 from silver.models.billing_entities import Customer, Provider
-from silver.models.documents import Proforma, Invoice, BillingDocumentBase, DocumentEntry, PDF
+from silver.models.documents import (
+    Proforma, Invoice, BillingDocumentBase, DocumentEntry, DocumentNumberCounter, PDF
+)
 from silver.models.plans import Plan, MeteredFeature
 from silver.models.product_codes import ProductCode
 from silver.models.subscriptions import Subscription, MeteredFeatureUnitsLog, BillingLog
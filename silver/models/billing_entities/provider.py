@@ -20,7 +20,7 @@ from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.html import escape
@@ -154,28 +154,54 @@ class Provider(BaseBillingEntity):
         return self.name
 
 
+def _update_draft_documents_series(document_model, provider, series):
+    """
+    Moves the provider's draft documents of the given model to a new series through a single
+    UPDATE, then sends their post_save signals (used by the hooks) while loading the documents
+    in batches.
+
+    :returns: the number of updated documents.
+    """
+
+    # A blank series would fall back to the provider's (previous) series anyway
+    if not series:
+        return 0
+
+    # The same validation each document's save would run for the new series
+    document_model._meta.get_field('series').clean(series, None)
+
+    draft_documents = document_model.objects.filter(state='draft', provider=provider)
+    updated = draft_documents.update(series=series, number=None)
+    if updated:
+        draft_documents.mark_pdfs_for_generation()
+
+    if updated and post_save.has_listeners(document_model):
+        update_fields = frozenset(['series', 'number'])
+        for document in draft_documents.order_by('pk').iterator(chunk_size=1000):
+            post_save.send(sender=document_model, instance=document, created=False,
+                           update_fields=update_fields, raw=False, using=document._state.db)
+
+    return updated
+
+
 @receiver(pre_save, sender=Provider)
 def update_draft_billing_documents(sender, instance, **kwargs):
     Invoice = apps.get_model('silver', 'Invoice')
     Proforma = apps.get_model('silver', 'Proforma')
 
-    if instance.pk and not kwargs.get('raw', False):
-        provider = Provider.objects.get(pk=instance.pk)
-        old_invoice_series = provider.invoice_series
-        old_proforma_series = provider.proforma_series
-
-        if instance.invoice_series != old_invoice_series:
-            for invoice in Invoice.objects.filter(state='draft',
-                                                  provider=provider):
-                # update the series for draft invoices
-                invoice.series = instance.invoice_series
-                invoice.number = None
-                invoice.save()
-
-        if instance.proforma_series != old_proforma_series:
-            for proforma in Proforma.objects.filter(state='draft',
-                                                    provider=provider):
-                # update the series for draft invoices
-                proforma.series = instance.proforma_series
-                proforma.number = None
-                proforma.save()
+    if not instance.pk or kwargs.get('raw', False):
+        return
+
+    old_series = Provider.objects.filter(pk=instance.pk).values_list(
+        'invoice_series', 'proforma_series'
+    ).first()
+    if not old_series:
+        return
+
+    old_invoice_series, old_proforma_series = old_series
+
+    if instance.invoice_series != old_invoice_series:
+        _update_draft_documents_series(Invoice, instance, instance.invoice_series)
+
+    if instance.proforma_series != old_proforma_series:
+        _update_draft_documents_series(Proforma, instance, instance.proforma_series)
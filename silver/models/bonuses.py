@@ -12,7 +12,7 @@ from django.utils import timezone
 from silver.models import Subscription, Plan, MeteredFeature
 from silver.models.documents.entries import OriginType
 from silver.utils.dates import end_of_interval
-from silver.utils.models import AutoCleanModelMixin
+from silver.utils.models import AutoCleanModelMixin, FilterSetsMixin
 
 
 class DurationIntervals(models.TextChoices):
@@ -32,7 +32,7 @@ class DocumentEntryBehavior(models.TextChoices):
     APPLY_AS_SEPARATE_ENTRY_PER_ENTRY = "apply_separately_per_entry", "Apply as separate entry, per entry"
 
 
-class Bonus(AutoCleanModelMixin, models.Model):
+class Bonus(FilterSetsMixin, AutoCleanModelMixin, models.Model):
     TARGET = BonusTarget
     DURATION_INTERVALS = DurationIntervals
     ENTRY_BEHAVIOR = DocumentEntryBehavior
@@ -49,6 +49,10 @@ class Bonus(AutoCleanModelMixin, models.Model):
     filter_subscriptions = models.ManyToManyField("silver.Subscription", related_name='filtering_bonuses', blank=True)
     filter_plans = models.ManyToManyField("silver.Plan", related_name='filtering_bonuses', blank=True)
     filter_product_codes = models.ManyToManyField("silver.ProductCode", related_name="filtering_bonuses", blank=True)
+    matched_subscriptions = models.ManyToManyField(
+        "silver.Subscription", related_name="matched_bonuses", blank=True, editable=False,
+        help_text="Materialized result of `matching_subscriptions()`, kept up to date on filter changes."
+    )
     filter_annotations = models.JSONField(default=list, blank=True)
 
     amount = models.DecimalField(
@@ -227,9 +231,9 @@ class Bonus(AutoCleanModelMixin, models.Model):
         return subscriptions
 
     def matches_metered_feature_units(self, metered_feature, annotations) -> bool:
-        filtered_product_codes = self.filter_product_codes.all()
+        filtered_product_code_ids = self.filter_product_code_ids
 
-        if filtered_product_codes and metered_feature.product_code not in filtered_product_codes:
+        if filtered_product_code_ids and metered_feature.product_code_id not in filtered_product_code_ids:
             return False
 
         if self.filter_annotations:
@@ -22,6 +22,8 @@ from typing import List, Iterable, Tuple
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q, F
+from django.db.models.signals import m2m_changed, post_init, post_save
+from django.dispatch import receiver
 from django.template.loader import render_to_string
 
 from . import Plan, MeteredFeature
@@ -29,7 +31,7 @@ from .subscriptions import Subscription
 from .documents.entries import OriginType
 from .fields import field_template_path
 from silver.utils.dates import end_of_interval, DateInterval
-from silver.utils.models import AutoCleanModelMixin
+from silver.utils.models import AutoCleanModelMixin, FilterSetsMixin, filter_sets_models
 
 
 class DocumentEntryBehavior(models.TextChoices):
@@ -59,7 +61,7 @@ class DurationIntervals(models.TextChoices):
     YEAR = 'year'
 
 
-class Discount(AutoCleanModelMixin, models.Model):
+class Discount(FilterSetsMixin, AutoCleanModelMixin, models.Model):
     STACKING_TYPES = DiscountStackingType
     ENTRY_BEHAVIOR = DocumentEntryBehavior
     TARGET = DiscountTarget
@@ -77,6 +79,10 @@ class Discount(AutoCleanModelMixin, models.Model):
     filter_subscriptions = models.ManyToManyField("silver.Subscription", related_name='filtering_discounts', blank=True)
     filter_plans = models.ManyToManyField("silver.Plan", related_name='filtering_discounts', blank=True)
     filter_product_codes = models.ManyToManyField("silver.ProductCode", related_name="filtering_discounts", blank=True)
+    matched_subscriptions = models.ManyToManyField(
+        "silver.Subscription", related_name="matched_discounts", blank=True, editable=False,
+        help_text="Materialized result of `matching_subscriptions()`, kept up to date on filter changes."
+    )
 
     percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True,
                                      help_text="A percentage to be discounted. For example 25 (%)")
@@ -211,9 +217,9 @@ class Discount(AutoCleanModelMixin, models.Model):
         return subscriptions
 
     def matches_product_code(self, product_code) -> bool:
-        filtered_product_codes = self.filter_product_codes.all()
+        filtered_product_code_ids = self.filter_product_code_ids
 
-        return not filtered_product_codes or product_code in filtered_product_codes
+        return not filtered_product_code_ids or getattr(product_code, "pk", None) in filtered_product_code_ids
 
     @classmethod
     def for_customer(cls, customer: "silver.models.Customer"):
@@ -394,3 +400,65 @@ class Discount(AutoCleanModelMixin, models.Model):
         unit_template_path = field_template_path(
             field='entry_unit', provider=provider.slug)
         return render_to_string(unit_template_path, context)
+
+
+def _refresh_matches_for_subscriptions(subscriptions):
+    subscriptions = list(subscriptions)
+
+    for model in filter_sets_models():
+        model.refresh_matches_for_subscriptions(subscriptions)
+
+
+@receiver(post_init, sender=Subscription)
+def store_subscription_matching_state(sender, instance, **kwargs):
+    # Deferred fields are not loaded on purpose
+    instance._matching_state = (instance.__dict__.get('plan_id'), instance.__dict__.get('customer_id'))
+
+
+@receiver(post_save, sender=Subscription)
+def refresh_matches_on_subscription_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    matching_state = (instance.plan_id, instance.customer_id)
+    if created or matching_state != instance._matching_state:
+        _refresh_matches_for_subscriptions([instance])
+
+    instance._matching_state = matching_state
+
+
+@receiver(post_init, sender=Plan)
+@receiver(post_init, sender=MeteredFeature)
+def store_product_code_state(sender, instance, **kwargs):
+    instance._matching_state = instance.__dict__.get('product_code_id')
+
+
+@receiver(post_save, sender=Plan)
+def refresh_matches_on_plan_save(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and instance.product_code_id != instance._matching_state:
+        _refresh_matches_for_subscriptions(instance.subscription_set.all())
+
+    instance._matching_state = instance.product_code_id
+
+
+@receiver(post_save, sender=MeteredFeature)
+def refresh_matches_on_metered_feature_save(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and instance.product_code_id != instance._matching_state:
+        _refresh_matches_for_subscriptions(Subscription.objects.filter(plan__metered_features=instance))
+
+    instance._matching_state = instance.product_code_id
+
+
+@receiver(m2m_changed, sender=Plan.metered_features.through)
+def refresh_matches_on_plan_metered_features_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        subscriptions = Subscription.objects.filter(plan=instance)
+    elif action == 'post_clear':
+        subscriptions = Subscription.objects.all()
+    else:
+        subscriptions = Subscription.objects.filter(plan__in=pk_set)
+
+    _refresh_matches_for_subscriptions(subscriptions)
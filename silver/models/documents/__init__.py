@@ -15,5 +15,6 @@
 from silver.models.documents.base import BillingDocumentBase
 from silver.models.documents.entries import DocumentEntry
 from silver.models.documents.invoice import Invoice
+from silver.models.documents.numbering import DocumentNumberCounter
 from silver.models.documents.proforma import Proforma
 from silver.models.documents.pdf import PDF
@@ -15,6 +15,9 @@
 from __future__ import absolute_import, unicode_literals
 
 import logging
+import threading
+import weakref
+from collections import defaultdict
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 
@@ -23,7 +26,7 @@ from model_utils import Choices
 
 from django.apps import apps
 from django.db.models import JSONField
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
@@ -32,7 +35,9 @@ from django.urls import reverse
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db import transaction as db_transaction
-from django.db.models import Max, ForeignKey, F
+from django.db.models import (
+    Case, ForeignKey, F, Func, OuterRef, Q, Subquery, Sum, Value, When
+)
 from django.template.loader import select_template
 from django.utils import timezone
 from django.utils.encoding import force_str
@@ -44,6 +49,7 @@ from django.utils.module_loading import import_string
 from silver.currencies import CurrencyConverter, RateNotFound
 from silver.models.billing_entities import Customer, Provider
 from silver.models.documents.entries import DocumentEntry
+from silver.models.documents.numbering import DocumentNumberCounter
 from silver.models.documents.pdf import PDF
 from silver.utils.decorators import require_transaction_currency_and_xe_rate
 from silver.utils.international import currencies
@@ -71,6 +77,18 @@ def documents_pdf_path(document, filename):
     return path
 
 
+# The documents whose deletion (possibly cascaded from their customer or provider) is in
+# progress, by id. The references are weak, so a failed deletion doesn't leave them behind.
+_deleted_documents = threading.local()
+
+
+def _get_documents_being_deleted():
+    if not hasattr(_deleted_documents, 'documents'):
+        _deleted_documents.documents = weakref.WeakValueDictionary()
+
+    return _deleted_documents.documents
+
+
 class BillingDocumentQuerySet(models.QuerySet):
     def due_this_month(self):
         return self.filter(
@@ -96,6 +114,134 @@ class BillingDocumentQuerySet(models.QuerySet):
             due_date__lt=timezone.now().date().replace(day=1)
         )
 
+    def with_dirty_pdfs_by_priority(self):
+        """
+        :returns: the documents whose PDFs need to be generated, the documents which are not
+            drafts first, the most recent first.
+        """
+
+        priority = Case(When(state=BillingDocumentBase.STATES.DRAFT, then=Value(1)),
+                        default=Value(0), output_field=models.IntegerField())
+
+        return self.filter(pdf__dirty__gt=0).annotate(pdf_priority=priority).order_by(
+            'pdf_priority', F('issue_date').desc(nulls_last=True), '-id'
+        )
+
+    def dirty_pdfs_batch(self, batch_size):
+        """
+        :returns: a list of at most batch_size documents whose PDFs need to be generated, in
+            generation order: the documents which are not drafts first, the most recent first,
+            going round-robin through the providers so that no provider's documents are left
+            waiting behind another's.
+
+        Each provider's first documents are selected with one query per provider having dirty
+        PDFs, and then interleaved.
+        """
+
+        dirty_documents = self.with_dirty_pdfs_by_priority()
+
+        provider_ids = dirty_documents.order_by().values_list('provider_id', flat=True).distinct()
+
+        candidates = []
+        for provider_id in provider_ids:
+            provider_documents = dirty_documents.filter(provider_id=provider_id).values_list(
+                'id', 'pdf_priority', 'issue_date'
+            )[:batch_size]
+
+            for provider_rank, (document_id, priority, issue_date) in enumerate(
+                provider_documents
+            ):
+                candidates.append((
+                    priority, provider_rank,
+                    # the most recent first, the documents without an issue date last
+                    issue_date is None, -issue_date.toordinal() if issue_date else 0,
+                    -document_id
+                ))
+
+        document_ids = [-candidate[-1] for candidate in sorted(candidates)[:batch_size]]
+        documents = self.filter(pk__in=document_ids).in_bulk()
+
+        return [documents[document_id] for document_id in document_ids
+                if document_id in documents]
+
+    def with_transactions_amounts(self):
+        """
+        Annotates the documents with their settled, pending and chargeable (initial, pending or
+        settled) transactions' amounts, which are then used by the `amount_paid_`,
+        `amount_pending_` and `amount_to_be_charged_in_transaction_currency` properties instead
+        of querying the transactions of each document.
+        """
+
+        Transaction = apps.get_model('silver.Transaction')
+
+        def transactions_amount(states):
+            # An invoice's pk can only be found in the transactions' invoice column and a
+            # proforma's pk in their proforma column
+            return Subquery(
+                Transaction.objects.filter(
+                    Q(invoice=OuterRef('pk')) | Q(proforma=OuterRef('pk')), state__in=states
+                ).order_by().annotate(
+                    amount_sum=Func(F('amount'), function='SUM')
+                ).values('amount_sum')[:1],
+                output_field=models.DecimalField(max_digits=19, decimal_places=2)
+            )
+
+        return self.annotate(**{
+            name: transactions_amount(states)
+            for name, states in BillingDocumentBase.TRANSACTIONS_AMOUNTS_STATES.items()
+        })
+
+    def mark_pdfs_for_generation(self):
+        """
+        Marks the documents' PDFs for generation through a single UPDATE.
+
+        :returns: the number of marked PDFs.
+        """
+
+        return PDF.objects.filter(
+            pk__in=self.order_by().filter(pdf__isnull=False).values('pdf')
+        ).mark_as_dirty()
+
+    def hot(self):
+        return self.filter(archived=False)
+
+    def cold(self):
+        return self.filter(archived=True)
+
+    def archivable(self, horizon):
+        """
+        :param horizon: a timedelta; documents paid or canceled before this long ago can be
+            archived.
+        :returns: the paid or canceled documents which are not archived yet and which were
+            paid or canceled before the horizon.
+        """
+
+        cutoff_date = timezone.now().date() - horizon
+
+        return self.hot().filter(
+            Q(state=BillingDocumentBase.STATES.PAID, paid_date__lt=cutoff_date) |
+            Q(state=BillingDocumentBase.STATES.CANCELED, cancel_date__lt=cutoff_date)
+        )
+
+    def archive(self, batch_size=1000):
+        """
+        Moves the documents out of the hot working set, in batches, so that the tables are not
+        locked for too long.
+
+        :returns: the number of archived documents.
+        """
+
+        archived_count = 0
+
+        while True:
+            documents_ids = list(self.hot().order_by().values_list('pk', flat=True)[:batch_size])
+            if not documents_ids:
+                return archived_count
+
+            archived_count += BillingDocumentBase.objects.filter(
+                pk__in=documents_ids
+            ).update(archived=True)
+
 
 class BillingDocumentManager(models.Manager):
     def get_queryset(self):
@@ -125,6 +271,13 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         (STATES.CANCELED, _('Canceled'))
     )
 
+    # The Transaction.States, by the transactions' amounts kept track of
+    TRANSACTIONS_AMOUNTS_STATES = {
+        'settled_transactions_amount': ['settled'],
+        'pending_transactions_amount': ['pending'],
+        'chargeable_transactions_amount': ['initial', 'pending', 'settled'],
+    }
+
     kind = models.CharField(get_billing_documents_kinds, max_length=8, db_index=True)
     related_document = models.ForeignKey('self', blank=True, null=True, on_delete=models.SET_NULL,
                                          related_name='reverse_related_document')
@@ -172,8 +325,16 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
     _total_in_transaction_currency = models.DecimalField(max_digits=19,
                                                          decimal_places=2,
                                                          null=True, blank=True)
+    # Kept up to date as the document's entries are created, updated or deleted, so that drafts
+    # can be totalled without loading their entries
+    _total_before_tax = models.DecimalField(max_digits=19, decimal_places=2,
+                                            default=Decimal('0.00'), editable=False)
+    _tax_value = models.DecimalField(max_digits=19, decimal_places=2,
+                                     default=Decimal('0.00'), editable=False)
 
     is_storno = models.BooleanField(default=False)
+    # Old paid or canceled documents are archived, leaving them out of the default listings
+    archived = models.BooleanField(default=False, editable=False)
 
     _document_entries = None
 
@@ -184,9 +345,15 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         is_storno
     ]
 
+    # These fields are only written through `refresh_totals` and `update_totals`
+    maintained_totals_fields = ['_total_before_tax', '_tax_value']
+
     class Meta:
         unique_together = ('kind', 'provider', 'series', 'number')
         ordering = ('-issue_date', 'series', '-number')
+        indexes = [
+            models.Index(fields=['archived', 'issue_date'], name='silver_doc_archived_issue'),
+        ]
 
     def __init__(self, *args, **kwargs):
         super(BillingDocumentBase, self).__init__(*args, **kwargs)
@@ -199,8 +366,8 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
                     self.__class__ = subclass
 
     def _get_entries(self):
-        if not self._document_entries:
-            self._document_entries = getattr(self, self.kind + '_entries').all()
+        if self._document_entries is None:
+            self._document_entries = self.entries
 
         return self._document_entries
 
@@ -212,6 +379,43 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         return sum([Decimal(entry.total)
                     for entry in self._get_entries()])
 
+    def update_totals(self, total_before_tax_delta, tax_value_delta):
+        """
+        Atomically adds the given deltas to the document's stored totals.
+        """
+
+        self.__class__._default_manager.filter(pk=self.pk).update(
+            _total_before_tax=F('_total_before_tax') + total_before_tax_delta,
+            _tax_value=F('_tax_value') + tax_value_delta
+        )
+
+        self._set_maintained_totals(self._total_before_tax + total_before_tax_delta,
+                                    self._tax_value + tax_value_delta)
+
+    def refresh_totals(self):
+        """
+        Recomputes the document's stored totals from its entries, using a single query.
+        """
+
+        totals = self.entries.aggregate_totals()
+        total_before_tax, tax_value = totals['total_before_tax'], totals['tax_value']
+
+        self.__class__._default_manager.filter(pk=self.pk).update(
+            _total_before_tax=total_before_tax, _tax_value=tax_value
+        )
+
+        self._set_maintained_totals(total_before_tax, tax_value)
+
+    def _set_maintained_totals(self, total_before_tax, tax_value):
+        self._total_before_tax = total_before_tax
+        self._tax_value = tax_value
+
+        # The values are already in the DB
+        for field_name in self.maintained_totals_fields:
+            for state in (self.initial_state, self.cleaned_state, self.saved_state):
+                if field_name in state:
+                    state[field_name] = getattr(self, field_name)
+
     def mark_for_generation(self):
         self.pdf.mark_as_dirty()
 
@@ -237,6 +441,10 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
             self.transaction_xe_rate = xe_rate
 
     def _issue(self, issue_date=None, due_date=None):
+        self._prepare_issue(issue_date=issue_date, due_date=due_date)
+        self._complete_issue()
+
+    def _prepare_issue(self, issue_date=None, due_date=None):
         if issue_date:
             if not isinstance(issue_date, date):
                 issue_date = datetime.strptime(issue_date, '%Y-%m-%d').date()
@@ -259,12 +467,30 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         if not self.sales_tax_percent:
             self.sales_tax_percent = self.customer.sales_tax_percent
 
+    def _complete_issue(self, maintained_totals_are_fresh=False):
         if not self.number:
             self.number = self._generate_number()
 
         self.archived_customer = self.customer.get_archivable_field_values()
-        self._total = self.compute_total()
-        self._total_in_transaction_currency = self.compute_total_in_transaction_currency()
+        self._freeze_totals(maintained_totals_are_fresh)
+
+    def _freeze_totals(self, maintained_totals_are_fresh=False):
+        if not self._state.adding and \
+                self.saved_state.get('sales_tax_percent') == self.sales_tax_percent:
+            # The maintained totals are computed with the current sales tax
+            if not maintained_totals_are_fresh:
+                self._set_maintained_totals(*self.__class__._default_manager.filter(
+                    pk=self.pk
+                ).values_list(*self.maintained_totals_fields).get())
+
+            self._total = self.total_before_tax + self.tax_value
+        else:
+            self._total = self.compute_total()
+
+        if self.currency == self.transaction_currency:
+            self._total_in_transaction_currency = self._total
+        else:
+            self._total_in_transaction_currency = self.compute_total_in_transaction_currency()
 
     @locking_atomic_transition(field=state, source=STATES.DRAFT, target=STATES.ISSUED)
     def issue(self, issue_date=None, due_date=None):
@@ -327,11 +553,9 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         clone.state = self.STATES.DRAFT
 
         # clone entries too
-        for entry in self._entries:
-            entry_clone = entry.clone()
-            document_type_name = self.__class__.__name__.lower()
-            setattr(entry_clone, document_type_name, clone)
-            entry_clone.save()
+        DocumentEntry.objects.bulk_create_for_document(
+            clone, [entry.clone() for entry in self._entries]
+        )
 
         clone.save()
 
@@ -390,38 +614,64 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         if self.state == self.STATES.ISSUED:
             self._set_transaction_xe_if_missing()
 
+        unsaved_fields = self.get_unsaved_fields()
+        sales_tax_percent_changed = (
+            not self._state.adding and 'sales_tax_percent' in unsaved_fields
+        )
+        number_set_explicitly = (
+            self.number and self.number != getattr(self, '_reserved_number', None) and
+            {'number', 'series', 'provider'} & set(unsaved_fields)
+        )
+
         with db_transaction.atomic():
             # Create pdf object
             if not self.pdf and self.state != self.STATES.DRAFT:
                 self.pdf = PDF.objects.create(upload_path=self.get_pdf_upload_path(), dirty=1)
 
+            if not (args or self._state.adding or kwargs.get('force_insert') or
+                    kwargs.get('update_fields') is not None):
+                self._lock_maintained_totals()
+
             super(BillingDocumentBase, self).save(*args, **kwargs)
 
-    def _generate_number(self, default_starting_number=1):
-        """Generates the number for a proforma/invoice."""
+            if sales_tax_percent_changed:
+                self.refresh_totals()
+
+            if number_set_explicitly:
+                DocumentNumberCounter.record_number(self.kind, self.provider_id, self.series,
+                                                    self.number)
+
+    def _lock_maintained_totals(self):
+        """
+        Locks the document's row and reloads its maintained totals, which are written by
+        `refresh_totals` and `update_totals`, so that saving doesn't overwrite them with
+        possibly stale in-memory values.
+        """
+
+        totals = self.__class__._default_manager.select_for_update().filter(
+            pk=self.pk
+        ).values_list(*self.maintained_totals_fields).first()
+
+        if totals:
+            self._set_maintained_totals(*totals)
+
+    def _get_minimum_number(self, default_starting_number=1):
         default_starting_number = max(default_starting_number, 1)
 
-        documents = self.__class__._default_manager.filter(
-            provider=self.provider, series=self.series
+        if self._starting_number and self.series == self.default_series:
+            return self._starting_number
+
+        return default_starting_number
+
+    def _generate_number(self, default_starting_number=1):
+        """Generates the number for a proforma/invoice."""
+        number = DocumentNumberCounter.reserve_numbers(
+            self.kind, self.provider, self.series,
+            minimum=self._get_minimum_number(default_starting_number)
         )
-        if not documents.exists():
-            # An invoice/proforma with this provider and series does not exist
-            if self.series == self.default_series:
-                return self._starting_number
-            else:
-                return default_starting_number
-        else:
-            # An invoice with this provider and series already exists
-            max_existing_number = documents.aggregate(
-                Max('number')
-            )['number__max']
-            if max_existing_number:
-                if self._starting_number and self.series == self.default_series:
-                    return max(max_existing_number + 1, self._starting_number)
-                else:
-                    return max_existing_number + 1
-            else:
-                return default_starting_number
+        self._reserved_number = number
+
+        return number
 
     def series_number(self):
         if self.series:
@@ -459,22 +709,14 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
 
     @property
     def _entries(self):
-        # entries iterator which replaces the invoice/proforma from the DB with
-        # self. We need this in generate_pdf so that the data in PDF has the
-        # lastest state for the document. Without this we get in template:
+        # fresh entries, bound to self instead of the invoice/proforma from the DB. We need this
+        # in generate_pdf so that the data in PDF has the lastest state for the document.
+        # Without this we get in template:
         #
         # invoice.issue_date != entry.invoice.issue_date
         #
         # which is obviously false.
-        document_type_name = self.__class__.__name__  # Invoice or Proforma
-        kwargs = {document_type_name.lower(): self}
-        entries = DocumentEntry.objects.filter(**kwargs)
-        for entry in entries:
-            if document_type_name.lower() == 'invoice':
-                entry.invoice = self
-            if document_type_name.lower() == 'proforma':
-                entry.proforma = self
-            yield(entry)
+        return self.entries
 
     def get_template_context(self, state=None):
         customer = Customer(**self.archived_customer)
@@ -490,7 +732,7 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
             'state': state
         }
 
-    def get_template(self, state=None):
+    def get_template_names(self, state=None):
         provider_state_template = '{provider}/{kind}_{state}_pdf.html'.format(
             kind=self.kind, provider=self.provider.slug, state=state).lower()
         provider_template = '{provider}/{kind}_pdf.html'.format(
@@ -506,7 +748,10 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         for t in _templates:
             templates.append('billing_documents/' + t)
 
-        return select_template(templates)
+        return templates
+
+    def get_template(self, state=None):
+        return select_template(self.get_template_names(state))
 
     def get_pdf_filename(self):
         return '{doc_type}_{series}-{number}.pdf'.format(
@@ -531,9 +776,25 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
 
         return path_template.format(**context)
 
-    def generate_pdf(self, state=None, upload=True):
-        # !!! ensure this is not called concurrently for the same document
+    def generate_pdf(self, state=None, upload=True, locked=False):
+        """
+        :param locked: whether the caller already holds the PDF's generation lock. Otherwise,
+            the lock is taken when uploading, and the generation is skipped (returning None)
+            while another generation of the same PDF is in progress.
+        """
+
+        if upload and not locked:
+            with self.pdf.generation_lock() as acquired:
+                if acquired is False:
+                    logger.info('The pdf of the %s with id=%s is already being generated.',
+                                self.kind, self.id)
+                    return None
+
+                return self._generate_pdf(state, upload)
 
+        return self._generate_pdf(state, upload)
+
+    def _generate_pdf(self, state, upload):
         context = self.get_template_context(state)
         context['filename'] = self.get_pdf_filename()
 
@@ -563,22 +824,22 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
 
     @property
     def entries(self):
-        raise NotImplementedError
+        return DocumentEntry.objects.for_document(self)
 
     @property
     def total(self):
         if self._total is not None:
             return self._total
 
-        return sum([entry.total for entry in self.entries])
+        return self._total_before_tax + self._tax_value
 
     @property
     def total_before_tax(self):
-        return sum([entry.total_before_tax for entry in self.entries])
+        return self._total_before_tax
 
     @property
     def tax_value(self):
-        return sum([entry.tax_value for entry in self.entries])
+        return self._tax_value
 
     @property
     @require_transaction_currency_and_xe_rate
@@ -601,53 +862,184 @@ class BillingDocumentBase(AutoCleanModelMixin, models.Model):
         return sum([entry.tax_value_in_transaction_currency
                     for entry in self.entries])
 
+    def get_transactions_amounts(self):
+        """
+        :returns: a {name: amount} dict of the document's settled, pending and chargeable
+            transactions' amounts (see TRANSACTIONS_AMOUNTS_STATES), either annotated by
+            `BillingDocumentQuerySet.with_transactions_amounts` or computed through a single
+            aggregate query.
+        """
+
+        names = list(self.TRANSACTIONS_AMOUNTS_STATES.keys())
+
+        if all(name in self.__dict__ for name in names):
+            amounts = {name: self.__dict__[name] for name in names}
+        else:
+            amounts = self.transactions.aggregate(**{
+                name: Sum('amount', filter=Q(state__in=states))
+                for name, states in self.TRANSACTIONS_AMOUNTS_STATES.items()
+            })
+
+        return {name: amount or Decimal('0.00') for name, amount in amounts.items()}
+
+    def invalidate_transactions_amounts(self):
+        """
+        Drops the transactions' amounts annotated by
+        `BillingDocumentQuerySet.with_transactions_amounts`, which are stale once a transaction
+        of the document is created or changed, so that they are aggregated again when needed.
+        """
+
+        for name in self.TRANSACTIONS_AMOUNTS_STATES:
+            self.__dict__.pop(name, None)
+
     @property
     @require_transaction_currency_and_xe_rate
     def amount_paid_in_transaction_currency(self):
-        Transaction = apps.get_model('silver.Transaction')
-
-        return sum([transaction.amount
-                    for transaction in self.transactions.filter(state=Transaction.States.Settled)])
+        return self.get_transactions_amounts()['settled_transactions_amount']
 
     @property
     @require_transaction_currency_and_xe_rate
     def amount_pending_in_transaction_currency(self):
-        Transaction = apps.get_model('silver.Transaction')
-
-        return sum([transaction.amount
-                    for transaction in self.transactions.filter(state=Transaction.States.Pending)])
+        return self.get_transactions_amounts()['pending_transactions_amount']
 
     @property
     @require_transaction_currency_and_xe_rate
     def amount_to_be_charged_in_transaction_currency(self):
-        Transaction = apps.get_model('silver.Transaction')
+        return (self.total_in_transaction_currency -
+                self.get_transactions_amounts()['chargeable_transactions_amount'])
 
-        return self.total_in_transaction_currency - sum([
-            transaction.amount
-            for transaction in self.transactions.filter(state__in=[
-                Transaction.States.Initial,
-                Transaction.States.Pending,
-                Transaction.States.Settled
-            ])
-        ])
 
+def _prepare_transaction_for_document(document, payment_methods):
+    """
+    Runs, in memory, the validation `Transaction.clean` runs for a new transaction of the document
+    (its state, customer, currency and amount).
 
-def create_transaction_for_document(document):
+    :returns: an unsaved transaction through the first of the payment methods which can pay the
+        document, or None if there's no such payment method.
+    """
+
+    Transaction = apps.get_model('silver.Transaction')
+
+    if document.state != BillingDocumentBase.STATES.ISSUED:
+        return None
+
+    # Negative amounts would be rejected by the transaction's amount validator
+    amount = document.amount_to_be_charged_in_transaction_currency
+    if amount is None or amount < 0:
+        return None
+
+    currency = document.transaction_currency
+    for payment_method in payment_methods:
+        if payment_method.customer_id != document.customer_id:
+            continue
+
+        allowed_currencies = payment_method.allowed_currencies
+        if allowed_currencies and currency not in allowed_currencies:
+            continue
+
+        transaction = Transaction(payment_method=payment_method, amount=amount,
+                                  currency=currency)
+        if document.kind == 'invoice':
+            transaction.invoice, transaction.proforma = document, document.related_document
+        else:
+            transaction.proforma, transaction.invoice = document, document.related_document
+
+        return transaction
+
+    return None
+
+
+def create_transaction_for_document(document, payment_methods=None):
     # get a usable, recurring payment_method for the customer
+    PaymentMethod = apps.get_model('silver.PaymentMethod')
+
+    if payment_methods is None:
+        payment_methods = PaymentMethod.objects.filter(
+            canceled=False,
+            verified=True,
+            customer=document.customer
+        )
+
+    transaction = _prepare_transaction_for_document(document, payment_methods)
+    if not transaction:
+        return None
+
+    try:
+        transaction.save()
+    except ValidationError:
+        return None
+
+    return transaction
+
+
+def bulk_create_transactions_for_documents(documents, payment_methods):
+    """
+    Creates a transaction for each of the documents which can be paid through one of the given
+    payment methods, validating them in memory and inserting them in batches. A document's
+    related document is considered paid through the document's transaction.
+
+    :param documents: documents annotated by `BillingDocumentQuerySet.with_transactions_amounts`,
+        so that their amounts to be charged don't need a query each.
+    :param payment_methods: a {customer id: [payment methods]} dict.
+    :returns: the created transactions.
+    """
+
+    Transaction = apps.get_model('silver.Transaction')
+
+    transactions, paid_documents_ids = [], set()
+    for document in documents:
+        if document.pk in paid_documents_ids:
+            continue
+
+        transaction = _prepare_transaction_for_document(
+            document, payment_methods.get(document.customer_id, [])
+        )
+        if transaction:
+            transactions.append(transaction)
+            paid_documents_ids.update({transaction.invoice_id, transaction.proforma_id})
+
+    return Transaction.objects.bulk_create_prevalidated(transactions)
+
+
+def create_transactions_for_documents(documents):
+    """
+    Batched counterpart of `create_transaction_for_document`, which skips the documents that
+    already have a pending, initial or settled transaction.
+
+    :returns: the created transactions.
+    """
+
     PaymentMethod = apps.get_model('silver.PaymentMethod')
     Transaction = apps.get_model('silver.Transaction')
 
-    payment_methods = PaymentMethod.objects.filter(
+    documents_ids = [document.pk for document in documents]
+    documents_with_transactions = set()
+    for invoice_id, proforma_id in Transaction.objects.filter(
+        models.Q(invoice__in=documents_ids) | models.Q(proforma__in=documents_ids),
+        state__in=[Transaction.States.Pending,
+                   Transaction.States.Initial,
+                   Transaction.States.Settled]
+    ).values_list('invoice_id', 'proforma_id'):
+        documents_with_transactions.update({invoice_id, proforma_id})
+
+    payment_methods = defaultdict(list)
+    for payment_method in PaymentMethod.objects.filter(
         canceled=False,
         verified=True,
-        customer=document.customer
+        customer__in={document.customer_id for document in documents}
+    ):
+        payment_methods[payment_method.customer_id].append(payment_method)
+
+    annotated_documents = BillingDocumentBase.objects.filter(
+        pk__in=[document_id for document_id in documents_ids
+                if document_id not in documents_with_transactions]
+    ).with_transactions_amounts().in_bulk()
+
+    return bulk_create_transactions_for_documents(
+        [annotated_documents[document_id] for document_id in documents_ids
+         if document_id in annotated_documents],
+        payment_methods
     )
-    for payment_method in payment_methods:
-        try:
-            return Transaction.objects.create(document=document,
-                                              payment_method=payment_method)
-        except ValidationError:
-            continue
 
 
 @receiver(post_save)
@@ -682,3 +1074,94 @@ def post_document_save(sender, instance, created=False, **kwargs):
 
     # Generate a PDF
     document.mark_for_generation()
+
+
+def _get_entry_documents_totals_deltas(entry, old_state, new_state):
+    deltas = {}
+
+    for field_name, sign, state in (('invoice', -1, old_state), ('invoice', 1, new_state),
+                                    ('proforma', -1, old_state), ('proforma', 1, new_state)):
+        document_id = state.get(field_name)
+        if not document_id:
+            continue
+
+        cached_document = DocumentEntry._meta.get_field(field_name).get_cached_value(entry, None)
+        if cached_document is None or cached_document.pk != document_id:
+            cached_document = None
+
+        document_deltas = deltas.setdefault(document_id, {'document': cached_document,
+                                                          'quantities': []})
+        document_deltas['quantities'].append(
+            (sign, state.get('quantity'), state.get('unit_price'))
+        )
+
+    return deltas
+
+
+def _update_entry_documents_totals(entry, old_state, new_state):
+    for document_id, document_deltas in _get_entry_documents_totals_deltas(
+        entry, old_state, new_state
+    ).items():
+        document = (document_deltas['document'] or
+                    BillingDocumentBase.objects.filter(pk=document_id).first())
+        if not document:
+            # The document is being deleted as well
+            continue
+
+        if any(quantity is None or unit_price is None
+               for _, quantity, unit_price in document_deltas['quantities']):
+            # Deferred fields, the contribution is unknown
+            document.refresh_totals()
+            continue
+
+        total_before_tax_delta = tax_value_delta = Decimal('0.00')
+        for sign, quantity, unit_price in document_deltas['quantities']:
+            total_before_tax = DocumentEntry.compute_total_before_tax(quantity, unit_price)
+
+            total_before_tax_delta += sign * total_before_tax
+            tax_value_delta += sign * DocumentEntry.compute_tax_value(
+                total_before_tax, document.sales_tax_percent
+            )
+
+        if total_before_tax_delta or tax_value_delta:
+            document.update_totals(total_before_tax_delta, tax_value_delta)
+
+
+@receiver(post_save, sender=DocumentEntry)
+def update_documents_totals_on_entry_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+
+    old_state = {} if created else instance.saved_state
+
+    _update_entry_documents_totals(instance, old_state, instance.current_state)
+
+
+@receiver(post_delete, sender=DocumentEntry)
+def update_documents_totals_on_entry_delete(sender, instance, **kwargs):
+    old_state = instance.saved_state or instance.current_state
+
+    deleted_document_ids = getattr(instance, '_deleted_document_ids', ())
+    old_state = {key: value for key, value in old_state.items()
+                 if key not in ('invoice', 'proforma') or value not in deleted_document_ids}
+
+    _update_entry_documents_totals(instance, old_state, {})
+
+
+@receiver(pre_delete)
+def track_documents_deletion(sender, instance, **kwargs):
+    # The pre_delete signals of a deletion are all sent before any row is deleted, the
+    # documents' ones before their entries' ones
+    if isinstance(instance, BillingDocumentBase):
+        _get_documents_being_deleted()[instance.pk] = instance
+    elif isinstance(instance, DocumentEntry):
+        documents = _get_documents_being_deleted()
+        instance._deleted_document_ids = {document_id
+                                          for document_id in (instance.invoice_id, instance.proforma_id)
+                                          if document_id in documents}
+
+
+@receiver(post_delete)
+def untrack_documents_deletion(sender, instance, **kwargs):
+    if isinstance(instance, BillingDocumentBase):
+        _get_documents_being_deleted().pop(instance.pk, None)
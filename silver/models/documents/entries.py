@@ -23,12 +23,146 @@ from enum import Enum
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.query import ModelIterable
 
 from silver.utils.decorators import require_transaction_currency_and_xe_rate
-from silver.utils.models import AutoCleanModelMixin
+from silver.utils.numbers import from_minor_units
+from silver.utils.models import AutoCleanModelMixin, to_minor_units_expression
+
+
+def _as_amount(cents):
+    return ExpressionWrapper(cents * Value(Decimal('0.01')),
+                             output_field=models.DecimalField(max_digits=19, decimal_places=2))
+
+
+class DocumentEntryIterable(ModelIterable):
+    """
+    Binds the documents the queryset was restricted to (see `for_document`) to the entries.
+    """
+
+    def __iter__(self):
+        documents = self.queryset._bound_documents
+
+        for entry in super().__iter__():
+            for field_name in ('invoice', 'proforma'):
+                document = documents.get(getattr(entry, field_name + '_id'))
+                if document:
+                    setattr(entry, field_name, document)
+
+            yield entry
+
+
+class DocumentEntryQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._iterable_class = DocumentEntryIterable
+        self._bound_documents = {}
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._bound_documents = self._bound_documents
+
+        return clone
+
+    def for_document(self, document):
+        """
+        :returns: the document's entries, with the document (and its related document, which
+            also references entries moved from a proforma to its invoice, if it's already
+            loaded) bound to each of them, so that computing their totals or rendering them
+            doesn't query the parents again.
+        """
+
+        queryset = self.filter(**{document.kind: document})
+        queryset._bound_documents = {**self._bound_documents, document.pk: document}
+
+        if document.related_document_id and type(document).related_document.is_cached(document):
+            queryset._bound_documents[document.related_document_id] = document.related_document
+
+        return queryset
+
+    @staticmethod
+    def _totals_in_cents():
+        sales_tax_percent = Coalesce(
+            Case(When(invoice__isnull=False, then=F('invoice__sales_tax_percent')),
+                 default=F('proforma__sales_tax_percent')),
+            Value(Decimal('0.00'))
+        )
+
+        # The products are computed in DECIMAL, where they can't overflow, and only the
+        # rounded cents are integers
+        total_before_tax = to_minor_units_expression(F('quantity') * F('unit_price'), 2)
+        tax_value = to_minor_units_expression(
+            total_before_tax * sales_tax_percent * Value(Decimal('0.0001')), 2
+        )
+
+        return total_before_tax, tax_value
+
+    def with_totals(self):
+        """
+        Annotates `annotated_total_before_tax`, `annotated_tax_value` and `annotated_total`,
+        computed in SQL the same way (and with the same rounding) as the entries' properties.
+        """
+
+        total_before_tax, tax_value = self._totals_in_cents()
+
+        return self.annotate(
+            annotated_total_before_tax=_as_amount(total_before_tax),
+            annotated_tax_value=_as_amount(tax_value),
+            annotated_total=_as_amount(total_before_tax + tax_value),
+        )
+
+    def bulk_create_for_document(self, document, entries, batch_size=1000):
+        """
+        Attaches the given unsaved entries to the document, validates them in memory and
+        inserts them in bulk, then refreshes the document's maintained totals (which the
+        entries' save signals would otherwise have kept up to date).
+
+        :returns: the created entries.
+        """
+
+        # The referenced document and product codes are already saved, so the foreign keys
+        # are not validated against the database for each entry
+        exclude = ['invoice', 'proforma', 'product_code']
+
+        for entry in entries:
+            setattr(entry, document.kind, document)
+            entry.full_clean(exclude=exclude)
+
+        entries = self.bulk_create(entries, batch_size=batch_size)
+
+        for entry in entries:
+            if entry.pk:
+                entry.initial_state = entry.current_state.copy()
+                entry.saved_state = entry.current_state.copy()
+
+        document.refresh_totals()
+
+        return entries
+
+    def aggregate_totals(self):
+        """
+        :returns: a dict with the entries' summed `total_before_tax`, `tax_value` and `total`,
+            computed in a single query.
+        """
+
+        total_before_tax, tax_value = self._totals_in_cents()
+
+        # Summing cents keeps the result exact on every database
+        totals = self.order_by().aggregate(
+            total_before_tax=Sum(total_before_tax, output_field=models.BigIntegerField()),
+            tax_value=Sum(tax_value, output_field=models.BigIntegerField()),
+        )
+        totals['total'] = (totals['total_before_tax'] or 0) + (totals['tax_value'] or 0)
+
+        return {key: from_minor_units(value or 0, 2) for key, value in totals.items()}
 
 
 class DocumentEntry(AutoCleanModelMixin, models.Model):
+    objects = DocumentEntryQuerySet.as_manager()
+
     description = models.TextField()
     unit = models.CharField(max_length=1024, blank=True, null=True)
     quantity = models.DecimalField(max_digits=19, decimal_places=4,
@@ -71,8 +205,7 @@ class DocumentEntry(AutoCleanModelMixin, models.Model):
 
     @property
     def total_before_tax(self):
-        result = Decimal(self.quantity * self.unit_price)
-        return result.quantize(Decimal('0.00'))
+        return self.compute_total_before_tax(self.quantity, self.unit_price)
 
     @property
     def tax_value(self):
@@ -83,10 +216,19 @@ class DocumentEntry(AutoCleanModelMixin, models.Model):
         else:
             sales_tax_percent = None
 
+        return self.compute_tax_value(self.total_before_tax, sales_tax_percent)
+
+    @staticmethod
+    def compute_total_before_tax(quantity, unit_price):
+        result = Decimal(quantity * unit_price)
+        return result.quantize(Decimal('0.00'))
+
+    @staticmethod
+    def compute_tax_value(total_before_tax, sales_tax_percent):
         if not sales_tax_percent:
             return Decimal('0.00')
 
-        result = self.total_before_tax * sales_tax_percent / 100
+        result = total_before_tax * sales_tax_percent / 100
         return result.quantize(Decimal('0.00'))
 
     @property
@@ -147,7 +289,7 @@ class DocumentEntry(AutoCleanModelMixin, models.Model):
             unit=self.unit,
             quantity=self.quantity,
             unit_price=self.unit_price,
-            product_code=self.product_code,
+            product_code_id=self.product_code_id,
             start_date=self.start_date,
             end_date=self.end_date,
             prorated=self.prorated
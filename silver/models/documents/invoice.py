@@ -70,10 +70,6 @@ class Invoice(BillingDocumentBase):
         except Provider.DoesNotExist:
             return ''
 
-    @property
-    def entries(self):
-        return self.invoice_entries.all()
-
     def create_storno(self):
         if self.is_storno:
             raise ValueError("This invoice is already a storno one.")
@@ -96,16 +92,15 @@ class Invoice(BillingDocumentBase):
                 transaction_xe_date=self.transaction_xe_date,
                 transaction_xe_rate=self.transaction_xe_rate,
             )
-            storno_invoice.invoice_entries.add(*[DocumentEntry.objects.create(
+            DocumentEntry.objects.bulk_create_for_document(storno_invoice, [DocumentEntry(
                 description="Storno " + entry.description,
                 unit_price=-entry.unit_price,
                 unit=entry.unit,
                 quantity=entry.quantity,
-                product_code=entry.product_code,
+                product_code_id=entry.product_code_id,
                 start_date=entry.start_date,
                 end_date=entry.end_date,
                 prorated=entry.prorated,
-                invoice=storno_invoice,
             ) for entry in self.entries])
 
             return storno_invoice
@@ -0,0 +1,161 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+
+
+class DocumentNumberCounter(models.Model):
+    """
+    Holds the last number allocated to a (kind, provider, series) of billing documents, so that
+    numbers are allocated by incrementing a single locked row instead of aggregating over all of
+    the series' documents.
+    """
+
+    kind = models.CharField(max_length=8)
+    provider = models.ForeignKey('Provider', on_delete=models.CASCADE,
+                                 related_name='document_number_counters')
+    series = models.CharField(max_length=20, blank=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'provider', 'series')
+
+    def __str__(self):
+        return '{kind} {series}: {last_number}'.format(kind=self.kind, series=self.series,
+                                                       last_number=self.last_number)
+
+    @classmethod
+    def _get_max_number(cls, kind, provider_id, series):
+        BillingDocumentBase = apps.get_model('silver.BillingDocumentBase')
+
+        documents = BillingDocumentBase.objects.filter(kind=kind, provider_id=provider_id)
+        if series:
+            documents = documents.filter(series=series)
+        else:
+            documents = documents.filter(models.Q(series='') | models.Q(series__isnull=True))
+
+        return documents.order_by().aggregate(Max('number'))['number__max'] or 0
+
+    @classmethod
+    def _get_locked_counter(cls, kind, provider_id, series):
+        counters = cls.objects.select_for_update().filter(kind=kind, provider_id=provider_id,
+                                                          series=series)
+        counter = counters.first()
+        if counter:
+            return counter
+
+        # First allocation in this series, seed the counter from the existing documents
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    kind=kind, provider_id=provider_id, series=series,
+                    last_number=cls._get_max_number(kind, provider_id, series)
+                )
+        except IntegrityError:
+            # Concurrently created
+            return counters.get()
+
+    @classmethod
+    def reserve_numbers(cls, kind, provider, series, count=1, minimum=1):
+        """
+        Reserves a block of `count` consecutive numbers, none lower than `minimum`. The counter
+        row stays locked until the end of the surrounding transaction, and the numbers are
+        released if that transaction is rolled back.
+
+        :returns: the first of the reserved numbers.
+        """
+
+        provider_id = getattr(provider, 'pk', provider)
+
+        with transaction.atomic():
+            counter = cls._get_locked_counter(kind, provider_id, series or '')
+
+            first_number = max(counter.last_number + 1, minimum or 1)
+
+            counter.last_number = first_number + count - 1
+            counter.save(update_fields=['last_number'])
+
+        return first_number
+
+    @classmethod
+    def assign_numbers(cls, documents):
+        """
+        Numbers the given unnumbered documents, reserving a single block of numbers for each
+        of their (kind, provider, series), in the order in which the documents are given.
+        """
+
+        documents_by_series = defaultdict(list)
+        for document in documents:
+            if not document.number:
+                documents_by_series[
+                    (document.kind, document.provider_id, document.series or '')
+                ].append(document)
+
+        with transaction.atomic():
+            for (kind, provider_id, series), series_documents in documents_by_series.items():
+                first_number = cls.reserve_numbers(
+                    kind, provider_id, series, count=len(series_documents),
+                    minimum=series_documents[0]._get_minimum_number()
+                )
+
+                for number, document in enumerate(series_documents, start=first_number):
+                    document.number = number
+                    document._reserved_number = number
+
+    @classmethod
+    def record_number(cls, kind, provider, series, number):
+        """
+        Makes sure a number that was set explicitly won't be allocated again.
+        """
+
+        cls.objects.filter(
+            kind=kind, provider_id=getattr(provider, 'pk', provider), series=series or ''
+        ).update(last_number=Greatest(F('last_number'), number))
+
+    @classmethod
+    def seed(cls):
+        """
+        (Re)seeds the counters from the numbers of the existing documents. Counters are never
+        moved backwards.
+
+        :returns: the number of seeded counters.
+        """
+
+        BillingDocumentBase = apps.get_model('silver.BillingDocumentBase')
+
+        max_numbers = BillingDocumentBase.objects.order_by().filter(
+            number__isnull=False
+        ).values_list('kind', 'provider_id', 'series').annotate(Max('number'))
+
+        seeded = 0
+        with transaction.atomic():
+            for kind, provider_id, series, max_number in max_numbers:
+                counter, created = cls.objects.select_for_update().get_or_create(
+                    kind=kind, provider_id=provider_id, series=series or '',
+                    defaults={'last_number': max_number}
+                )
+                if not created and counter.last_number < max_number:
+                    counter.last_number = max_number
+                    counter.save(update_fields=['last_number'])
+
+                seeded += 1
+
+        return seeded
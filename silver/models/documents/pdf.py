@@ -14,26 +14,34 @@
 
 from __future__ import absolute_import
 
+import hashlib
 import logging
 import uuid
-from io import BytesIO, SEEK_SET
+from contextlib import contextmanager
+from io import SEEK_SET
 
-from xhtml2pdf import pisa
+from redis.exceptions import LockError, RedisError
 
 from django.conf import settings
 from django.db import transaction
 from django.db.models import (
-    Model, FileField, TextField, UUIDField, PositiveIntegerField, F, IntegerField
+    Model, CharField, FileField, TextField, UUIDField, PositiveIntegerField, F, IntegerField,
+    Case, QuerySet, Value, When
 )
 from django.db.models.functions import Greatest, Cast
 from django.utils.module_loading import import_string
 from django.core.files import File
 
-from silver.utils.pdf import fetch_resources
+from silver.pdf_backends import get_pdf_backend
+from silver.vendors.redis_server import redis
 
 logger = logging.getLogger(__name__)
 
 
+# How long a generation may hold a PDF's lock
+PDF_GENERATION_LOCK_TIMEOUT = getattr(settings, 'SILVER_PDF_GENERATION_LOCK_TIMEOUT', 60 * 5)
+
+
 def get_storage():
     storage_settings = getattr(settings, 'SILVER_DOCUMENT_STORAGE', None)
     if not storage_settings:
@@ -47,56 +55,160 @@ def get_upload_path(instance, filename):
     return instance.upload_path
 
 
+def render_pdf(html):
+    """
+    Renders the given HTML into a PDF, with the backend set by SILVER_PDF_BACKEND.
+
+    :returns: a (file object holding the PDF, error) tuple.
+    """
+
+    return get_pdf_backend().render(html)
+
+
+class PDFQuerySet(QuerySet):
+    def mark_as_dirty(self):
+        """
+        Marks the PDFs for generation through a single UPDATE.
+
+        :returns: the number of marked PDFs.
+        """
+
+        return self.update(dirty=Greatest(F('dirty') + 1, 1))
+
+    def mark_as_clean(self, pdfs):
+        """
+        Marks the given PDFs as generated through a single UPDATE. Like `PDF.mark_as_clean`,
+        each PDF's dirty counter is decreased by its (in-memory) value, so the PDFs marked dirty
+        again since they were loaded stay dirty. The given instances are not refreshed.
+
+        :returns: the number of marked PDFs.
+        """
+
+        dirty_pdfs = [pdf for pdf in pdfs if pdf.dirty]
+        if not dirty_pdfs:
+            return 0
+
+        generated_dirty_counts = Case(
+            *[When(pk=pdf.pk, then=Value(pdf.dirty)) for pdf in dirty_pdfs],
+            default=Value(0), output_field=IntegerField()
+        )
+
+        return self.filter(pk__in=[pdf.pk for pdf in dirty_pdfs]).update(
+            dirty=Greatest(Cast('dirty', IntegerField()) - generated_dirty_counts, 0)
+        )
+
+
 class PDF(Model):
     uuid = UUIDField(default=uuid.uuid4, unique=True)
     pdf_file = FileField(null=True, blank=True, editable=False,
                          storage=get_storage(), upload_to=get_upload_path)
     dirty = PositiveIntegerField(default=0)
     upload_path = TextField(null=True, blank=True)
+    # The hash of the HTML the uploaded PDF was rendered from
+    content_hash = CharField(max_length=64, null=True, blank=True, editable=False)
+
+    objects = PDFQuerySet.as_manager()
 
     @property
     def url(self):
         return self.pdf_file.url if self.pdf_file else None
 
+    def get_content_hash(self, html, filename):
+        # The backend is part of the hash, so that changing SILVER_PDF_BACKEND renders the PDFs
+        # again
+        content = '\n'.join([
+            get_pdf_backend().name or '', self.upload_path or '', filename or '', html
+        ])
+
+        return hashlib.sha256(content.encode('UTF-8')).hexdigest()
+
+    def is_up_to_date(self, content_hash):
+        """
+        :returns: True if the uploaded PDF was rendered from the content with the given hash,
+            in which case rendering and uploading it again can be skipped.
+        """
+
+        return bool(self.pdf_file and self.content_hash == content_hash)
+
+    @contextmanager
+    def generation_lock(self, blocking_timeout=0):
+        """
+        A Redis lock ensuring the PDF isn't generated concurrently, shared by all the generation
+        paths (the generate_pdf task, the rendering pool and the on-demand rendering).
+
+        :param blocking_timeout: the seconds to wait for the lock (by default, it isn't waited
+            for).
+        :yields: True if the lock was acquired, False if another generation holds it or None
+            if Redis couldn't be reached, in which case the generation goes on without the lock.
+        """
+
+        lock = redis.lock('silver_pdf_{pdf_id}'.format(pdf_id=self.id),
+                          timeout=PDF_GENERATION_LOCK_TIMEOUT,
+                          blocking_timeout=blocking_timeout)
+        try:
+            acquired = lock.acquire(blocking=bool(blocking_timeout))
+        except RedisError:
+            logger.warning('Could not lock the pdf with id=%s, generating it without the lock.',
+                           self.id, exc_info=True)
+            acquired = None
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except (LockError, RedisError):
+                    logger.warning('Could not release the lock of the pdf with id=%s.',
+                                   self.id, exc_info=True)
+
     def generate(self, template, context, upload=True):
+        """
+        :returns: the rendered PDF file object, or None if the rendering failed or if the
+            uploaded PDF was already rendered from the same content (the PDF is then only
+            marked as clean).
+        """
+
         html = template.render(context)
-        pdf_file_object = BytesIO()
-        pisa_status = pisa.pisaDocument(
-            src=BytesIO(html.encode("UTF-8")),
-            dest=pdf_file_object,
-            encoding='UTF-8',
-            link_callback=fetch_resources
-        )
 
-        if pisa_status.err:
+        content_hash = self.get_content_hash(html, context.get('filename'))
+        if upload and self.is_up_to_date(content_hash):
+            self.mark_as_clean()
+            return
+
+        pdf_file_object, error = render_pdf(html)
+
+        if error:
             logger.error(
-                'xhtml2pdf encountered exception during generation of pdf %s: %s',
+                'Encountered exception during generation of pdf %s: %s',
                 context['filename'],
-                pisa_status.err
+                error
             )
             return
 
         if upload:
             self.upload(
                 pdf_file_object=pdf_file_object,
-                filename=context['filename']
+                filename=context['filename'],
+                content_hash=content_hash
             )
 
         return pdf_file_object
 
-    def upload(self, pdf_file_object, filename):
+    def upload(self, pdf_file_object, filename, content_hash=None):
         # the PDF's upload_path attribute needs to be set before calling this method
 
         # set offset to beginning to fix bug with google cloud storage
         pdf_file_object.seek(0, SEEK_SET)
         django_file = File(pdf_file_object)
         with transaction.atomic():
+            self.content_hash = content_hash
             self.pdf_file.save(filename, django_file, True)
             self.mark_as_clean()
 
     def mark_as_dirty(self):
         with transaction.atomic():
-            PDF.objects.filter(id=self.id).update(dirty=Greatest(F('dirty') + 1, 1))
+            PDF.objects.filter(id=self.id).mark_as_dirty()
             self.refresh_from_db(fields=['dirty'])
 
     def mark_as_clean(self):
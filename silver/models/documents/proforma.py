@@ -114,6 +114,8 @@ class Proforma(BillingDocumentBase):
         # For all the entries in the proforma => add the link to the new
         # invoice
         DocumentEntry.objects.filter(proforma=self).update(invoice=invoice)
+        invoice.refresh_totals()
+
         return invoice
 
     @property
@@ -136,10 +138,6 @@ class Proforma(BillingDocumentBase):
                   'transaction_xe_date']
         return {field: getattr(self, field, None) for field in fields}
 
-    @property
-    def entries(self):
-        return self.proforma_entries.all()
-
     @property
     def invoice(self):
         return self.related_document
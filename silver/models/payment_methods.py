@@ -14,12 +14,14 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import logging
+
 from typing import Union
 
 from itertools import chain
 
 from annoying.functions import get_object_or_None
-from cryptography.fernet import InvalidToken, Fernet
+from cryptography.fernet import InvalidToken
 from django.core.serializers.json import DjangoJSONEncoder
 from django_fsm import TransitionNotAllowed
 from model_utils.managers import InheritanceManager
@@ -33,8 +35,13 @@ from django.utils import timezone
 
 from silver import payment_processors
 from silver.models import Invoice, Proforma
+from silver.models.documents.base import bulk_create_transactions_for_documents
 from silver.models.billing_entities import Customer
 from silver.models.transactions import Transaction
+from silver.utils.encryption import get_payment_method_cipher, iter_encrypted_values
+
+
+logger = logging.getLogger(__name__)
 
 
 class PaymentMethodInvalid(Exception):
@@ -81,13 +88,12 @@ class PaymentMethod(models.Model):
         super(PaymentMethod, self).__init__(*args, **kwargs)
 
         if self.id:
-            try:
-                payment_method_class = self.get_payment_processor().payment_method_class
+            payment_method_class = payment_processors.get_payment_method_class(
+                self.payment_processor
+            )
 
-                if payment_method_class:
-                    self.__class__ = payment_method_class
-            except AttributeError:
-                pass
+            if payment_method_class:
+                self.__class__ = payment_method_class
 
     @property
     def transactions(self):
@@ -102,23 +108,45 @@ class PaymentMethod(models.Model):
 
         super(PaymentMethod, self).delete(using=using)
 
+    def __getstate__(self):
+        state = super(PaymentMethod, self).__getstate__()
+        # The decrypted data must not end up in caches or pickles of the payment method
+        state.pop('_decrypted_data_cache', None)
+
+        return state
+
+    @property
+    def _decrypted_data(self):
+        # The already decrypted values, by their encrypted value
+        return self.__dict__.setdefault('_decrypted_data_cache', {})
+
     def encrypt_data(self, data: Union[str, bytes]) -> str:
         if isinstance(data, str):
             data = data.encode(encoding="utf-8")
 
-        key = settings.PAYMENT_METHOD_SECRET
-        return Fernet(key).encrypt(data).decode('utf-8')
+        crypted_data = get_payment_method_cipher().encrypt(data).decode('utf-8')
+        self._decrypted_data[crypted_data] = data.decode('utf-8')
+
+        return crypted_data
 
     def decrypt_data(self, crypted_data: Union[str, bytes]) -> str:
         if not crypted_data:
             return ""
 
-        if isinstance(crypted_data, str):
-            crypted_data = crypted_data.encode(encoding="utf-8")
+        if isinstance(crypted_data, bytes):
+            crypted_data = crypted_data.decode(encoding="utf-8")
+
+        try:
+            return self._decrypted_data[crypted_data]
+        except KeyError:
+            pass
 
-        key = settings.PAYMENT_METHOD_SECRET
+        data = get_payment_method_cipher().decrypt(
+            crypted_data.encode(encoding="utf-8")
+        ).decode("utf-8")
+        self._decrypted_data[crypted_data] = data
 
-        return Fernet(key).decrypt(crypted_data).decode("utf-8")
+        return data
 
     def cancel(self):
         if self.canceled:
@@ -203,21 +231,29 @@ def create_transactions_for_issued_documents(payment_method):
     if payment_method.canceled or not payment_method.verified:
         return []
 
-    transactions = []
-
-    for document in chain(
+    documents = chain(
         Proforma.objects.filter(related_document=None, customer=customer,
-                                state=Proforma.STATES.ISSUED),
-        Invoice.objects.filter(state=Invoice.STATES.ISSUED, customer=customer)
-    ):
-        try:
-            transactions.append(Transaction.objects.create(
-                document=document, payment_method=payment_method
-            ))
-        except ValidationError:
-            continue
-
-    return transactions
+                                state=Proforma.STATES.ISSUED).with_transactions_amounts(),
+        Invoice.objects.filter(state=Invoice.STATES.ISSUED,
+                               customer=customer).with_transactions_amounts()
+    )
+
+    return bulk_create_transactions_for_documents(documents, {customer.id: [payment_method]})
+
+
+def decrypt_payment_methods_data(payment_methods):
+    """
+        Decrypts, once per payment method, the values of the payment methods' data that look
+        encrypted, so that the following `decrypt_data` calls don't decrypt them again.
+        The values which can't be decrypted are left to be handled by `decrypt_data`.
+    """
+    for payment_method in payment_methods:
+        for crypted_data in iter_encrypted_values(payment_method.data or {}):
+            try:
+                payment_method.decrypt_data(crypted_data)
+            except InvalidToken:
+                logger.warning('Could not decrypt the data of the payment method with id=%s.',
+                               payment_method.id)
 
 
 @receiver(pre_save)
@@ -49,7 +49,7 @@ from silver.models.documents import DocumentEntry
 from silver.models.fields import field_template_path
 from silver.utils.dates import ONE_DAY, first_day_of_month, first_day_of_interval, end_of_interval, monthdiff, \
     monthdiff_as_fraction
-from silver.utils.numbers import quantize_fraction
+from silver.utils.numbers import as_fraction, quantize_fraction, quantize_product
 from silver.validators import validate_reference
 
 
@@ -835,7 +835,7 @@ class Subscription(models.Model):
         prorated, fraction = self._get_proration_status_and_fraction(start_date,
                                                                      end_date,
                                                                      OriginType.Plan)
-        plan_price = quantize_fraction(Fraction(str(self.plan.amount)) * fraction)
+        plan_price = quantize_product(self.plan.amount, fraction)
 
         context = self._build_entry_context({
             'name': self.plan.name,
@@ -1093,7 +1093,7 @@ class Subscription(models.Model):
                                                                      end_date,
                                                                      OriginType.Plan)
 
-        plan_price = quantize_fraction(Fraction(str(self.plan.amount)) * fraction)
+        plan_price = quantize_product(self.plan.amount, fraction)
 
         base_context = {
             'name': self.plan.name,
@@ -1128,13 +1128,13 @@ class Subscription(models.Model):
     def _included_units_from_bonuses(
         self, metered_feature, start_date, end_date, extra_proration_fraction: Fraction, bonuses: List
     ):
-        included_units = extra_proration_fraction * Fraction(metered_feature.included_units or Decimal(0))
+        included_units = extra_proration_fraction * as_fraction(metered_feature.included_units or Decimal(0))
 
         return sum(
             [
                 (
-                    Fraction(str(bonus.amount)) if bonus.amount else
-                    Fraction(str(bonus.amount_percentage)) / 100 * included_units
+                    as_fraction(bonus.amount) if bonus.amount else
+                    as_fraction(bonus.amount_percentage) / 100 * included_units
                 ) * bonus.extra_proration_fraction(self, start_date, end_date, OriginType.MeteredFeature)[0]
                 for bonus in bonuses
             ]
@@ -1142,7 +1142,7 @@ class Subscription(models.Model):
 
     def _get_extra_consumed_units(self, metered_feature, extra_proration_fraction: Fraction,
                                   start_datetime, end_datetime, bonuses=None) -> OverageInfo:
-        included_units = extra_proration_fraction * Fraction(metered_feature.included_units or Decimal(0))
+        included_units = extra_proration_fraction * as_fraction(metered_feature.included_units or Decimal(0))
 
         log_entries = self.mf_log_entries.filter(
             metered_feature=metered_feature,
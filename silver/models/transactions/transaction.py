@@ -41,6 +41,42 @@ from silver.utils.transition import locking_atomic_transition
 logger = logging.getLogger(__name__)
 
 
+class TransactionQuerySet(models.QuerySet):
+    def bulk_create_prevalidated(self, transactions, batch_size=500):
+        """
+        Inserts new transactions, which were already validated in memory (see
+        `create_transactions_for_documents`), through batched INSERTs instead of saving and
+        cleaning them one by one, then sends their post_save signals.
+
+        :returns: the created transactions.
+        """
+
+        transactions = list(transactions)
+        if not transactions:
+            return []
+
+        with transaction.atomic():
+            self.bulk_create(transactions, batch_size=batch_size)
+
+            # Not every database backend returns the primary keys of the inserted rows
+            created_without_pk = [instance for instance in transactions if instance.pk is None]
+            for start in range(0, len(created_without_pk), batch_size):
+                batch = created_without_pk[start:start + batch_size]
+                pks = dict(self.filter(
+                    uuid__in=[instance.uuid for instance in batch]
+                ).values_list('uuid', 'pk'))
+
+                for instance in batch:
+                    instance.pk = pks[instance.uuid]
+
+            for instance in transactions:
+                instance._init_states()
+                post_save.send(sender=self.model, instance=instance, created=True,
+                               update_fields=None, raw=False, using=instance._state.db)
+
+        return transactions
+
+
 class Transaction(AutoCleanModelMixin, models.Model):
     _provider = None
 
@@ -86,9 +122,10 @@ class Transaction(AutoCleanModelMixin, models.Model):
                                 on_delete=models.SET_NULL, related_name='invoice_transactions')
 
     payment_method = models.ForeignKey('PaymentMethod', on_delete=models.PROTECT)
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, db_index=True)
     valid_until = models.DateTimeField(null=True, blank=True)
     last_access = models.DateTimeField(null=True, blank=True)
+    status_fetched_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = AutoDateTimeField(default=timezone.now)
@@ -107,6 +144,8 @@ class Transaction(AutoCleanModelMixin, models.Model):
         null=True, blank=True
     )
 
+    objects = TransactionQuerySet.as_manager()
+
     strict_fields = [amount, currency, payment_method]
 
     @property
@@ -295,6 +334,13 @@ class Transaction(AutoCleanModelMixin, models.Model):
 def post_transaction_save(sender, instance, **kwargs):
     transaction = instance
 
+    # The documents' annotated transactions' amounts no longer account for this transaction
+    for field in ('invoice', 'proforma'):
+        if Transaction._meta.get_field(field).is_cached(transaction):
+            document = getattr(transaction, field)
+            if document:
+                document.invalidate_transactions_amounts()
+
     if hasattr(transaction, 'state_recently_transitioned_to'):
         delattr(transaction, 'state_recently_transitioned_to')
         transaction.update_document_state()
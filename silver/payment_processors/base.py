@@ -14,7 +14,11 @@
 
 from __future__ import absolute_import
 
+import threading
+
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.template.loader import select_template
 from django.utils.deconstruct import deconstructible
 from django.utils.encoding import force_str
@@ -22,11 +26,33 @@ from django.utils.module_loading import import_string
 from django.utils.text import slugify
 
 
+# The configured payment processors are instantiated once per process
+_instances = {}
+_payment_method_classes = {}
+_instances_lock = threading.Lock()
+
+# The sessions created by the processors, per thread. The generation is increased when the
+# instances are cleared, so that the threads don't reuse the closed sessions.
+_sessions = threading.local()
+_sessions_generation = 0
+_all_sessions = []
+_sessions_lock = threading.Lock()
+
+
 def get_instance(name):
-    data = settings.PAYMENT_PROCESSORS[name]
-    klass = import_string(data['class'])
-    kwargs = data.get('setup_data', {})
-    return klass(name, **kwargs)
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+
+    with _instances_lock:
+        if name not in _instances:
+            data = settings.PAYMENT_PROCESSORS[name]
+            klass = import_string(data['class'])
+            kwargs = data.get('setup_data', {})
+            _instances[name] = klass(name, **kwargs)
+
+        return _instances[name]
 
 
 def get_all_instances():
@@ -36,6 +62,51 @@ def get_all_instances():
     return choices
 
 
+def get_payment_method_class(name):
+    """
+    :returns: the PaymentMethod proxy class of the payment processor with the given name, or None
+        if the processor doesn't have one.
+    """
+
+    try:
+        return _payment_method_classes[name]
+    except KeyError:
+        payment_method_class = getattr(get_instance(name), 'payment_method_class', None)
+        _payment_method_classes[name] = payment_method_class
+
+        return payment_method_class
+
+
+def clear_instances():
+    """
+    Forgets the payment processors' instances and closes their sessions, so that they are
+    created again, from the PAYMENT_PROCESSORS setting, when needed.
+    """
+
+    global _sessions_generation
+
+    with _instances_lock:
+        _instances.clear()
+        _payment_method_classes.clear()
+
+    with _sessions_lock:
+        _sessions_generation += 1
+        sessions = list(_all_sessions)
+        del _all_sessions[:]
+    _sessions.__dict__.clear()
+
+    for session in sessions:
+        close = getattr(session, 'close', None)
+        if close:
+            close()
+
+
+@receiver(setting_changed)
+def clear_instances_on_setting_change(setting, **kwargs):
+    if setting == 'PAYMENT_PROCESSORS':
+        clear_instances()
+
+
 @deconstructible
 class PaymentProcessorBase(object):
     form_class = None
@@ -87,6 +158,39 @@ class PaymentProcessorBase(object):
 
         return template
 
+    def create_session(self):
+        """
+            Implementation is optional.
+
+            Creates the client the processor uses to talk to the payment gateway, e.g. a
+            `requests.Session`, so that its pooled connections are reused across transactions.
+
+            :return: A new session object (closed through its `close` method, if any) or None.
+        """
+
+        return None
+
+    @property
+    def session(self):
+        """
+            The session created by `create_session`, for the current thread. The processors are
+            instantiated once per process, so the session is reused by all their operations.
+        """
+
+        key = (self.name, _sessions_generation)
+
+        try:
+            return _sessions.__dict__[key]
+        except KeyError:
+            session = self.create_session()
+            _sessions.__dict__[key] = session
+
+            if session is not None:
+                with _sessions_lock:
+                    _all_sessions.append(session)
+
+            return session
+
     def handle_transaction_response(self, transaction, request):
         """
             :param transaction: A Silver Transaction object.
@@ -90,6 +90,84 @@ class BaseActionableProcessor(object):
 
         raise NotImplementedError
 
+    def process_transactions(self, transactions):
+        """
+            Receives initial transactions.
+            Makes sure the transactions haven't been processed before and executes them.
+
+            If the execute_transactions_batch method is implemented, all the transactions are
+            processed first and then handed over to it at once. Otherwise, each transaction is
+            processed and executed in turn (through process_transaction), so that an interrupted
+            batch doesn't leave pending transactions which were never executed.
+
+            :return: A {transaction: True on success, False on failure} dict.
+        """
+        if not self.executes_transactions_in_batches:
+            results = {}
+            for transaction in transactions:
+                try:
+                    results[transaction] = self.process_transaction(transaction)
+                except Exception:
+                    logger.exception('Encountered exception while executing transaction '
+                                     'with id=%s.', transaction.id)
+
+                    results[transaction] = False
+
+            return results
+
+        results, pending_transactions = {}, []
+        for transaction in transactions:
+            try:
+                transaction.process()
+            except TransitionNotAllowed:
+                logger.exception("Couldn't process transaction with pk %d." % transaction.pk)
+
+                results[transaction] = False
+            else:
+                pending_transactions.append(transaction)
+
+        if pending_transactions:
+            results.update(self.execute_transactions_batch(pending_transactions))
+
+        return results
+
+    @property
+    def executes_transactions_in_batches(self):
+        return (type(self).execute_transactions_batch is not
+                BaseActionableProcessor.execute_transactions_batch)
+
+    def execute_transactions_batch(self, transactions):
+        """
+            Implementation is optional.
+
+            :param transactions: A list of Silver Transaction objects in pending state, that
+            haven't been executed before.
+
+            Used for payment processors that can create many real, external transactions in a
+            single request to the payment gateway (batch charging).
+
+            Warning: You should never call this method directly! Use the `process_transactions`
+                     method instead, which will call this method.
+
+            The default implementation calls execute_transaction for each transaction, but it
+            isn't used by `process_transactions`, which executes the transactions one by one
+            unless this method is implemented.
+
+            :return: A {transaction: True on success, False on failure} dict.
+        """
+
+        results = {}
+        for transaction in transactions:
+            try:
+                results[transaction] = self.execute_transaction(transaction)
+            except Exception:
+                logger.exception('Encountered exception while executing transaction '
+                                 'with id=%s.', transaction.id)
+
+                results[transaction] = False
+
+        return results
+
     def fetch_transaction_status(self, transaction):
         """
             Implementation is optional.
@@ -123,3 +201,33 @@ class AutomaticProcessorMixin(BaseActionableProcessor):
 
 class TriggeredProcessorMixin(BaseActionableProcessor):
     type = PaymentProcessorTypes.Triggered
+
+    def fetch_transactions_status_batch(self, transactions):
+        """
+            Implementation is optional.
+
+            :param transactions: A list of pending Silver Transaction objects, belonging to this
+            payment processor.
+
+            Used for payment processors that can return the status of many transactions in a
+            single interrogation, instead of one interrogation per transaction.
+
+            Called by the `fetch_transactions_status_batch` task, for batches of pending
+            transactions.
+
+            The default implementation calls fetch_transaction_status for each transaction.
+
+            :return: A {transaction: True on success, False on failure} dict.
+        """
+
+        results = {}
+        for transaction in transactions:
+            try:
+                results[transaction] = self.fetch_transaction_status(transaction)
+            except Exception:
+                logger.exception('Encountered exception while updating transaction '
+                                 'with id=%s.', transaction.id)
+
+                results[transaction] = False
+
+        return results
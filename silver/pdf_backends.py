@@ -0,0 +1,383 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import copy
+import logging
+import re
+from functools import lru_cache
+from html import escape
+from io import BytesIO
+from xml.etree import ElementTree
+
+import html5lib
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm, mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import HRFlowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xhtml2pdf import pisa
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.utils.module_loading import import_string
+
+from silver.utils.pdf import fetch_resources
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PDF_BACKEND = 'silver.pdf_backends.XHTML2PDFBackend'
+
+
+class PDFBackend(object):
+    """
+    Converts the HTML rendered from the billing documents' templates into PDFs.
+    """
+
+    name = None
+
+    def render(self, html):
+        """
+        :returns: a (file object holding the PDF, error) tuple, where the error is falsy if the
+            PDF was rendered successfully.
+        """
+
+        raise NotImplementedError
+
+
+class XHTML2PDFBackend(PDFBackend):
+    """
+    The default backend, supporting the HTML and CSS features documented by xhtml2pdf.
+    """
+
+    name = 'xhtml2pdf'
+
+    def render(self, html):
+        pdf_file_object = BytesIO()
+        pisa_status = pisa.pisaDocument(
+            src=BytesIO(html.encode("UTF-8")),
+            dest=pdf_file_object,
+            encoding='UTF-8',
+            link_callback=fetch_resources
+        )
+
+        return pdf_file_object, pisa_status.err
+
+
+class ReportLabBackend(PDFBackend):
+    """
+    Builds the PDF straight from the HTML elements, with ReportLab, skipping xhtml2pdf's CSS
+    processing. It is meant for simple layouts like the bundled templates': headings,
+    paragraphs, line breaks, bold and italic text, horizontal rules and (nested) tables, with
+    the `width`, `colspan` and `align` attributes. Stylesheets are not interpreted; the pages
+    are A4 with 2cm margins and the text is set in 8pt Open Sans, as in the bundled templates.
+    """
+
+    name = 'reportlab'
+
+    font_name = 'open-sans'
+    font_files = {
+        'normal': 'font/OpenSans-Regular.ttf',
+        'bold': 'font/OpenSans-Bold.ttf',
+        'italic': 'font/OpenSans-Italic.ttf',
+        'boldItalic': 'font/OpenSans-BoldItalic.ttf',
+    }
+    fallback_font_name = 'Helvetica'
+
+    text_color = colors.HexColor('#4d4d4d')
+    rule_color = colors.HexColor('#86ba49')
+    row_line_color = colors.HexColor('#dddddd')
+
+    heading_sizes = {'h1': 12, 'h2': 10}
+    block_tags = {'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'hr', 'ul', 'ol',
+                  'li', 'thead', 'tbody', 'tfoot', 'tr'}
+
+    def __init__(self):
+        self.font = self._register_fonts()
+
+        self.styles = {
+            'body': ParagraphStyle('body', fontName=self.font, fontSize=8, leading=10,
+                                   textColor=self.text_color),
+        }
+        self.styles['right'] = ParagraphStyle('right', parent=self.styles['body'],
+                                              alignment=TA_RIGHT)
+        for tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            font_size = self.heading_sizes.get(tag, 9)
+            self.styles[tag] = ParagraphStyle(tag, parent=self.styles['body'],
+                                              fontSize=font_size, leading=font_size * 1.25,
+                                              spaceBefore=4, spaceAfter=4)
+
+    def _register_fonts(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+
+        font_paths = {}
+        for variant, font_file in self.font_files.items():
+            font_path = finders.find(font_file)
+            if not font_path:
+                logger.warning('The %s font could not be found, using %s instead.',
+                               font_file, self.fallback_font_name)
+                return self.fallback_font_name
+
+            font_paths[variant] = font_path
+
+        for variant, font_path in font_paths.items():
+            pdfmetrics.registerFont(TTFont('%s-%s' % (self.font_name, variant), font_path))
+
+        pdfmetrics.registerFontFamily(self.font_name, **{
+            variant: '%s-%s' % (self.font_name, variant) for variant in font_paths
+        })
+        pdfmetrics.registerFont(TTFont(self.font_name, font_paths['normal']))
+
+        return self.font_name
+
+    def render(self, html):
+        pdf_file_object = BytesIO()
+
+        try:
+            root = html5lib.parse(html, treebuilder='etree', namespaceHTMLElements=False)
+            title = (root.findtext('.//title') or '').strip()
+            body = root.find('body')
+            if body is None:
+                body = root
+
+            document = SimpleDocTemplate(pdf_file_object, pagesize=A4, title=' '.join(
+                title.split()
+            ), leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm)
+
+            story = self._flowables(body, document.width) or [Spacer(1, 1)]
+            document.build(story)
+        except Exception as exception:
+            logger.exception('ReportLab encountered exception during generation of pdf.')
+            return pdf_file_object, repr(exception)
+
+        return pdf_file_object, None
+
+    # Converting the elements
+
+    @staticmethod
+    def _length(value, available_width):
+        """
+        :returns: the length in points of an HTML length (e.g. '40%', '8cm', '48mm', '0.5mm',
+            '120'), or None.
+        """
+
+        match = re.match(r'^\s*([\d.]+)\s*(%|cm|mm|pt|px)?\s*$', value or '')
+        if not match:
+            return None
+
+        number, unit = float(match.group(1)), match.group(2)
+        if unit == '%':
+            return available_width * number / 100
+
+        return number * {'cm': cm, 'mm': mm, 'pt': 1, 'px': 0.75, None: 0.75}[unit]
+
+    def _inline_markup(self, element, include_tail=False):
+        """
+        :returns: the ReportLab paragraph markup of the element's inline content.
+        """
+
+        parts = [escape(element.text or '', quote=False)]
+
+        for child in element:
+            if not isinstance(child.tag, str):
+                parts.append(escape(child.tail or '', quote=False))
+                continue
+
+            tag = child.tag.lower()
+            if tag == 'br':
+                parts.append('<br/>')
+            elif tag in ('strong', 'b'):
+                parts.append('<b>%s</b>' % self._inline_markup(child))
+            elif tag in ('em', 'i'):
+                parts.append('<i>%s</i>' % self._inline_markup(child))
+            elif tag not in self.block_tags:
+                parts.append(self._inline_markup(child))
+
+            if tag not in self.block_tags:
+                parts.append(escape(child.tail or '', quote=False))
+
+        markup = re.sub(r'\s+', ' ', ''.join(parts))
+        return re.sub(r'\s*<br/>\s*', '<br/>', markup).strip()
+
+    def _paragraph(self, markup, style, bold=False):
+        if not markup:
+            return None
+
+        return Paragraph('<b>%s</b>' % markup if bold else markup, style)
+
+    def _flowables(self, element, available_width, style=None, bold=False):
+        """
+        :returns: the flowables for the element's children, the inline content between the
+            block elements being grouped into paragraphs.
+        """
+
+        style = style or self.styles['body']
+        flowables, inline_element = [], ElementTree.Element('span')
+        inline_element.text = element.text
+
+        def flush_inline_content():
+            paragraph = self._paragraph(self._inline_markup(inline_element), style, bold)
+            if paragraph:
+                flowables.append(paragraph)
+
+        for child in element:
+            tag = child.tag.lower() if isinstance(child.tag, str) else None
+
+            if tag not in self.block_tags:
+                inline_element.append(copy.copy(child))
+                continue
+
+            flush_inline_content()
+            inline_element = ElementTree.Element('span')
+            inline_element.text = child.tail
+
+            flowables.extend(self._block_flowables(child, tag, available_width, style, bold))
+
+        flush_inline_content()
+
+        return flowables
+
+    def _block_flowables(self, element, tag, available_width, style, bold):
+        if tag == 'hr':
+            thickness = self._length(element.get('size'), available_width) or 0.5
+            color = element.get('color')
+            return [HRFlowable(width='100%', thickness=thickness, spaceBefore=3, spaceAfter=3,
+                               color=colors.HexColor(color) if color else self.rule_color)]
+
+        if tag == 'table':
+            table = self._table(element, available_width, style, bold)
+            return [table] if table else []
+
+        if tag in self.heading_sizes or tag in ('h3', 'h4', 'h5', 'h6'):
+            paragraph = self._paragraph(self._inline_markup(element), self.styles[tag], True)
+            return [paragraph] if paragraph else []
+
+        return self._flowables(element, available_width, style, bold)
+
+    def _table_rows(self, table):
+        for child in table:
+            tag = child.tag.lower() if isinstance(child.tag, str) else None
+
+            if tag == 'tr':
+                yield child, 'tbody'
+            elif tag in ('thead', 'tbody', 'tfoot'):
+                for row in child:
+                    if isinstance(row.tag, str) and row.tag.lower() == 'tr':
+                        yield row, tag
+
+    def _column_widths(self, rows, available_width):
+        columns_count = max(
+            sum(int(cell.get('colspan') or 1) for cell in row if isinstance(cell.tag, str))
+            for row, _ in rows
+        )
+
+        widths = [None] * columns_count
+        for row, _ in rows:
+            column = 0
+            for cell in row:
+                if not isinstance(cell.tag, str):
+                    continue
+
+                colspan = int(cell.get('colspan') or 1)
+                width = self._length(cell.get('width'), available_width)
+                if colspan == 1 and width and widths[column] is None:
+                    widths[column] = width
+
+                column += colspan
+
+        specified_width = sum(width for width in widths if width)
+        if specified_width > available_width:
+            # scale the widths down to fit the page
+            widths = [width * available_width / specified_width if width else None
+                      for width in widths]
+            specified_width = available_width
+
+        unspecified_count = widths.count(None)
+        if unspecified_count:
+            remaining_width = max(available_width - specified_width, 0) / unspecified_count
+            widths = [width if width else remaining_width for width in widths]
+
+        return widths
+
+    def _table(self, element, available_width, style, bold):
+        rows = list(self._table_rows(element))
+        if not rows or not any(len(row) for row, _ in rows):
+            return None
+
+        column_widths = self._column_widths(rows, available_width)
+        padding = 3
+
+        data, commands, header_rows = [], [], 0
+        for row_index, (row, section) in enumerate(rows):
+            cells, column = [], 0
+
+            for cell in row:
+                if not isinstance(cell.tag, str):
+                    continue
+
+                colspan = int(cell.get('colspan') or 1)
+                cell_width = sum(column_widths[column:column + colspan]) - 2 * padding
+                cell_style = self.styles['right'] if cell.get('align') == 'right' else style
+
+                cells.append(self._flowables(
+                    cell, cell_width, cell_style,
+                    bold or section == 'tfoot' or cell.tag.lower() == 'th'
+                ))
+                cells.extend([''] * (colspan - 1))
+
+                if colspan > 1:
+                    commands.append(('SPAN', (column, row_index),
+                                     (column + colspan - 1, row_index)))
+                column += colspan
+
+            cells.extend([''] * (len(column_widths) - len(cells)))
+            data.append(cells)
+
+            if section == 'thead':
+                header_rows += 1
+            if section in ('thead', 'tbody') and element.find('thead') is not None:
+                commands.append(('LINEBELOW', (0, row_index), (-1, row_index), 1,
+                                 self.row_line_color))
+
+        commands.extend([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), padding),
+            ('RIGHTPADDING', (0, 0), (-1, -1), padding),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ])
+
+        return Table(data, colWidths=column_widths, repeatRows=header_rows, hAlign='LEFT',
+                     style=TableStyle(commands))
+
+
+@lru_cache(maxsize=None)
+def _get_backend(backend_path):
+    return import_string(backend_path)()
+
+
+def get_pdf_backend(name=None):
+    """
+    :param name: a backend's dotted path; defaults to the SILVER_PDF_BACKEND setting.
+    :returns: the (shared) backend instance.
+    """
+
+    return _get_backend(name or getattr(settings, 'SILVER_PDF_BACKEND', DEFAULT_PDF_BACKEND))
@@ -0,0 +1,252 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import json
+import logging
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PyPDF2 import PdfFileMerger, PdfFileReader
+
+from django.conf import settings
+from django.core.files import File
+
+from silver.models import PDF
+from silver.vendors.redis_server import redis
+
+
+logger = logging.getLogger(__name__)
+
+
+PDF_EXPORT_THREADS = getattr(settings, 'SILVER_PDF_EXPORT_THREADS', 4)
+PDF_EXPORT_MAX_DOCUMENTS = getattr(settings, 'SILVER_PDF_EXPORT_MAX_DOCUMENTS', 100)
+# How long the reports of the exports merged in the background are kept
+PDF_EXPORT_REPORT_TIMEOUT = getattr(settings, 'SILVER_PDF_EXPORT_REPORT_TIMEOUT', 60 * 60 * 24)
+
+EXPORTS_PATH = 'exports'
+
+
+def open_pdf_file(document):
+    """
+    :returns: the document's PDF file, opened for reading straight from the storage.
+    """
+
+    pdf_file = document.pdf.pdf_file
+
+    return pdf_file.storage.open(pdf_file.name, 'rb')
+
+
+def iter_documents_pdfs(documents, read, threads=None):
+    """
+    Reads the documents' PDFs in a pool of threads, with at most two reads per thread in
+    progress at any time, so that only a bounded number of PDFs are held at once.
+
+    :param documents: documents with their `pdf` selected. The ones without an uploaded PDF are
+        skipped.
+    :param read: a callable receiving a document and returning its PDF's content, e.g. as bytes
+        or a file object.
+    :returns: a generator of (document, content, error) tuples, in the documents' order.
+    """
+
+    threads = threads or PDF_EXPORT_THREADS
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+
+        def next_result():
+            document, future = pending.popleft()
+            try:
+                return document, future.result(), None
+            except Exception as error:
+                logger.warning('Could not read the PDF of the %s with id=%s.', document.kind,
+                               document.id, exc_info=True)
+                return document, None, error
+
+        for document in documents:
+            if not (document.pdf and document.pdf.pdf_file):
+                continue
+
+            pending.append((document, executor.submit(read, document)))
+            if len(pending) >= 2 * threads:
+                yield next_result()
+
+        while pending:
+            yield next_result()
+
+
+def _copy_to_temporary_file(document):
+    temporary_file = tempfile.TemporaryFile()
+
+    try:
+        with open_pdf_file(document) as pdf_file:
+            shutil.copyfileobj(pdf_file, temporary_file)
+    except Exception:
+        temporary_file.close()
+        raise
+
+    temporary_file.seek(0)
+
+    return temporary_file
+
+
+def merge_documents_pdfs(documents, output_file, threads=None):
+    """
+    Merges the documents' PDFs into `output_file`, in the documents' order. Each PDF is copied
+    from the storage into its own (anonymous) temporary file and appended as soon as it's read.
+
+    :returns: a (merged documents, {document: error}) tuple.
+    """
+
+    merger = PdfFileMerger(strict=False)
+    temporary_files, merged_documents, errors = [], [], {}
+
+    try:
+        for document, pdf_file, error in iter_documents_pdfs(documents, _copy_to_temporary_file,
+                                                             threads):
+            if error:
+                errors[document] = error
+                continue
+
+            temporary_files.append(pdf_file)
+            try:
+                merger.append(PdfFileReader(pdf_file, strict=False))
+            except Exception as error:
+                logger.warning('Could not merge the PDF of the %s with id=%s.', document.kind,
+                               document.id, exc_info=True)
+                errors[document] = error
+            else:
+                merged_documents.append(document)
+
+        merger.write(output_file)
+    finally:
+        merger.close()
+        for temporary_file in temporary_files:
+            temporary_file.close()
+
+    return merged_documents, errors
+
+
+def get_documents_export_storage():
+    return PDF._meta.get_field('pdf_file').storage
+
+
+def get_export_name(filename):
+    return '%s/%s' % (EXPORTS_PATH, filename)
+
+
+def save_merged_documents_pdfs(documents, name, threads=None):
+    """
+    Merges the documents' PDFs and saves the result in the PDFs' storage.
+
+    :returns: a (saved file's name, merged documents, {document: error}) tuple. The storage may
+        save the file under a different name than the given one.
+    """
+
+    with tempfile.TemporaryFile() as output_file:
+        merged_documents, errors = merge_documents_pdfs(documents, output_file, threads)
+
+        output_file.seek(0)
+        name = get_documents_export_storage().save(name, File(output_file))
+
+    return name, merged_documents, errors
+
+
+def _get_export_report_key(export_id):
+    return 'silver:pdf-exports:%s' % export_id
+
+
+def save_export_report(export_id, name, left_out_documents):
+    """
+    Stores, for PDF_EXPORT_REPORT_TIMEOUT seconds, the outcome of an export merged in the
+    background: the saved file's name and the series numbers of the documents left out.
+    """
+
+    redis.set(_get_export_report_key(export_id), json.dumps({
+        'name': name,
+        'left_out': [document.series_number for document in left_out_documents]
+    }), ex=PDF_EXPORT_REPORT_TIMEOUT)
+
+
+def get_export_report(export_id):
+    """
+    :returns: the {'name': saved file's name, 'left_out': [series numbers]} report stored by
+        `save_export_report`, or None if the export isn't done (or its report expired).
+    """
+
+    report = redis.get(_get_export_report_key(export_id))
+
+    return json.loads(report) if report else None
+
+
+class _ZipStream(object):
+    """
+    A write-only file object buffering what `zipfile` writes, until it's collected.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def collect(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+
+        return data
+
+
+def _read_pdf_content(document):
+    with open_pdf_file(document) as pdf_file:
+        return pdf_file.read()
+
+
+def stream_documents_pdfs_zip(documents, threads=None):
+    """
+    Builds a ZIP archive of the documents' PDFs while reading them from the storage, without
+    temporary files. Only the PDFs being read (see `iter_documents_pdfs`) and the one being
+    added are held in memory. The PDFs that can't be read are left out.
+
+    :returns: a generator of the archive's chunks.
+    """
+
+    stream = _ZipStream()
+    names = set()
+
+    # The PDFs are already compressed
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for document, content, error in iter_documents_pdfs(documents, _read_pdf_content,
+                                                            threads):
+            if error:
+                continue
+
+            name = document.get_pdf_filename()
+            if name in names:
+                name = '%s_%s.pdf' % (name[:-len('.pdf')], document.id)
+            names.add(name)
+
+            archive.writestr(name, content)
+            yield stream.collect()
+
+    yield stream.collect()
@@ -0,0 +1,291 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import os
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import select_template
+
+from silver.models.documents.pdf import PDF, render_pdf
+
+if TYPE_CHECKING:
+    from silver.models import BillingDocumentBase
+
+
+logger = logging.getLogger(__name__)
+
+
+PDF_RENDERING_PROCESSES = getattr(settings, 'SILVER_PDF_RENDERING_PROCESSES', None)
+PDF_RENDERING_BATCH_SIZE = getattr(settings, 'SILVER_PDF_RENDERING_BATCH_SIZE', 50)
+
+PDF_ON_DEMAND_RENDERING = getattr(settings, 'SILVER_PDF_ON_DEMAND_RENDERING', True)
+# How long the requesters wait for another generation of the same PDF
+PDF_ON_DEMAND_WAIT_TIMEOUT = getattr(settings, 'SILVER_PDF_ON_DEMAND_WAIT_TIMEOUT', 30)
+
+WARM_UP_HTML = '<html><head><style>body { font-family: Helvetica; }</style></head>' \
+               '<body><p>warm up</p></body></html>'
+
+
+@dataclass
+class RenderedDocument:
+    document: "BillingDocumentBase"
+    pdf_file_object: Optional[BytesIO]
+    render_time: float
+    error: Optional[str] = None
+    content_hash: Optional[str] = None
+    # The uploaded PDF was already rendered from the same content
+    unchanged: bool = False
+
+
+def _warm_up():
+    # Loads the PDF backend's fonts (and xhtml2pdf's default stylesheet) once per worker,
+    # instead of once per rendered document
+    render_pdf(WARM_UP_HTML)
+
+
+def _render(html):
+    start_time = time.monotonic()
+
+    try:
+        pdf_file_object, error = render_pdf(html)
+    except Exception as exception:
+        return None, repr(exception), time.monotonic() - start_time
+
+    content = pdf_file_object.getvalue() if not error else None
+    return content, str(error) if error else None, time.monotonic() - start_time
+
+
+class PDFRenderingPool(object):
+    """
+    Renders the billing documents' PDFs in batches, using a pool of worker processes which are
+    warmed up once and then kept for all the batches. The templates are loaded once per pool
+    and rendered in the current process (which has the database access), while the workers
+    only convert the resulting HTML into PDFs.
+
+    With `processes=0` the PDFs are rendered in the current process.
+
+    Usage:
+
+        with PDFRenderingPool() as pool:
+            for rendered_document in pool.generate_pdfs(documents):
+                ...
+    """
+
+    def __init__(self, processes=None, batch_size=None):
+        if processes is None:
+            processes = PDF_RENDERING_PROCESSES
+        if processes is None:
+            processes = os.cpu_count() or 1
+
+        self.processes = processes
+        self.batch_size = batch_size or PDF_RENDERING_BATCH_SIZE
+
+        self._pool = None
+        self._templates = {}
+
+    def __enter__(self):
+        self.start()
+
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        if self._pool or not self.processes:
+            _warm_up()
+            return
+
+        # The forked workers must not share the database connections
+        connections.close_all()
+
+        # The workers are forked, to inherit the already loaded Django apps and templates
+        context = multiprocessing.get_context('fork')
+        self._pool = context.Pool(processes=self.processes, initializer=_warm_up)
+
+    def stop(self):
+        if not self._pool:
+            return
+
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+
+    def get_template(self, document, state):
+        template_names = tuple(document.get_template_names(state))
+
+        if template_names not in self._templates:
+            self._templates[template_names] = select_template(template_names)
+
+        return self._templates[template_names]
+
+    def _render_html(self, document, state):
+        context = document.get_template_context(state)
+        context['filename'] = document.get_pdf_filename()
+
+        return self.get_template(document, context['state']).render(context)
+
+    def render(self, documents, state=None, skip_unchanged=False):
+        """
+        :param skip_unchanged: if True, the documents whose uploaded PDF was already rendered
+            from the same content are not rendered again (and are flagged as `unchanged`).
+        :returns: a list of RenderedDocument, in the given documents' order. The render time
+            includes the template rendering.
+        """
+
+        rendered_documents, html_documents = [], []
+        for document in documents:
+            start_time = time.monotonic()
+            try:
+                html = self._render_html(document, state)
+            except Exception as exception:
+                logger.exception('Encountered exception while rendering the template for '
+                                 'document with id=%s.', document.id)
+                rendered_documents.append(RenderedDocument(
+                    document, None, time.monotonic() - start_time, repr(exception)
+                ))
+                continue
+
+            content_hash = document.pdf.get_content_hash(html, document.get_pdf_filename())
+            rendered_document = RenderedDocument(
+                document, None, time.monotonic() - start_time, content_hash=content_hash,
+                unchanged=skip_unchanged and document.pdf.is_up_to_date(content_hash)
+            )
+            rendered_documents.append(rendered_document)
+
+            if not rendered_document.unchanged:
+                html_documents.append(html)
+
+        if self._pool:
+            results = iter(self._pool.map(_render, html_documents))
+        else:
+            results = (_render(html) for html in html_documents)
+
+        for rendered_document in rendered_documents:
+            if rendered_document.error or rendered_document.unchanged:
+                continue
+
+            content, error, pdf_render_time = next(results)
+
+            rendered_document.render_time += pdf_render_time
+            rendered_document.error = error
+            if content is not None:
+                rendered_document.pdf_file_object = BytesIO(content)
+
+        return rendered_documents
+
+    def generate_pdfs(self, documents, upload=True):
+        """
+        Renders the documents' PDFs batch by batch and uploads them, like
+        `BillingDocumentBase.generate_pdf` does.
+
+        :returns: a generator of RenderedDocument.
+        """
+
+        batch = []
+        for document in documents:
+            batch.append(document)
+
+            if len(batch) >= self.batch_size:
+                yield from self._generate_batch(batch, upload)
+                batch = []
+
+        if batch:
+            yield from self._generate_batch(batch, upload)
+
+    def _generate_batch(self, documents, upload):
+        with ExitStack() as locks:
+            if upload:
+                # The PDFs being generated elsewhere (e.g. on demand) are skipped
+                documents = [document for document in documents
+                             if locks.enter_context(document.pdf.generation_lock()) is not False]
+
+            return self._generate_locked_batch(documents, upload)
+
+    def _generate_locked_batch(self, documents, upload):
+        rendered_documents = self.render(documents, skip_unchanged=upload)
+        unchanged_pdfs = []
+
+        for rendered_document in rendered_documents:
+            document = rendered_document.document
+
+            if rendered_document.error:
+                logger.error('Encountered exception during generation of pdf %s: %s',
+                             document.get_pdf_filename(), rendered_document.error)
+            elif rendered_document.unchanged:
+                logger.debug('The pdf %s is unchanged.', document.get_pdf_filename())
+
+                unchanged_pdfs.append(document.pdf)
+            else:
+                logger.debug('Rendered the pdf %s in %.3fs.', document.get_pdf_filename(),
+                             rendered_document.render_time)
+
+                if upload:
+                    try:
+                        document.pdf.upload(pdf_file_object=rendered_document.pdf_file_object,
+                                            filename=document.get_pdf_filename(),
+                                            content_hash=rendered_document.content_hash)
+                    except Exception as exception:
+                        logger.exception('Encountered exception while uploading the pdf for '
+                                         'document with id=%s.', document.id)
+                        rendered_document.error = repr(exception)
+
+        # The unchanged PDFs are marked as clean all at once
+        PDF.objects.mark_as_clean(unchanged_pdfs)
+
+        return rendered_documents
+
+
+def _needs_rendering(pdf):
+    return bool(pdf.dirty or not pdf.pdf_file)
+
+
+def get_up_to_date_pdf(document):
+    """
+    Renders the document's PDF at request time if it's dirty or missing, and uploads it like
+    the background generation does. The requesters wait, on the PDF's generation lock, for an
+    ongoing generation of the same PDF instead of rendering it themselves. If that takes longer
+    than PDF_ON_DEMAND_WAIT_TIMEOUT, or if the rendering fails, they get the PDF as it is.
+
+    :returns: the document's PDF, or None if the document has none.
+    """
+
+    pdf = document.pdf
+    if not (PDF_ON_DEMAND_RENDERING and pdf and _needs_rendering(pdf)):
+        return pdf
+
+    with pdf.generation_lock(blocking_timeout=PDF_ON_DEMAND_WAIT_TIMEOUT) as acquired:
+        pdf.refresh_from_db()
+        if acquired is False:
+            return pdf
+
+        # It may have been rendered while waiting for the lock
+        if _needs_rendering(pdf):
+            try:
+                document.generate_pdf(locked=True)
+            except Exception:
+                logger.exception('Encountered exception while rendering the pdf of the %s '
+                                 'with id=%s on demand.', document.kind, document.id)
+
+    return pdf
@@ -14,21 +14,29 @@
 
 from __future__ import absolute_import
 
-from itertools import chain
+import logging
+from collections import defaultdict
+from datetime import timedelta
 
-from celery import group, shared_task
+from celery import current_app, group, shared_task
 from celery_once import QueueOnce
 from redis.exceptions import LockError
 
 from django.conf import settings
 from django.utils import timezone
 
+from silver import payment_processors
 from silver.documents_generator import DocumentsGenerator
-from silver.models import Invoice, Proforma, Transaction, BillingDocumentBase, Customer
+from silver.models import Transaction, BillingDocumentBase, Customer
+from silver.models.payment_methods import decrypt_payment_methods_data
 from silver.payment_processors.mixins import PaymentProcessorTypes
+from silver.pdf_export import save_export_report, save_merged_documents_pdfs
 from silver.vendors.redis_server import redis
 
 
+logger = logging.getLogger(__name__)
+
+
 PDF_GENERATION_TIME_LIMIT = getattr(settings, 'PDF_GENERATION_TIME_LIMIT',
                                     60)  # default 60s
 
@@ -41,14 +49,67 @@ def generate_pdf(document_id, document_type):
     document.generate_pdf()
 
 
-@shared_task(ignore_result=True)
+PDF_GENERATION_BATCH_SIZE = getattr(settings, 'SILVER_PDF_GENERATION_BATCH_SIZE', 100)
+PDF_GENERATION_MAX_QUEUE_DEPTH = getattr(settings, 'SILVER_PDF_GENERATION_MAX_QUEUE_DEPTH', 500)
+PDF_GENERATION_QUEUE = getattr(settings, 'SILVER_PDF_GENERATION_QUEUE', None)
+
+
+def get_pdf_generation_queue_depth():
+    queue = PDF_GENERATION_QUEUE or current_app.conf.task_default_queue
+
+    try:
+        with current_app.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1, interval_start=0, interval_step=0)
+
+            return connection.default_channel.queue_declare(
+                queue=queue, passive=True
+            ).message_count
+    except Exception:
+        logger.warning('Could not get the depth of the %s queue.', queue, exc_info=True)
+
+        return 0
+
+
+PDFS_GENERATION_TIME_LIMIT = getattr(settings, 'PDFS_GENERATION_TIME_LIMIT',
+                                     60 * 10)  # default 10m
+
+
+@shared_task(base=QueueOnce, once={'graceful': True},
+             time_limit=PDFS_GENERATION_TIME_LIMIT, ignore_result=True)
 def generate_pdfs():
-    dirty_documents = chain(Invoice.objects.filter(pdf__dirty__gt=0),
-                            Proforma.objects.filter(pdf__dirty__gt=0))
+    # Don't queue more tasks while the workers are behind
+    batch_size = min(PDF_GENERATION_BATCH_SIZE,
+                     PDF_GENERATION_MAX_QUEUE_DEPTH - get_pdf_generation_queue_depth())
+    if batch_size <= 0:
+        return
+
+    options = {'queue': PDF_GENERATION_QUEUE} if PDF_GENERATION_QUEUE else {}
+
+    dirty_documents = BillingDocumentBase.objects.select_related(None).only('id', 'kind')
 
     # Generate PDFs in parallel
-    group(generate_pdf.s(document.id, document.kind)
-          for document in dirty_documents)()
+    group(generate_pdf.s(document.id, document.kind).set(**options)
+          for document in dirty_documents.dirty_pdfs_batch(batch_size))()
+
+
+PDF_EXPORT_TIME_LIMIT = getattr(settings, 'PDF_EXPORT_TIME_LIMIT', 60 * 60)  # default 60m
+
+
+@shared_task(ignore_result=True, time_limit=PDF_EXPORT_TIME_LIMIT)
+def export_documents_pdfs(documents_ids, name, export_id=None):
+    documents = BillingDocumentBase.objects.filter(id__in=documents_ids).select_related('pdf')
+    documents_by_id = {document.id: document for document in documents}
+    documents = [documents_by_id[document_id] for document_id in documents_ids
+                 if document_id in documents_by_id]
+
+    name, merged_documents, errors = save_merged_documents_pdfs(documents, name)
+
+    if export_id:
+        merged_documents = set(merged_documents)
+        save_export_report(export_id, name, [document for document in documents
+                                             if document not in merged_documents])
+
+    return name
 
 
 DOCS_GENERATION_TIME_LIMIT = getattr(settings, 'DOCS_GENERATION_TIME_LIMIT',
@@ -88,6 +149,77 @@ def fetch_transaction_status(transaction_id):
     payment_processor.fetch_transaction_status(transaction)
 
 
+def get_transactions_batches(batch_task, transaction_ids_by_processor, batch_size):
+    """
+    :param transaction_ids_by_processor: a {payment processor name: [transaction id]} dict.
+    :returns: the batch_task's signatures for the triggered payment processors' transactions,
+        split in batches of at most batch_size transactions.
+    """
+
+    batches = []
+    for payment_processor_name, processor_transaction_ids in transaction_ids_by_processor.items():
+        payment_processor = payment_processors.get_instance(payment_processor_name)
+        if payment_processor.type != PaymentProcessorTypes.Triggered:
+            continue
+
+        for start in range(0, len(processor_transaction_ids), batch_size):
+            batches.append(batch_task.s(payment_processor_name,
+                                        processor_transaction_ids[start:start + batch_size]))
+
+    return batches
+
+
+FETCH_TRANSACTIONS_STATUS_BATCH_SIZE = getattr(settings,
+                                               'SILVER_FETCH_TRANSACTIONS_STATUS_BATCH_SIZE', 100)
+FETCH_TRANSACTIONS_STATUS_BATCH_TIME_LIMIT = getattr(
+    settings, 'FETCH_TRANSACTIONS_STATUS_BATCH_TIME_LIMIT', 60 * 10
+)  # default 10m
+
+TRANSACTION_STATUS_POLL_AGE_RATIO = getattr(settings, 'SILVER_TRANSACTION_STATUS_POLL_AGE_RATIO',
+                                            0.1)
+TRANSACTION_STATUS_MIN_POLL_INTERVAL = getattr(settings,
+                                               'SILVER_TRANSACTION_STATUS_MIN_POLL_INTERVAL',
+                                               timedelta(minutes=5))
+TRANSACTION_STATUS_MAX_POLL_INTERVAL = getattr(settings,
+                                               'SILVER_TRANSACTION_STATUS_MAX_POLL_INTERVAL',
+                                               timedelta(days=1))
+
+
+def get_transaction_status_poll_interval(transaction_age):
+    """
+    The young transactions' status is polled often, the old ones' (which are likely waiting
+    for a slow settlement) less and less often.
+    """
+
+    return min(max(transaction_age * TRANSACTION_STATUS_POLL_AGE_RATIO,
+                   TRANSACTION_STATUS_MIN_POLL_INTERVAL),
+               TRANSACTION_STATUS_MAX_POLL_INTERVAL)
+
+
+@shared_task(base=QueueOnce, once={'graceful': True},
+             time_limit=FETCH_TRANSACTIONS_STATUS_BATCH_TIME_LIMIT)
+def fetch_transactions_status_batch(payment_processor_name, transaction_ids):
+    payment_processor = payment_processors.get_instance(payment_processor_name)
+    if payment_processor.type != PaymentProcessorTypes.Triggered:
+        return
+
+    transactions = list(
+        Transaction.objects.filter(
+            pk__in=transaction_ids, state=Transaction.States.Pending,
+            payment_method__payment_processor=payment_processor_name
+        ).select_related('payment_method').order_by('pk')
+    )
+    if not transactions:
+        return
+
+    fetched_at = timezone.now()
+    payment_processor.fetch_transactions_status_batch(transactions)
+
+    Transaction.objects.filter(
+        pk__in=[transaction.pk for transaction in transactions]
+    ).update(status_fetched_at=fetched_at)
+
+
 @shared_task(ignore_result=True)
 def fetch_transactions_status(transaction_ids=None):
     eligible_transactions = Transaction.objects.filter(state=Transaction.States.Pending)
@@ -95,7 +227,24 @@ def fetch_transactions_status(transaction_ids=None):
     if transaction_ids:
         eligible_transactions = eligible_transactions.filter(pk__in=transaction_ids)
 
-    group(fetch_transaction_status.s(transaction.id) for transaction in eligible_transactions)()
+    now = timezone.now()
+
+    transaction_ids_by_processor = defaultdict(list)
+    for transaction_id, payment_processor_name, created_at, status_fetched_at in (
+        eligible_transactions.order_by('pk').values_list(
+            'id', 'payment_method__payment_processor', 'created_at', 'status_fetched_at'
+        )
+    ):
+        # The explicitly given transactions are always polled
+        if (not transaction_ids and status_fetched_at and
+                now - status_fetched_at < get_transaction_status_poll_interval(now - created_at)):
+            continue
+
+        transaction_ids_by_processor[payment_processor_name].append(transaction_id)
+
+    group(get_transactions_batches(fetch_transactions_status_batch,
+                                   transaction_ids_by_processor,
+                                   FETCH_TRANSACTIONS_STATUS_BATCH_SIZE))()
 
 
 EXECUTE_TRANSACTION_TIME_LIMIT = getattr(settings, 'EXECUTE_TRANSACTION_TIME_LIMIT',
@@ -119,11 +268,61 @@ def execute_transaction(transaction_id):
     payment_processor.process_transaction(transaction)
 
 
-@shared_task(ignore_result=True)
-def execute_transactions(transaction_ids=None):
-    executable_transactions = Transaction.objects.filter(state=Transaction.States.Initial)
+EXECUTE_TRANSACTIONS_BATCH_SIZE = getattr(settings, 'SILVER_EXECUTE_TRANSACTIONS_BATCH_SIZE',
+                                          50)
+EXECUTE_TRANSACTIONS_BATCH_TIME_LIMIT = getattr(settings, 'EXECUTE_TRANSACTIONS_BATCH_TIME_LIMIT',
+                                                60 * 10)  # default 10m
+
+
+def get_executable_transactions(transaction_ids=None):
+    executable_transactions = Transaction.objects.filter(
+        state=Transaction.States.Initial,
+        payment_method__verified=True,
+        payment_method__canceled=False
+    )
 
     if transaction_ids:
         executable_transactions = executable_transactions.filter(pk__in=transaction_ids)
 
-    group(execute_transaction.s(transaction.id) for transaction in executable_transactions)()
+    return executable_transactions
+
+
+@shared_task(base=QueueOnce, once={'graceful': True},
+             time_limit=EXECUTE_TRANSACTIONS_BATCH_TIME_LIMIT)
+def execute_transactions_batch(payment_processor_name, transaction_ids):
+    payment_processor = payment_processors.get_instance(payment_processor_name)
+    if payment_processor.type != PaymentProcessorTypes.Triggered:
+        return
+
+    transactions = list(
+        get_executable_transactions(transaction_ids).filter(
+            payment_method__payment_processor=payment_processor_name
+        ).select_related('payment_method').order_by('pk')
+    )
+    if not transactions:
+        return
+
+    # The transactions of a payment method share its instance, to decrypt its data only once
+    payment_methods = {}
+    for transaction in transactions:
+        transaction.payment_method = payment_methods.setdefault(transaction.payment_method_id,
+                                                                transaction.payment_method)
+    decrypt_payment_methods_data(payment_methods.values())
+
+    payment_processor.process_transactions(transactions)
+
+
+@shared_task(ignore_result=True)
+def execute_transactions(transaction_ids=None):
+    executable_transactions = get_executable_transactions(transaction_ids).order_by('pk')
+
+    transaction_ids_by_processor = defaultdict(list)
+    for transaction_id, payment_processor_name in executable_transactions.values_list(
+        'id', 'payment_method__payment_processor'
+    ):
+        transaction_ids_by_processor[payment_processor_name].append(transaction_id)
+
+    # Hand the transactions over to their payment processor in batches
+    group(get_transactions_batches(execute_transactions_batch,
+                                   transaction_ids_by_processor,
+                                   EXECUTE_TRANSACTIONS_BATCH_SIZE))()
@@ -14,19 +14,37 @@
 
 from __future__ import absolute_import
 
+import shutil
+import tempfile
+from io import BytesIO
 from itertools import cycle
 from mock import MagicMock, patch, Mock
 
+from PyPDF2 import PdfFileReader
+from reportlab.pdfgen.canvas import Canvas
+
 from django_fsm import TransitionNotAllowed
 
-from django.contrib.admin.models import CHANGE
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.messages import get_messages
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.test import TestCase, Client
 from django.utils.encoding import force_str
 
+from silver.documents_transitions import bulk_transition
 from silver.fixtures.factories import InvoiceFactory
+from silver.models import Invoice, PDF
+
+
+def _upload_pdf(document, text):
+    pdf_file_object = BytesIO()
+    canvas = Canvas(pdf_file_object)
+    canvas.drawString(100, 100, text)
+    canvas.save()
+
+    document.pdf.upload(pdf_file_object, document.get_pdf_filename())
 
 
 class InvoiceAdminTestCase(TestCase):
@@ -49,16 +67,13 @@ class InvoiceAdminTestCase(TestCase):
         mock_action = Mock(return_value=Mock(series_number='aaa', admin_change_url="result_url"))
 
         mock_invoice = MagicMock()
-        mock_invoice.issue = mock_action
-        mock_invoice.cancel = mock_action
-        mock_invoice.pay = mock_action
         mock_invoice.clone_into_draft = mock_action
         mock_invoice.create_storno = mock_action
 
         with patch.multiple('silver.admin',
                             LogEntry=mock_log_entry,
                             Invoice=mock_invoice):
-            actions = ['issue', 'pay', 'cancel', 'clone', 'create_storno']
+            actions = ['clone', 'create_storno']
 
             for action in actions:
                 self.admin.post(url, {
@@ -101,16 +116,13 @@ class InvoiceAdminTestCase(TestCase):
         mock_action = MagicMock(side_effect=_exception_thrower)
 
         mock_invoice = MagicMock()
-        mock_invoice.issue = mock_action
-        mock_invoice.cancel = mock_action
-        mock_invoice.pay = mock_action
         mock_invoice.clone_into_draft = mock_action
         mock_invoice.create_invoice = mock_action
 
         with patch.multiple('silver.admin',
                             LogEntry=mock_log_entry,
                             Invoice=mock_invoice):
-            actions = ['issue', 'pay', 'cancel', 'clone']
+            actions = ['clone']
 
             for action in actions:
                 self.admin.post(url, {
@@ -119,3 +131,161 @@ class InvoiceAdminTestCase(TestCase):
                 })
 
                 assert not mock_log_action.call_count
+
+    def test_transition_actions_go_through_bulk_transition(self):
+        invoices = InvoiceFactory.create_batch(2)
+        selected_invoices = [str(invoice.pk) for invoice in invoices]
+
+        url = reverse('admin:silver_invoice_changelist')
+        content_type_id = ContentType.objects.get_for_model(Invoice).pk
+
+        for action, state in [('issue', Invoice.STATES.ISSUED), ('pay', Invoice.STATES.PAID)]:
+            with patch('silver.admin.bulk_transition',
+                       wraps=bulk_transition) as bulk_transition_mock:
+                self.admin.post(url, {'action': action, '_selected_action': selected_invoices})
+
+            assert bulk_transition_mock.call_count == 1
+            for invoice in invoices:
+                assert Invoice.objects.get(pk=invoice.pk).state == state
+                assert LogEntry.objects.filter(
+                    user_id=self.user.pk, content_type_id=content_type_id,
+                    object_id=str(invoice.pk), action_flag=CHANGE,
+                    change_message='{action} action initiated by user.'.format(
+                        action=action.capitalize()
+                    )
+                ).exists()
+
+        # paid documents can't be canceled
+        self.admin.post(url, {'action': 'cancel', '_selected_action': selected_invoices})
+
+        for invoice in invoices:
+            assert Invoice.objects.get(pk=invoice.pk).state == Invoice.STATES.PAID
+        assert not LogEntry.objects.filter(change_message='Cancel action initiated by user.')
+
+    def test_changelist_leaves_out_archived_invoices(self):
+        invoice = InvoiceFactory.create()
+        archived_invoice = InvoiceFactory.create(state=Invoice.STATES.PAID)
+        Invoice.objects.filter(pk=archived_invoice.pk).update(archived=True)
+
+        url = reverse('admin:silver_invoice_changelist')
+
+        response = self.admin.get(url)
+        self.assertEqual(list(response.context['cl'].result_list), [invoice])
+
+        response = self.admin.get(url + '?archived=yes')
+        self.assertEqual(list(response.context['cl'].result_list), [archived_invoice])
+
+    def _issued_invoices_with_pdfs(self, count):
+        invoices = []
+        for index in range(count):
+            invoice = InvoiceFactory.create()
+            invoice.issue()
+            _upload_pdf(invoice, 'Invoice %d' % index)
+            invoices.append(invoice)
+
+        return invoices
+
+    def test_download_selected_documents(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with self.settings(MEDIA_ROOT=media_root):
+            invoices = self._issued_invoices_with_pdfs(3)
+            draft_invoice = InvoiceFactory.create()
+
+            response = self.admin.post(reverse('admin:silver_invoice_changelist'), {
+                'action': 'download_selected_documents',
+                '_selected_action': [str(invoice.pk) for invoice in invoices + [draft_invoice]]
+            })
+
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertTrue(response['Content-Disposition'].startswith('attachment;'))
+
+            merged_pdf = PdfFileReader(BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(
+                sorted(merged_pdf.getPage(index).extractText().strip()
+                       for index in range(merged_pdf.getNumPages())),
+                ['Invoice 0', 'Invoice 1', 'Invoice 2']
+            )
+
+    def test_download_selected_documents_warns_about_left_out_documents(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with self.settings(MEDIA_ROOT=media_root):
+            invoices = self._issued_invoices_with_pdfs(2)
+            invoices[1].pdf.upload(BytesIO(b'not a PDF'), invoices[1].get_pdf_filename())
+
+            response = self.admin.post(reverse('admin:silver_invoice_changelist'), {
+                'action': 'download_selected_documents',
+                '_selected_action': [str(invoice.pk) for invoice in invoices]
+            })
+            b''.join(response.streaming_content)
+
+            self.assertEqual(
+                [force_str(message) for message in get_messages(response.wsgi_request)],
+                ["The PDFs of these documents couldn't be merged and were left out: %s." %
+                 invoices[1].series_number]
+            )
+
+    def test_download_many_selected_documents_in_the_background(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with self.settings(MEDIA_ROOT=media_root):
+            invoices = self._issued_invoices_with_pdfs(2)
+
+            with patch('silver.admin.PDF_EXPORT_MAX_DOCUMENTS', 1), \
+                    patch('silver.admin.export_documents_pdfs') as export_documents_pdfs:
+                response = self.admin.post(reverse('admin:silver_invoice_changelist'), {
+                    'action': 'download_selected_documents',
+                    '_selected_action': [str(invoice.pk) for invoice in invoices]
+                }, follow=True)
+
+            documents_ids, name, export_id = export_documents_pdfs.delay.call_args[0]
+            self.assertEqual(sorted(documents_ids), sorted(invoice.pk for invoice in invoices))
+            self.assertTrue(name.startswith('exports/%s/' % export_id))
+
+            message = force_str(list(response.context['messages'])[0])
+            self.assertIn('are being merged in the background', message)
+            self.assertIn(reverse('admin:silver_invoice_export', args=[export_id]), message)
+
+    def test_export_view(self):
+        url = reverse('admin:silver_invoice_export', args=['export'])
+
+        with patch('silver.admin.get_export_report', return_value=None):
+            response = self.admin.get(url, follow=True)
+
+        self.assertEqual(response.redirect_chain[-1][0],
+                         reverse('admin:silver_invoice_changelist'))
+        self.assertIn('still being merged', force_str(list(response.context['messages'])[0]))
+
+        with patch('silver.admin.get_export_report', return_value={
+            'name': 'exports/export/merged_1.pdf', 'left_out': ['IS-1', 'IS-3']
+        }):
+            response = self.admin.get(url, follow=True)
+
+        merged_message, left_out_message = map(force_str, response.context['messages'])
+        self.assertIn('exports/export/merged_1.pdf', merged_message)
+        self.assertIn('were left out: IS-1, IS-3.', left_out_message)
+
+    def test_mark_pdf_for_generation(self):
+        invoices = InvoiceFactory.create_batch(2)
+        for invoice in invoices:
+            invoice.issue()
+        draft_invoice = InvoiceFactory.create()
+        PDF.objects.update(dirty=0)
+
+        response = self.admin.post(reverse('admin:silver_invoice_changelist'), {
+            'action': 'mark_pdf_for_generation',
+            '_selected_action': [str(invoice.pk) for invoice in invoices + [draft_invoice]]
+        }, follow=True)
+
+        self.assertEqual(list(PDF.objects.values_list('dirty', flat=True)), [1, 1])
+        self.assertEqual([force_str(message) for message in response.context['messages']], [
+            'Successfully marked 2 invoices for PDF generation.',
+            "Couldn't mark 1 invoices for PDF generation, because they have no PDF."
+        ])
+        self.assertEqual(
+            LogEntry.objects.filter(change_message__startswith='Mark for generation').count(), 2
+        )
@@ -17,7 +17,7 @@ from __future__ import absolute_import
 from itertools import cycle
 from mock import MagicMock, patch, Mock
 
-from django.contrib.admin.models import CHANGE
+from django.contrib.admin.models import CHANGE, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
@@ -25,7 +25,9 @@ from django.utils.encoding import force_str
 from django.test import TestCase, Client
 from django_fsm import TransitionNotAllowed
 
+from silver.documents_transitions import bulk_transition
 from silver.fixtures.factories import ProformaFactory
+from silver.models import Proforma
 
 
 class ProformaAdminTestCase(TestCase):
@@ -48,16 +50,13 @@ class ProformaAdminTestCase(TestCase):
         mock_action = Mock(return_value=Mock(series_number='aaa', admin_change_url="result_url"))
 
         mock_proforma = MagicMock()
-        mock_proforma.issue = mock_action
-        mock_proforma.cancel = mock_action
-        mock_proforma.pay = mock_action
         mock_proforma.clone_into_draft = mock_action
         mock_proforma.create_invoice = mock_action
 
         with patch.multiple('silver.admin',
                             LogEntry=mock_log_entry,
                             Proforma=mock_proforma):
-            actions = ['issue', 'pay', 'cancel', 'clone', 'create_invoice']
+            actions = ['clone', 'create_invoice']
 
             for action in actions:
                 self.admin.post(url, {
@@ -100,16 +99,13 @@ class ProformaAdminTestCase(TestCase):
         mock_action = MagicMock(side_effect=_exception_thrower)
 
         mock_proforma = MagicMock()
-        mock_proforma.issue = mock_action
-        mock_proforma.cancel = mock_action
-        mock_proforma.pay = mock_action
         mock_proforma.clone_into_draft = mock_action
         mock_proforma.create_invoice = mock_action
 
         with patch.multiple('silver.admin',
                             LogEntry=mock_log_entry,
                             Proforma=mock_proforma):
-            actions = ['issue', 'pay', 'cancel', 'clone', 'create_invoice']
+            actions = ['clone', 'create_invoice']
 
             for action in actions:
                 self.admin.post(url, {
@@ -118,3 +114,33 @@ class ProformaAdminTestCase(TestCase):
                 })
 
                 assert not mock_log_action.call_count
+
+    def test_transition_actions_go_through_bulk_transition(self):
+        proformas = ProformaFactory.create_batch(2)
+        selected_proformas = [str(proforma.pk) for proforma in proformas]
+
+        url = reverse('admin:silver_proforma_changelist')
+        content_type_id = ContentType.objects.get_for_model(Proforma).pk
+
+        for action, state in [('issue', Proforma.STATES.ISSUED), ('pay', Proforma.STATES.PAID)]:
+            with patch('silver.admin.bulk_transition',
+                       wraps=bulk_transition) as bulk_transition_mock:
+                self.admin.post(url, {'action': action, '_selected_action': selected_proformas})
+
+            assert bulk_transition_mock.call_count == 1
+            for proforma in proformas:
+                assert Proforma.objects.get(pk=proforma.pk).state == state
+                assert LogEntry.objects.filter(
+                    user_id=self.user.pk, content_type_id=content_type_id,
+                    object_id=str(proforma.pk), action_flag=CHANGE,
+                    change_message='{action} action initiated by user.'.format(
+                        action=action.capitalize()
+                    )
+                ).exists()
+
+        # paid documents can't be canceled
+        self.admin.post(url, {'action': 'cancel', '_selected_action': selected_proformas})
+
+        for proforma in proformas:
+            assert Proforma.objects.get(pk=proforma.pk).state == Proforma.STATES.PAID
+        assert not LogEntry.objects.filter(change_message='Cancel action initiated by user.')
@@ -146,6 +146,18 @@ invoice_definition = ResourceDefinition("invoice", {
             )
         ]
     },
+    'amount_paid_in_transaction_currency': {
+        'read_only': True,
+        'output': lambda invoice: decimal_string_or_none(invoice.amount_paid_in_transaction_currency),
+    },
+    'amount_pending_in_transaction_currency': {
+        'read_only': True,
+        'output': lambda invoice: decimal_string_or_none(invoice.amount_pending_in_transaction_currency),
+    },
+    'amount_to_be_charged_in_transaction_currency': {
+        'read_only': True,
+        'output': lambda invoice: decimal_string_or_none(invoice.amount_to_be_charged_in_transaction_currency),
+    },
     'issue_date': {
         'required': False,
         'expected_input_types': date,
@@ -0,0 +1,84 @@
+# Copyright (c) 2024 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import pytest
+
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from silver.fixtures.factories import (
+    BonusFactory, CustomerFactory, DiscountFactory, PlanFactory, SubscriptionFactory
+)
+
+
+CUSTOMER_ENDPOINTS = [
+    ('customer-discount-list', DiscountFactory.create),
+    ('customer-bonus-list', lambda: BonusFactory.create(amount_percentage=10)),
+]
+
+
+@pytest.mark.parametrize('url_name, factory', CUSTOMER_ENDPOINTS)
+@pytest.mark.django_db
+def test_customer_discounts_and_bonuses_include_the_ones_the_customer_may_get(
+    authenticated_api_client, url_name, factory
+):
+    customer = CustomerFactory.create()
+    other_customer = CustomerFactory.create()
+
+    public_plan = PlanFactory.create(private=False)
+    private_plan = PlanFactory.create(private=True)
+    subscribed_plan = PlanFactory.create(private=True)
+    SubscriptionFactory.create(customer=customer, plan=subscribed_plan)
+
+    unfiltered = factory()
+
+    for_customer = factory()
+    for_customer.filter_customers.add(customer)
+
+    for_public_plan = factory()
+    for_public_plan.filter_plans.add(public_plan)
+
+    for_subscribed_plan = factory()
+    for_subscribed_plan.filter_plans.add(subscribed_plan)
+
+    for_other_customer = factory()
+    for_other_customer.filter_customers.add(other_customer)
+
+    for_private_plan = factory()
+    for_private_plan.filter_plans.add(private_plan)
+
+    response = authenticated_api_client.get(reverse(url_name, kwargs={'customer_pk': customer.pk}))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(entry['id'] for entry in response.data) == {
+        unfiltered.id, for_customer.id, for_public_plan.id, for_subscribed_plan.id
+    }
+
+
+@pytest.mark.parametrize('url_name, factory', CUSTOMER_ENDPOINTS)
+@pytest.mark.django_db
+def test_customer_without_subscriptions_discounts_and_bonuses(authenticated_api_client, url_name, factory):
+    customer = CustomerFactory.create()
+
+    unfiltered = factory()
+
+    for_public_plan = factory()
+    for_public_plan.filter_plans.add(PlanFactory.create(private=False))
+
+    response = authenticated_api_client.get(reverse(url_name, kwargs={'customer_pk': customer.pk}))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(entry['id'] for entry in response.data) == {unfiltered.id, for_public_plan.id}
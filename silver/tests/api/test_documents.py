@@ -15,6 +15,10 @@
 from __future__ import absolute_import
 
 import json
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
 
 from mock import patch
 from freezegun import freeze_time
@@ -25,11 +29,13 @@ from django.utils.encoding import force_str
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
+from rest_framework.utils.encoders import JSONEncoder
 
 from silver.fixtures.factories import (ProformaFactory, AdminUserFactory,
                                        InvoiceFactory, TransactionFactory,
                                        PaymentMethodFactory, DocumentEntryFactory)
 from silver.fixtures.test_fixtures import PAYMENT_PROCESSORS
+from silver.models import Invoice
 from silver.tests.utils import build_absolute_test_url
 
 
@@ -97,7 +103,12 @@ class TestDocumentEndpoints(APITestCase):
             u'pdf_url': build_absolute_test_url(document.pdf.url) if (document.pdf and
                                                                       document.pdf.url) else None,
             u'transactions': transactions,
-            u'total_in_transaction_currency': document.total_in_transaction_currency
+            u'total_in_transaction_currency': document.total_in_transaction_currency,
+            u'amount_paid_in_transaction_currency': document.amount_paid_in_transaction_currency,
+            u'amount_pending_in_transaction_currency':
+                document.amount_pending_in_transaction_currency,
+            u'amount_to_be_charged_in_transaction_currency':
+                document.amount_to_be_charged_in_transaction_currency
         }
 
     def _jwt_token(self, *args, **kwargs):
@@ -147,7 +158,7 @@ class TestDocumentEndpoints(APITestCase):
         response = self.client.get(url)
 
         # ^ there's a bug where specifying format='json' doesn't work
-        response_data = json.loads(json.dumps(response.data))
+        response_data = json.loads(json.dumps(response.data, cls=JSONEncoder))
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response_data), 2)
@@ -155,3 +166,106 @@ class TestDocumentEndpoints(APITestCase):
         self.assertIn(self._get_expected_data(invoice1), response_data)
 
         self.assertIn(self._get_expected_data(invoice2), response_data)
+
+    def test_documents_list_filters_archived_documents(self):
+        invoice = InvoiceFactory.create()
+        archived_invoice = InvoiceFactory.create(state=Invoice.STATES.PAID)
+        Invoice.objects.filter(pk=archived_invoice.pk).update(archived=True)
+
+        url = reverse('document-list')
+
+        response = self.client.get(url)
+        self.assertEqual(sorted(document['id'] for document in response.data),
+                         sorted([invoice.pk, archived_invoice.pk]))
+
+        response = self.client.get(url + '?archived=False')
+        self.assertEqual([document['id'] for document in response.data], [invoice.pk])
+
+        response = self.client.get(url + '?archived=True')
+        self.assertEqual([document['id'] for document in response.data], [archived_invoice.pk])
+
+        url = reverse('invoice-detail', kwargs={'pk': archived_invoice.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_documents_bulk_state_change(self):
+        invoice = InvoiceFactory.create()
+        proforma = ProformaFactory.create()
+        paid_invoice = InvoiceFactory.create(state=Invoice.STATES.PAID)
+
+        url = reverse('documents-state')
+        response = self.client.put(url, data={
+            'state': 'issued',
+            'documents': [invoice.pk, proforma.pk, paid_invoice.pk, 0],
+            'issue_date': '2017-01-20'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['transitioned'], [invoice.pk, proforma.pk])
+        self.assertEqual(response.data['errors'], {
+            str(paid_invoice.pk): 'Invoice can be issued only if it is in draft state.',
+            '0': 'Document not found.'
+        })
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.state, Invoice.STATES.ISSUED)
+        self.assertEqual(str(invoice.issue_date), '2017-01-20')
+
+    def test_documents_bulk_state_change_malformed_date(self):
+        invoice = InvoiceFactory.create(state=Invoice.STATES.ISSUED)
+
+        url = reverse('documents-state')
+        response = self.client.put(url, data={
+            'state': 'paid', 'documents': [invoice.pk], 'paid_date': '2017-02-30'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['transitioned'], [])
+        self.assertEqual(list(response.data['errors']), [str(invoice.pk)])
+
+    def test_documents_bulk_state_change_illegal_state(self):
+        url = reverse('documents-state')
+        response = self.client.put(url, data={'state': 'whatever', 'documents': [1]},
+                                   format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data, {'detail': 'Illegal state value.'})
+
+    def test_documents_pdfs_archive(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with self.settings(MEDIA_ROOT=media_root):
+            january_invoice, february_invoice, january_proforma = [
+                InvoiceFactory.create(), InvoiceFactory.create(), ProformaFactory.create()
+            ]
+            january_invoice.issue(issue_date='2017-01-10')
+            february_invoice.issue(issue_date='2017-02-10')
+            january_proforma.issue(issue_date='2017-01-20')
+            for document in (january_invoice, february_invoice, january_proforma):
+                document.pdf.upload(BytesIO(b'%PDF ' + document.kind.encode()),
+                                    document.get_pdf_filename())
+
+            # Archived documents are exported as well
+            Invoice.objects.filter(pk=january_invoice.pk).update(archived=True)
+
+            url = reverse('documents-pdfs')
+            response = self.client.get(url, {'min_issue_date': '2017-01-01',
+                                             'max_issue_date': '2017-01-31'})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/zip')
+
+            archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(sorted(archive.namelist()), sorted([
+                january_invoice.get_pdf_filename(), january_proforma.get_pdf_filename()
+            ]))
+            self.assertEqual(archive.read(january_invoice.get_pdf_filename()), b'%PDF invoice')
+
+    def test_documents_pdfs_archive_requires_admin(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse('documents-pdfs'))
+
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED,
+                                             status.HTTP_403_FORBIDDEN))
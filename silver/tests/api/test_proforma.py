@@ -91,6 +91,9 @@ class TestProformaEndpoints(APITestCase):
             "proforma_entries": [],
             "total": 0,
             "total_in_transaction_currency": 0,
+            "amount_paid_in_transaction_currency": 0,
+            "amount_pending_in_transaction_currency": 0,
+            "amount_to_be_charged_in_transaction_currency": 0,
             "transactions": []
         }
 
@@ -186,6 +189,9 @@ class TestProformaEndpoints(APITestCase):
                 "proforma_entries": [],
                 "total": 0,
                 "total_in_transaction_currency": 0,
+                "amount_paid_in_transaction_currency": 0,
+                "amount_pending_in_transaction_currency": 0,
+                "amount_to_be_charged_in_transaction_currency": 0,
                 "transactions": []
             })
 
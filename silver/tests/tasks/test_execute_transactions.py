@@ -0,0 +1,106 @@
+import pytest
+
+from mock import MagicMock, patch
+
+from silver.fixtures.factories import PaymentMethodFactory, TransactionFactory
+from silver.fixtures.test_fixtures import (
+    FailingVoidTriggeredProcessor, TriggeredProcessor, failing_void_processor, manual_processor,
+    triggered_processor
+)
+from silver.models import Transaction
+from silver.tasks import execute_transactions, execute_transactions_batch
+
+
+@pytest.mark.django_db
+def test_execute_transactions_groups_the_transactions_in_batches(monkeypatch):
+    monkeypatch.setattr('silver.tasks.EXECUTE_TRANSACTIONS_BATCH_SIZE', 2)
+
+    triggered_transactions = TransactionFactory.create_batch(
+        3, payment_method=PaymentMethodFactory.create(payment_processor=triggered_processor,
+                                                      verified=True)
+    )
+    failing_void_transaction = TransactionFactory.create(
+        payment_method=PaymentMethodFactory.create(payment_processor=failing_void_processor,
+                                                   verified=True)
+    )
+    # not executable
+    TransactionFactory.create(
+        payment_method=PaymentMethodFactory.create(payment_processor=manual_processor,
+                                                   verified=True)
+    )
+    TransactionFactory.create(
+        payment_method=PaymentMethodFactory.create(payment_processor=triggered_processor,
+                                                   verified=False)
+    )
+
+    with patch('silver.tasks.group') as group_mock:
+        execute_transactions()
+
+    batches = sorted(signature.args for signature in group_mock.call_args[0][0])
+    assert batches == sorted([
+        (triggered_processor, [transaction.id for transaction in triggered_transactions[:2]]),
+        (triggered_processor, [triggered_transactions[2].id]),
+        (failing_void_processor, [failing_void_transaction.id]),
+    ])
+
+
+@pytest.mark.django_db
+def test_execute_transactions_batch_hands_over_the_transactions_at_once():
+    payment_method = PaymentMethodFactory.create(payment_processor=triggered_processor,
+                                                 verified=True)
+    transactions = TransactionFactory.create_batch(3, payment_method=payment_method)
+    settled_transaction = TransactionFactory.create(payment_method=payment_method,
+                                                    state=Transaction.States.Settled)
+
+    mock_execute_batch = MagicMock(return_value={})
+    with patch.multiple(TriggeredProcessor, execute_transactions_batch=mock_execute_batch):
+        execute_transactions_batch(
+            triggered_processor,
+            [transaction.id for transaction in transactions] + [settled_transaction.id]
+        )
+
+    assert mock_execute_batch.call_count == 1
+    executed_transactions = mock_execute_batch.call_args[0][0]
+    assert executed_transactions == transactions
+    assert all(transaction.state == Transaction.States.Pending
+               for transaction in executed_transactions)
+
+
+@pytest.mark.django_db
+def test_execute_transactions_batch_default_implementation():
+    payment_method = PaymentMethodFactory.create(payment_processor=failing_void_processor,
+                                                 verified=True)
+    transactions = TransactionFactory.create_batch(3, payment_method=payment_method)
+
+    mock_execute = MagicMock(side_effect=[True, Exception('This happened.'), False])
+    with patch.multiple(FailingVoidTriggeredProcessor, execute_transaction=mock_execute):
+        results = FailingVoidTriggeredProcessor(failing_void_processor).process_transactions(
+            transactions
+        )
+
+    assert [call[0][0] for call in mock_execute.call_args_list] == transactions
+    assert [results[transaction] for transaction in transactions] == [True, False, False]
+
+
+@pytest.mark.django_db
+def test_process_transactions_executes_each_transaction_after_processing_it():
+    payment_method = PaymentMethodFactory.create(payment_processor=failing_void_processor,
+                                                 verified=True)
+    transactions = TransactionFactory.create_batch(3, payment_method=payment_method)
+
+    states_on_execution = []
+
+    def execute_transaction(transaction):
+        states_on_execution.append([transaction.state for transaction in transactions])
+        return True
+
+    with patch.multiple(FailingVoidTriggeredProcessor,
+                        execute_transaction=MagicMock(side_effect=execute_transaction)):
+        FailingVoidTriggeredProcessor(failing_void_processor).process_transactions(transactions)
+
+    # The transactions are moved to pending one at a time, right before being executed
+    assert states_on_execution == [
+        [Transaction.States.Pending, Transaction.States.Initial, Transaction.States.Initial],
+        [Transaction.States.Pending, Transaction.States.Pending, Transaction.States.Initial],
+        [Transaction.States.Pending, Transaction.States.Pending, Transaction.States.Pending],
+    ]
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import pytest
+
+from mock import MagicMock, patch
+
+from django.utils import timezone
+
+from silver.fixtures.factories import PaymentMethodFactory, TransactionFactory
+from silver.fixtures.test_fixtures import (
+    TriggeredProcessor, failing_void_processor, manual_processor, triggered_processor
+)
+from silver.models import Transaction
+from silver.tasks import (
+    fetch_transactions_status, fetch_transactions_status_batch,
+    get_transaction_status_poll_interval
+)
+
+
+def _pending_transactions(count, payment_processor, **kwargs):
+    return TransactionFactory.create_batch(
+        count, state=Transaction.States.Pending,
+        payment_method=PaymentMethodFactory.create(payment_processor=payment_processor,
+                                                   verified=True),
+        **kwargs
+    )
+
+
+def _queued_batches(transaction_ids=None):
+    with patch('silver.tasks.group') as group_mock:
+        fetch_transactions_status(transaction_ids)
+
+    return sorted(signature.args for signature in group_mock.call_args[0][0])
+
+
+def test_transaction_status_poll_interval_grows_with_the_transaction_age():
+    assert get_transaction_status_poll_interval(timedelta(minutes=1)) == timedelta(minutes=5)
+    assert get_transaction_status_poll_interval(timedelta(hours=10)) == timedelta(hours=1)
+    assert get_transaction_status_poll_interval(timedelta(days=30)) == timedelta(days=1)
+
+
+@pytest.mark.django_db
+def test_fetch_transactions_status_groups_the_transactions_in_batches(monkeypatch):
+    monkeypatch.setattr('silver.tasks.FETCH_TRANSACTIONS_STATUS_BATCH_SIZE', 2)
+
+    triggered_transactions = _pending_transactions(3, triggered_processor)
+    failing_void_transaction, = _pending_transactions(1, failing_void_processor)
+    _pending_transactions(1, manual_processor)
+    TransactionFactory.create(payment_method=triggered_transactions[0].payment_method)
+
+    assert _queued_batches() == sorted([
+        (triggered_processor, [transaction.id for transaction in triggered_transactions[:2]]),
+        (triggered_processor, [triggered_transactions[2].id]),
+        (failing_void_processor, [failing_void_transaction.id]),
+    ])
+
+
+@pytest.mark.django_db
+def test_fetch_transactions_status_skips_recently_polled_transactions():
+    now = timezone.now()
+
+    never_polled, = _pending_transactions(1, triggered_processor,
+                                          created_at=now - timedelta(days=10))
+    recently_polled, = _pending_transactions(1, triggered_processor,
+                                             created_at=now - timedelta(days=10),
+                                             status_fetched_at=now - timedelta(hours=2))
+    young_polled, = _pending_transactions(1, triggered_processor,
+                                          created_at=now - timedelta(hours=1),
+                                          status_fetched_at=now - timedelta(minutes=10))
+
+    assert _queued_batches() == [(triggered_processor, [never_polled.id, young_polled.id])]
+    # The given transactions are polled regardless
+    assert _queued_batches([recently_polled.id]) == [(triggered_processor, [recently_polled.id])]
+
+
+@pytest.mark.django_db
+def test_fetch_transactions_status_batch():
+    transactions = _pending_transactions(3, triggered_processor)
+    settled_transaction = TransactionFactory.create(
+        payment_method=transactions[0].payment_method, state=Transaction.States.Settled
+    )
+
+    mock_fetch = MagicMock(side_effect=[True, Exception('This happened.'), True])
+    with patch.multiple(TriggeredProcessor, fetch_transaction_status=mock_fetch):
+        fetch_transactions_status_batch(
+            triggered_processor,
+            [transaction.id for transaction in transactions] + [settled_transaction.id]
+        )
+
+    assert [call[0][0] for call in mock_fetch.call_args_list] == transactions
+    for transaction in transactions:
+        transaction.refresh_from_db()
+        assert transaction.status_fetched_at
+
+    settled_transaction.refresh_from_db()
+    assert not settled_transaction.status_fetched_at
+
+
+@pytest.mark.django_db
+def test_fetch_transactions_status_batch_hands_over_the_transactions_at_once():
+    transactions = _pending_transactions(3, triggered_processor)
+
+    mock_fetch_batch = MagicMock(return_value={})
+    with patch.multiple(TriggeredProcessor, fetch_transactions_status_batch=mock_fetch_batch):
+        fetch_transactions_status_batch(triggered_processor,
+                                        [transaction.id for transaction in transactions])
+
+    assert mock_fetch_batch.call_count == 1
+    assert mock_fetch_batch.call_args[0][0] == transactions
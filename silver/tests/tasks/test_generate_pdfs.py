@@ -18,8 +18,13 @@ import pytest
 
 from mock import patch, MagicMock
 
+from django.db import connection
+
 from silver.tasks import generate_pdfs, generate_pdf
-from silver.fixtures.factories import InvoiceFactory, ProformaFactory
+from silver.fixtures.factories import (
+    InvoiceFactory, PDFFactory, ProformaFactory, ProviderFactory
+)
+from silver.models import BillingDocumentBase
 from silver.utils.pdf import fetch_resources
 
 
@@ -75,7 +80,7 @@ def test_generate_pdf_task(settings, tmpdir, monkeypatch):
 
     pisa_document_mock = MagicMock(return_value=MagicMock(err=False))
 
-    monkeypatch.setattr('silver.models.documents.pdf.pisa.pisaDocument',
+    monkeypatch.setattr('silver.pdf_backends.pisa.pisaDocument',
                         pisa_document_mock)
 
     generate_pdf(invoice.id, invoice.kind)
@@ -91,3 +96,74 @@ def test_generate_pdf_task(settings, tmpdir, monkeypatch):
     assert pisa_document_mock.call_count == 1
 
     assert len(pisa_document_mock.mock_calls) == 1
+
+
+@pytest.mark.django_db
+def test_dirty_documents_priority_ordering():
+    first_provider, second_provider = ProviderFactory.create_batch(2)
+
+    def create_document(provider, state, issue_date=None):
+        document = InvoiceFactory.create(provider=provider, state=state, issue_date=issue_date,
+                                         pdf=PDFFactory.create(dirty=1))
+        return document.pk
+
+    old_issued = create_document(first_provider, 'issued', '2024-01-01')
+    draft = create_document(first_provider, 'draft')
+    recent_paid = create_document(first_provider, 'paid', '2024-03-01')
+    other_provider_issued = create_document(second_provider, 'issued', '2024-02-01')
+    other_provider_recent_issued = create_document(second_provider, 'issued', '2024-02-02')
+    InvoiceFactory.create(provider=second_provider, state='issued',
+                          pdf=PDFFactory.create(dirty=0))
+    InvoiceFactory.create(provider=second_provider, state='draft')
+
+    ordered_ids = [document.id for document in
+                   BillingDocumentBase.objects.dirty_pdfs_batch(10)]
+
+    # the providers take turns, the issued documents come before the drafts
+    assert ordered_ids == [recent_paid, other_provider_recent_issued, other_provider_issued,
+                           old_issued, draft]
+
+    assert [document.id for document in BillingDocumentBase.objects.dirty_pdfs_batch(3)] == \
+        [recent_paid, other_provider_recent_issued, other_provider_issued]
+
+
+@pytest.mark.django_db
+def test_dirty_pdfs_batch_without_window_functions(monkeypatch):
+    # e.g. MySQL 5.7
+    monkeypatch.setattr(connection.features, 'supports_over_clause', False)
+
+    first_provider, second_provider = ProviderFactory.create_batch(2)
+    first_documents = InvoiceFactory.create_batch(3, provider=first_provider, state='issued')
+    second_document = InvoiceFactory.create(provider=second_provider, state='issued')
+
+    documents = BillingDocumentBase.objects.dirty_pdfs_batch(2)
+
+    assert len(documents) == 2
+    assert {document.provider_id for document in documents} == {first_provider.id,
+                                                                second_provider.id}
+    assert second_document in documents
+    assert set(documents) - {second_document} <= set(first_documents)
+
+
+@pytest.mark.django_db
+def test_generate_pdfs_task_batch_size_and_backpressure(monkeypatch):
+    documents = InvoiceFactory.create_batch(5, state='issued')
+
+    monkeypatch.setattr('silver.tasks.PDF_GENERATION_BATCH_SIZE', 3)
+    monkeypatch.setattr('silver.tasks.PDF_GENERATION_MAX_QUEUE_DEPTH', 10)
+
+    monkeypatch.setattr('silver.tasks.get_pdf_generation_queue_depth', lambda: 8)
+    with patch('silver.tasks.group') as group_mock:
+        generate_pdfs()
+
+    queued_tasks = list(group_mock.call_args[0][0])
+    assert len(queued_tasks) == 2
+    assert {task.args for task in queued_tasks} <= {
+        (document.id, document.kind) for document in documents
+    }
+
+    monkeypatch.setattr('silver.tasks.get_pdf_generation_queue_depth', lambda: 10)
+    with patch('silver.tasks.group') as group_mock:
+        generate_pdfs()
+
+    assert not group_mock.called
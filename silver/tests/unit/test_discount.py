@@ -0,0 +1,140 @@
+# Copyright (c) 2022 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from silver.fixtures.factories import (
+    DiscountFactory, BonusFactory, ProductCodeFactory, MeteredFeatureFactory, CustomerFactory,
+    SubscriptionFactory
+)
+from silver.models import Discount, Bonus
+
+
+@pytest.mark.django_db
+def test_discount_matches_product_code_after_prefetch_does_no_queries(django_assert_num_queries):
+    product_code = ProductCodeFactory.create()
+    other_product_code = ProductCodeFactory.create()
+
+    filtering_discount = DiscountFactory.create()
+    filtering_discount.filter_product_codes.add(product_code)
+    unfiltered_discount = DiscountFactory.create()
+
+    with django_assert_num_queries(1 + len(Discount.FILTER_FIELDS)):
+        discounts = Discount.prefetch_filters(Discount.objects.filter(
+            id__in=[filtering_discount.id, unfiltered_discount.id]
+        ).order_by('id'))
+
+    with django_assert_num_queries(0):
+        assert discounts[0].matches_product_code(product_code)
+        assert not discounts[0].matches_product_code(other_product_code)
+        assert not discounts[0].matches_product_code(None)
+
+        assert discounts[1].matches_product_code(product_code)
+        assert discounts[1].matches_product_code(other_product_code)
+
+
+@pytest.mark.django_db
+def test_discount_filter_ids_are_invalidated_on_m2m_change():
+    customer = CustomerFactory.create()
+    discount = DiscountFactory.create()
+
+    assert discount.filter_customer_ids == frozenset()
+
+    discount.filter_customers.add(customer)
+
+    assert discount.filter_customer_ids == frozenset([customer.id])
+
+
+@pytest.mark.django_db
+def test_bonus_matches_metered_feature_units_after_prefetch_does_no_queries(django_assert_num_queries):
+    metered_feature = MeteredFeatureFactory.create()
+    other_metered_feature = MeteredFeatureFactory.create()
+
+    bonus = BonusFactory.create(amount=10, filter_annotations=["test"])
+    bonus.filter_product_codes.add(metered_feature.product_code)
+
+    bonuses = Bonus.prefetch_filters(Bonus.objects.filter(id=bonus.id))
+
+    with django_assert_num_queries(0):
+        assert bonuses[0].matches_metered_feature_units(metered_feature, ["test"])
+        assert not bonuses[0].matches_metered_feature_units(metered_feature, ["other"])
+        assert not bonuses[0].matches_metered_feature_units(other_metered_feature, ["test"])
+
+
+@pytest.mark.django_db
+def test_discount_matched_subscriptions_follow_filters_and_subscriptions():
+    subscription = SubscriptionFactory.create()
+    other_subscription = SubscriptionFactory.create()
+
+    discount = DiscountFactory.create()
+    assert set(discount.matched_subscriptions.all()) == {subscription, other_subscription}
+
+    discount.filter_customers.add(subscription.customer)
+    assert set(discount.matched_subscriptions.all()) == {subscription}
+
+    # a new subscription of the filtered customer is matched right away
+    new_subscription = SubscriptionFactory.create(customer=subscription.customer)
+    assert set(discount.matched_subscriptions.all()) == {subscription, new_subscription}
+
+    # moving a subscription to another customer is reflected as well
+    new_subscription.customer = other_subscription.customer
+    new_subscription.save()
+    assert set(discount.matched_subscriptions.all()) == {subscription}
+
+    discount.filter_customers.clear()
+    assert set(discount.matched_subscriptions.all()) == {subscription, other_subscription, new_subscription}
+    assert set(discount.matched_subscriptions.all()) == set(discount.matching_subscriptions())
+
+
+@pytest.mark.django_db
+def test_bonus_matched_subscriptions_follow_product_code_filters():
+    metered_feature = MeteredFeatureFactory.create()
+    subscription = SubscriptionFactory.create()
+    SubscriptionFactory.create()
+
+    bonus = BonusFactory.create(amount=10)
+    bonus.filter_product_codes.add(metered_feature.product_code)
+    assert not bonus.matched_subscriptions.exists()
+
+    subscription.plan.metered_features.add(metered_feature)
+    assert set(bonus.matched_subscriptions.all()) == {subscription}
+    assert set(bonus.matched_subscriptions.all()) == set(bonus.matching_subscriptions())
+
+
+@pytest.mark.django_db
+def test_refreshing_subscription_matches_only_considers_candidate_discounts():
+    subscription = SubscriptionFactory.create()
+    other_subscription = SubscriptionFactory.create()
+
+    unfiltered_discount = DiscountFactory.create()
+
+    customer_discount = DiscountFactory.create()
+    customer_discount.filter_customers.add(subscription.customer)
+
+    other_customer_discount = DiscountFactory.create()
+    other_customer_discount.filter_customers.add(other_subscription.customer)
+
+    plan_discount = DiscountFactory.create()
+    plan_discount.filter_plans.add(other_subscription.plan)
+
+    candidates = Discount._candidates_for_subscriptions([subscription], {subscription.plan.product_code_id})
+    assert set(candidates) == {unfiltered_discount, customer_discount}
+
+    # a subscription moved to the other customer loses the matches it no longer qualifies for
+    subscription.customer = other_subscription.customer
+    subscription.save()
+
+    assert set(subscription.matched_discounts.all()) == {unfiltered_discount, other_customer_discount}
+    for discount in (unfiltered_discount, customer_discount, other_customer_discount, plan_discount):
+        assert set(discount.matched_subscriptions.all()) == set(discount.matching_subscriptions())
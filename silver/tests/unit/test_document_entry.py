@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from silver.fixtures.factories import DocumentEntryFactory, InvoiceFactory, ProformaFactory
+from silver.models import DocumentEntry, Proforma
+
+
+# (quantity, unit_price, sales_tax_percent), including half cent ties and negative prices
+ENTRIES_CORPUS = [
+    ('1.0000', '0.0050', '0.00'),
+    ('1.0000', '0.0150', '0.00'),
+    ('0.5000', '0.0100', '10.00'),
+    ('3.0000', '-0.0050', '19.00'),
+    ('1.0000', '-0.0250', '24.00'),
+    ('2.5000', '0.0300', '50.00'),
+    ('7.0000', '13.3700', '19.00'),
+    ('1.0000', '0.2500', '2.00'),
+    ('1.0000', '0.7500', '2.00'),
+    ('0.3333', '99.9999', '21.50'),
+    ('12.1234', '-56.7891', '99.99'),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('quantity, unit_price, sales_tax_percent', ENTRIES_CORPUS)
+def test_entry_totals_annotations_match_properties(quantity, unit_price, sales_tax_percent):
+    invoice = InvoiceFactory.create(sales_tax_percent=Decimal(sales_tax_percent))
+    entry = DocumentEntryFactory.create(invoice=invoice, quantity=Decimal(quantity),
+                                        unit_price=Decimal(unit_price))
+
+    annotated_entry = DocumentEntry.objects.with_totals().get(pk=entry.pk)
+
+    assert annotated_entry.annotated_total_before_tax == entry.total_before_tax
+    assert annotated_entry.annotated_tax_value == entry.tax_value
+    assert annotated_entry.annotated_total == entry.total
+
+
+@pytest.mark.django_db
+def test_entry_totals_annotations_dont_overflow_for_large_values():
+    # quantity * unit_price scaled by 10 ** 8 is well past the BIGINT range
+    invoice = InvoiceFactory.create(sales_tax_percent=Decimal('19.00'))
+    entries = [
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('100000.0000'),
+                                    unit_price=Decimal('1000000.0000')),
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('100000.0000'),
+                                    unit_price=Decimal('1234567.8912')),
+    ]
+
+    for entry in entries:
+        annotated_entry = DocumentEntry.objects.with_totals().get(pk=entry.pk)
+
+        assert annotated_entry.annotated_total_before_tax == entry.total_before_tax
+        assert annotated_entry.annotated_tax_value == entry.tax_value
+
+    totals = invoice.entries.aggregate_totals()
+
+    assert totals['total_before_tax'] == Decimal('223456789120.00')
+    assert totals['tax_value'] == sum(entry.tax_value for entry in entries)
+    assert totals['total'] == invoice.compute_total()
+
+
+@pytest.mark.django_db
+def test_aggregate_totals_match_computed_total():
+    invoice = InvoiceFactory.create(sales_tax_percent=Decimal('19.00'))
+    for quantity, unit_price, _ in ENTRIES_CORPUS:
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal(quantity),
+                                    unit_price=Decimal(unit_price))
+
+    totals = invoice.entries.aggregate_totals()
+
+    assert totals['total'] == invoice.compute_total() == invoice.total
+    assert totals['total_before_tax'] == invoice.total_before_tax
+    assert totals['tax_value'] == invoice.tax_value
+
+
+@pytest.mark.django_db
+def test_document_entries_are_bound_to_the_document():
+    proforma = ProformaFactory.create(proforma_entries=DocumentEntryFactory.create_batch(3))
+    proforma.issue()
+    proforma.create_invoice()
+
+    proforma = Proforma.objects.select_related('related_document').get(pk=proforma.pk)
+
+    with CaptureQueriesContext(connection) as queries:
+        entries = list(proforma.entries)
+
+        for entry in entries:
+            assert entry.proforma is proforma
+            assert entry.invoice is proforma.related_document
+            assert entry.document is proforma.related_document
+
+            entry.total
+            entry.tax_value_in_transaction_currency
+
+    assert len(queries) == 1
+
+
+@pytest.mark.django_db
+def test_document_entries_dont_load_the_related_document():
+    proforma = ProformaFactory.create(proforma_entries=DocumentEntryFactory.create_batch(3))
+    proforma.issue()
+    proforma.create_invoice()
+
+    proforma = Proforma.objects.get(pk=proforma.pk)
+
+    with CaptureQueriesContext(connection) as queries:
+        entries = list(proforma.entries.filter(quantity__gt=0))
+
+        for entry in entries:
+            assert entry.proforma is proforma
+
+    assert len(queries) == 1
@@ -0,0 +1,88 @@
+import pytest
+
+from django.core.management import call_command
+
+from silver.fixtures.factories import InvoiceFactory, ProformaFactory, ProviderFactory
+from silver.models import DocumentNumberCounter, Invoice
+
+
+@pytest.mark.django_db
+def test_numbers_are_allocated_from_the_counter():
+    provider = ProviderFactory.create(invoice_starting_number=10)
+
+    first_invoice = InvoiceFactory.create(provider=provider)
+    first_invoice.issue()
+    second_invoice = InvoiceFactory.create(provider=provider)
+    second_invoice.issue()
+
+    assert (first_invoice.number, second_invoice.number) == (10, 11)
+
+    counter = DocumentNumberCounter.objects.get(kind='invoice', provider=provider,
+                                                series=provider.invoice_series)
+    assert counter.last_number == 11
+
+
+@pytest.mark.django_db
+def test_counters_are_kept_per_kind():
+    provider = ProviderFactory.create(invoice_starting_number=1, proforma_starting_number=1)
+
+    invoice = InvoiceFactory.create(provider=provider)
+    invoice.issue()
+    proforma = ProformaFactory.create(provider=provider)
+    proforma.issue()
+
+    assert invoice.number == proforma.number == 1
+
+
+@pytest.mark.django_db
+def test_counter_is_seeded_from_existing_documents():
+    provider = ProviderFactory.create(invoice_starting_number=1)
+    invoice = InvoiceFactory.create(provider=provider, state=Invoice.STATES.ISSUED)
+
+    DocumentNumberCounter.objects.all().delete()
+
+    new_invoice = InvoiceFactory.create(provider=provider)
+    new_invoice.issue()
+
+    assert new_invoice.number == invoice.number + 1
+
+
+@pytest.mark.django_db
+def test_explicit_numbers_are_not_allocated_again():
+    provider = ProviderFactory.create(invoice_starting_number=1)
+
+    InvoiceFactory.create(provider=provider, state=Invoice.STATES.ISSUED)
+    InvoiceFactory.create(provider=provider, state=Invoice.STATES.ISSUED, number=42)
+
+    invoice = InvoiceFactory.create(provider=provider)
+    invoice.issue()
+
+    assert invoice.number == 43
+
+
+@pytest.mark.django_db
+def test_assign_numbers_reserves_a_block_per_series():
+    provider = ProviderFactory.create(invoice_starting_number=5)
+    invoices = InvoiceFactory.create_batch(3, provider=provider)
+    other_series_invoice = InvoiceFactory.create(provider=provider, series='OTHER')
+
+    DocumentNumberCounter.assign_numbers(invoices + [other_series_invoice])
+
+    assert [invoice.number for invoice in invoices] == [5, 6, 7]
+    assert other_series_invoice.number == 1
+    assert DocumentNumberCounter.objects.get(
+        kind='invoice', provider=provider, series=provider.invoice_series
+    ).last_number == 7
+
+
+@pytest.mark.django_db
+def test_seed_document_number_counters_command():
+    provider = ProviderFactory.create(invoice_starting_number=1)
+    invoice = InvoiceFactory.create(provider=provider, state=Invoice.STATES.ISSUED)
+    Invoice.objects.filter(pk=invoice.pk).update(number=100)
+
+    call_command('seed_document_number_counters')
+
+    assert DocumentNumberCounter.objects.get(
+        kind='invoice', provider=provider, series=invoice.series
+    ).last_number == 100
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import pytest
+
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from silver.fixtures.factories import InvoiceFactory, ProformaFactory
+from silver.models import BillingDocumentBase, Invoice, Proforma
+
+
+@pytest.mark.django_db
+def test_archivable_documents():
+    long_ago = timezone.now().date() - timedelta(days=400)
+    recently = timezone.now().date() - timedelta(days=10)
+
+    old_paid_invoice = InvoiceFactory.create(state=Invoice.STATES.PAID, paid_date=long_ago)
+    old_canceled_proforma = ProformaFactory.create(state=Proforma.STATES.CANCELED,
+                                                   cancel_date=long_ago)
+    InvoiceFactory.create(state=Invoice.STATES.PAID, paid_date=recently)
+    InvoiceFactory.create(state=Invoice.STATES.ISSUED, issue_date=long_ago)
+
+    archivable = BillingDocumentBase.objects.archivable(timedelta(days=365))
+
+    assert set(archivable) == {old_paid_invoice, old_canceled_proforma}
+
+
+@pytest.mark.django_db
+def test_archive_in_batches():
+    long_ago = timezone.now().date() - timedelta(days=400)
+    invoices = InvoiceFactory.create_batch(5, state=Invoice.STATES.PAID, paid_date=long_ago)
+
+    archived = BillingDocumentBase.objects.archivable(timedelta(days=365)).archive(batch_size=2)
+
+    assert archived == 5
+    assert set(Invoice.objects.cold()) == set(invoices)
+    assert not Invoice.objects.hot().exists()
+
+
+@pytest.mark.django_db
+def test_archive_billing_documents_command(settings):
+    long_ago = timezone.now().date() - timedelta(days=400)
+    invoice = InvoiceFactory.create(state=Invoice.STATES.PAID, paid_date=long_ago)
+
+    settings.SILVER_DOCUMENTS_ARCHIVE_HORIZON = None
+    with pytest.raises(CommandError):
+        call_command('archive_billing_documents')
+
+    call_command('archive_billing_documents', days=500)
+    assert not Invoice.objects.get(pk=invoice.pk).archived
+
+    settings.SILVER_DOCUMENTS_ARCHIVE_HORIZON = timedelta(days=365)
+    call_command('archive_billing_documents')
+    assert Invoice.objects.get(pk=invoice.pk).archived
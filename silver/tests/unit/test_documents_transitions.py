@@ -0,0 +1,181 @@
+from decimal import Decimal
+
+import pytest
+from mock import MagicMock
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from silver.documents_transitions import bulk_cancel, bulk_issue, bulk_pay
+from silver.fixtures.factories import (
+    CustomerFactory, DocumentEntryFactory, InvoiceFactory, PaymentMethodFactory, ProformaFactory,
+    ProviderFactory, TransactionFactory
+)
+from silver.fixtures.test_fixtures import PAYMENT_PROCESSORS
+from silver.models import BillingDocumentBase, Invoice, Proforma, Transaction
+
+
+def _create_invoices(count, provider, customer):
+    invoices = []
+    for _ in range(count):
+        invoice = InvoiceFactory.create(provider=provider, customer=customer,
+                                        sales_tax_percent=Decimal('19.00'))
+        DocumentEntryFactory.create_batch(2, invoice=invoice)
+        invoices.append(invoice)
+
+    return invoices
+
+
+@pytest.mark.django_db
+def test_bulk_issue_matches_single_issue():
+    provider = ProviderFactory.create(invoice_starting_number=1)
+    customer = CustomerFactory.create()
+    single_invoice, bulk_invoice = _create_invoices(2, provider, customer)
+
+    single_invoice.issue(issue_date='2024-01-15', due_date='2024-01-30')
+    transitioned, errors = bulk_issue([bulk_invoice], issue_date='2024-01-15',
+                                      due_date='2024-01-30')
+
+    assert not errors
+    assert transitioned == [bulk_invoice]
+
+    single_invoice = Invoice.objects.get(pk=single_invoice.pk)
+    bulk_invoice = Invoice.objects.get(pk=bulk_invoice.pk)
+
+    assert bulk_invoice.state == Invoice.STATES.ISSUED
+    assert bulk_invoice.number == single_invoice.number + 1
+    assert bulk_invoice.pdf and bulk_invoice.pdf.dirty
+    for field in ('issue_date', 'due_date', 'sales_tax_name', 'sales_tax_percent',
+                  'transaction_xe_rate', 'archived_customer', 'archived_provider'):
+        assert getattr(bulk_invoice, field) == getattr(single_invoice, field)
+
+    assert bulk_invoice._total == bulk_invoice.compute_total()
+    assert bulk_invoice._total_in_transaction_currency == \
+        bulk_invoice.compute_total_in_transaction_currency()
+
+
+@pytest.mark.django_db
+def test_bulk_issue_queries_do_not_depend_on_the_number_of_documents():
+    provider = ProviderFactory.create(invoice_starting_number=1)
+    customer = CustomerFactory.create()
+
+    def count_queries(invoices):
+        with CaptureQueriesContext(connection) as queries:
+            bulk_issue(invoices)
+
+        return len(queries)
+
+    # seeds the number counter
+    bulk_issue(_create_invoices(1, provider, customer))
+
+    assert count_queries(_create_invoices(2, provider, customer)) == \
+        count_queries(_create_invoices(10, provider, customer))
+
+
+@pytest.mark.django_db
+def test_bulk_transitions_report_invalid_source_states():
+    invoice = InvoiceFactory.create()
+
+    transitioned, errors = bulk_pay([invoice.pk])
+
+    assert not transitioned
+    assert errors == {invoice: 'Invoice can be paid only if it is in issued state.'}
+    assert Invoice.objects.get(pk=invoice.pk).state == Invoice.STATES.DRAFT
+
+
+@pytest.mark.django_db
+def test_bulk_pay_and_cancel():
+    invoices = InvoiceFactory.create_batch(2, state=Invoice.STATES.ISSUED)
+
+    bulk_pay([invoices[0]], paid_date='2024-02-01')
+    bulk_cancel([invoices[1]], cancel_date='2024-02-02')
+
+    paid_invoice, canceled_invoice = [Invoice.objects.get(pk=invoice.pk) for invoice in invoices]
+    assert paid_invoice.state == Invoice.STATES.PAID
+    assert str(paid_invoice.paid_date) == '2024-02-01'
+    assert canceled_invoice.state == Invoice.STATES.CANCELED
+    assert str(canceled_invoice.cancel_date) == '2024-02-02'
+
+
+@pytest.mark.django_db
+def test_bulk_pay_and_cancel_report_malformed_dates():
+    invoices = InvoiceFactory.create_batch(2, state=Invoice.STATES.ISSUED)
+
+    transitioned, errors = bulk_pay(invoices[:1], paid_date='2024-13-01')
+
+    assert not transitioned
+    assert list(errors) == invoices[:1]
+
+    transitioned, errors = bulk_cancel(invoices[1:], cancel_date='yesterday')
+
+    assert not transitioned
+    assert list(errors) == invoices[1:]
+
+    assert set(Invoice.objects.values_list('state', flat=True)) == {Invoice.STATES.ISSUED}
+
+
+@pytest.mark.django_db
+def test_bulk_transitions_check_the_transactions_currency():
+    transaction = TransactionFactory.create()
+    invoice = transaction.invoice
+    Invoice.objects.filter(pk=invoice.pk).update(related_document=None)
+    Transaction.objects.filter(pk=transaction.pk).update(
+        currency='EUR' if invoice.transaction_currency != 'EUR' else 'USD'
+    )
+    other_invoice = InvoiceFactory.create(state=Invoice.STATES.ISSUED)
+
+    transitioned, errors = bulk_pay([invoice, other_invoice])
+
+    assert transitioned == [other_invoice]
+    assert errors == {invoice: 'There are unfinished transactions of this document that use a '
+                               'different currency.'}
+    assert Invoice.objects.get(pk=invoice.pk).state == Invoice.STATES.ISSUED
+
+
+@pytest.mark.django_db
+def test_bulk_transitions_send_post_save():
+    provider = ProviderFactory.create()
+    customer = CustomerFactory.create()
+    invoices = _create_invoices(2, provider, customer)
+
+    receiver = MagicMock()
+    post_save.connect(receiver, sender=Invoice)
+    try:
+        transitioned, _ = bulk_issue(invoices)
+    finally:
+        post_save.disconnect(receiver, sender=Invoice)
+
+    assert [call[1]['instance'] for call in receiver.call_args_list] == transitioned
+    for call in receiver.call_args_list:
+        assert not call[1]['created']
+        assert call[1]['instance'].state == Invoice.STATES.ISSUED
+        assert {'state', 'number', '_total'} <= call[1]['update_fields']
+
+
+@pytest.mark.django_db
+def test_bulk_pay_proforma_goes_through_the_regular_transition():
+    proforma = ProformaFactory.create(state=Proforma.STATES.ISSUED,
+                                      proforma_entries=[DocumentEntryFactory.create()])
+
+    transitioned, errors = bulk_pay([proforma])
+
+    assert not errors
+    proforma = Proforma.objects.get(pk=proforma.pk)
+    assert proforma.state == Proforma.STATES.PAID
+    assert proforma.related_document.state == BillingDocumentBase.STATES.PAID
+
+
+@pytest.mark.django_db
+@override_settings(PAYMENT_PROCESSORS=PAYMENT_PROCESSORS,
+                   SILVER_AUTOMATICALLY_CREATE_TRANSACTIONS=True)
+def test_bulk_issue_creates_transactions():
+    customer = CustomerFactory.create()
+    PaymentMethodFactory.create(customer=customer, canceled=False, verified=True)
+    invoices = InvoiceFactory.create_batch(2, customer=customer,
+                                           invoice_entries=[DocumentEntryFactory.create()])
+
+    bulk_issue(invoices)
+
+    assert Transaction.objects.filter(invoice__in=invoices).count() == 2
@@ -19,9 +19,11 @@ from decimal import Decimal
 
 from six.moves import zip
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from silver.models import DocumentEntry, Proforma, Invoice
+from silver.models import DocumentEntry, Proforma, Invoice, Provider
 from silver.fixtures.factories import (ProformaFactory, InvoiceFactory,
                                        DocumentEntryFactory, CustomerFactory)
 
@@ -275,3 +277,130 @@ class TestInvoice(TestCase):
         assert storno.state == storno.STATES.ISSUED
         assert storno.issue_date == date.today()
         assert not storno.due_date
+
+    def test_draft_totals_are_maintained_on_entry_changes(self):
+        invoice = InvoiceFactory.create(sales_tax_percent=Decimal('10.00'))
+
+        entry = DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('2.0000'),
+                                            unit_price=Decimal('10.0000'))
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('1.0000'),
+                                    unit_price=Decimal('5.0000'))
+
+        stored_invoice = Invoice.objects.get(pk=invoice.pk)
+        assert stored_invoice.total_before_tax == invoice.total_before_tax == Decimal('25.00')
+        assert stored_invoice.tax_value == invoice.tax_value == Decimal('2.50')
+        assert stored_invoice.total == Decimal('27.50')
+
+        entry.quantity = Decimal('3.0000')
+        entry.save()
+        assert Invoice.objects.get(pk=invoice.pk).total == Decimal('38.50')
+
+        entry.delete()
+        assert Invoice.objects.get(pk=invoice.pk).total == Decimal('5.50')
+
+    def test_draft_totals_are_recomputed_on_sales_tax_percent_change(self):
+        invoice = InvoiceFactory.create(sales_tax_percent=Decimal('10.00'))
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('1.0000'),
+                                    unit_price=Decimal('100.0000'))
+
+        invoice.sales_tax_percent = Decimal('20.00')
+        invoice.save()
+
+        assert invoice.tax_value == Decimal('20.00')
+        assert Invoice.objects.get(pk=invoice.pk).total == Decimal('120.00')
+
+    def test_stale_document_save_does_not_overwrite_totals(self):
+        invoice = InvoiceFactory.create()
+        stale_invoice = Invoice.objects.get(pk=invoice.pk)
+
+        DocumentEntryFactory.create(invoice=invoice, quantity=Decimal('1.0000'),
+                                    unit_price=Decimal('100.0000'))
+
+        stale_invoice.due_date = date.today()
+        stale_invoice.save()
+
+        assert Invoice.objects.get(pk=invoice.pk).total_before_tax == Decimal('100.00')
+
+    def test_explicit_update_fields_write_the_totals(self):
+        invoice = InvoiceFactory.create()
+
+        invoice._total_before_tax = Decimal('10.00')
+        invoice.save(update_fields=['_total_before_tax'])
+
+        assert Invoice.objects.get(pk=invoice.pk).total_before_tax == Decimal('10.00')
+
+    def test_deleting_a_draft_does_not_update_its_totals_per_entry(self):
+        def count_delete_queries(entries_count):
+            invoice = InvoiceFactory.create(
+                invoice_entries=DocumentEntryFactory.create_batch(entries_count)
+            )
+            invoice = Invoice.objects.get(pk=invoice.pk)
+
+            with CaptureQueriesContext(connection) as context:
+                invoice.delete()
+
+            assert not Invoice.objects.filter(pk=invoice.pk).exists()
+            return len(context.captured_queries)
+
+        assert count_delete_queries(1) == count_delete_queries(5)
+
+    def test_cascade_deleting_drafts_does_not_update_their_totals_per_entry(self):
+        def count_delete_queries(entries_count):
+            invoice = InvoiceFactory.create(
+                invoice_entries=DocumentEntryFactory.create_batch(entries_count)
+            )
+            provider = Provider.objects.get(pk=invoice.provider_id)
+
+            with CaptureQueriesContext(connection) as context:
+                provider.hard_delete()
+
+            assert not Invoice.objects.filter(pk=invoice.pk).exists()
+            return len(context.captured_queries)
+
+        assert count_delete_queries(1) == count_delete_queries(5)
+
+    def test_saving_a_document_whose_row_is_gone_inserts_it(self):
+        invoice = InvoiceFactory.create(invoice_entries=DocumentEntryFactory.create_batch(2))
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        Invoice.objects.filter(pk=invoice.pk).delete()
+
+        invoice.save()
+
+        assert Invoice.objects.filter(pk=invoice.pk).exists()
+
+    def test_draft_total_does_not_load_entries(self):
+        invoice = InvoiceFactory.create(invoice_entries=DocumentEntryFactory.create_batch(3))
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        expected_total = invoice.compute_total()
+
+        with self.assertNumQueries(0):
+            assert invoice.total == expected_total
+
+    def test_clone_and_storno_copy_entries_in_bulk(self):
+        def count_queries(entries_count):
+            invoice = InvoiceFactory.create(
+                state=Invoice.STATES.PAID,
+                invoice_entries=DocumentEntryFactory.create_batch(entries_count)
+            )
+            invoice = Invoice.objects.get(pk=invoice.pk)
+
+            with CaptureQueriesContext(connection) as queries:
+                invoice.clone_into_draft()
+                invoice.create_storno()
+
+            return len(queries)
+
+        assert count_queries(2) == count_queries(10)
+
+    def test_storno_maintained_totals(self):
+        invoice = InvoiceFactory.create(
+            state=Invoice.STATES.PAID, sales_tax_percent=Decimal('19.00'),
+            invoice_entries=DocumentEntryFactory.create_batch(3)
+        )
+        invoice.refresh_totals()
+
+        storno = Invoice.objects.get(pk=invoice.create_storno().pk)
+
+        assert storno.invoice_entries.count() == 3
+        assert storno.total_before_tax == -invoice.total_before_tax
+        assert storno.total == storno.compute_total() != 0
@@ -0,0 +1,132 @@
+import pickle
+from io import StringIO
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from mock import MagicMock, patch
+
+from django.core.management import call_command
+
+from silver.fixtures.factories import PaymentMethodFactory, TransactionFactory
+from silver.fixtures.test_fixtures import TriggeredProcessor, triggered_processor
+from silver.models import PaymentMethod
+from silver.models.payment_methods import decrypt_payment_methods_data
+from silver.tasks import execute_transactions_batch
+from silver.utils.encryption import get_payment_method_cipher
+
+
+@pytest.fixture
+def secrets(settings):
+    settings.PAYMENT_METHOD_SECRET = Fernet.generate_key()
+
+    return settings
+
+
+def test_payment_method_cipher_is_cached(secrets):
+    cipher = get_payment_method_cipher()
+    assert get_payment_method_cipher() is cipher
+
+    secrets.PAYMENT_METHOD_OLD_SECRETS = [Fernet.generate_key()]
+    assert get_payment_method_cipher() is not cipher
+
+
+@pytest.mark.django_db
+def test_decrypt_data_with_old_secrets(secrets):
+    old_secret = secrets.PAYMENT_METHOD_SECRET
+    payment_method = PaymentMethodFactory.create()
+    crypted_data = payment_method.encrypt_data('token')
+
+    secrets.PAYMENT_METHOD_SECRET = Fernet.generate_key()
+    payment_method = PaymentMethod.objects.get(id=payment_method.id)
+    with pytest.raises(InvalidToken):
+        payment_method.decrypt_data(crypted_data)
+
+    secrets.PAYMENT_METHOD_OLD_SECRETS = [old_secret]
+    assert payment_method.decrypt_data(crypted_data) == 'token'
+    assert payment_method.decrypt_data(crypted_data.encode('utf-8')) == 'token'
+
+
+@pytest.mark.django_db
+def test_decrypt_payment_methods_data_decrypts_each_value_once(secrets, monkeypatch):
+    payment_methods = PaymentMethodFactory.create_batch(2)
+    for payment_method in payment_methods:
+        payment_method.data = {
+            'token': payment_method.encrypt_data('token %d' % payment_method.id),
+            'details': {'plain': 'text'}
+        }
+        payment_method.save()
+
+    payment_methods = list(PaymentMethod.objects.filter(id__in=[pm.id for pm in payment_methods]))
+    decrypt = MagicMock(wraps=get_payment_method_cipher().decrypt)
+    monkeypatch.setattr(get_payment_method_cipher(), 'decrypt', decrypt)
+
+    decrypt_payment_methods_data(payment_methods)
+    for payment_method in payment_methods:
+        assert payment_method.decrypt_data(payment_method.data['token']) == \
+            'token %d' % payment_method.id
+
+    assert decrypt.call_count == 2
+
+
+@pytest.mark.django_db
+def test_pickled_payment_methods_dont_hold_decrypted_data(secrets):
+    payment_method = PaymentMethodFactory.create()
+    payment_method.data = {'token': payment_method.encrypt_data('secret token')}
+    payment_method.decrypt_data(payment_method.data['token'])
+
+    pickled_payment_method = pickle.dumps(payment_method)
+    assert b'secret token' not in pickled_payment_method
+
+    unpickled_payment_method = pickle.loads(pickled_payment_method)
+    assert unpickled_payment_method.decrypt_data(payment_method.data['token']) == 'secret token'
+
+
+@pytest.mark.django_db
+def test_execute_transactions_batch_decrypts_the_payment_methods_data(secrets):
+    payment_method = PaymentMethodFactory.create(payment_processor=triggered_processor,
+                                                 verified=True)
+    payment_method.data = {'token': payment_method.encrypt_data('token')}
+    payment_method.save()
+    transactions = TransactionFactory.create_batch(2, payment_method=payment_method)
+
+    executed_payment_methods = []
+
+    def execute_transaction(processor, transaction):
+        executed_payment_methods.append(transaction.payment_method)
+
+    with patch.multiple(TriggeredProcessor, execute_transaction=execute_transaction):
+        execute_transactions_batch(triggered_processor,
+                                   [transaction.id for transaction in transactions])
+
+    assert executed_payment_methods[0] is executed_payment_methods[1]
+    assert executed_payment_methods[0]._decrypted_data == {payment_method.data['token']: 'token'}
+
+
+@pytest.mark.django_db
+def test_reencrypt_payment_methods_data_command(secrets):
+    old_secret = secrets.PAYMENT_METHOD_SECRET
+    payment_methods = PaymentMethodFactory.create_batch(3)
+    for payment_method in payment_methods[:2]:
+        payment_method.data = {'token': payment_method.encrypt_data('token'),
+                               'cards': [{'number': payment_method.encrypt_data('4242')}],
+                               'plain': 'text'}
+        payment_method.save()
+
+    secrets.PAYMENT_METHOD_SECRET = Fernet.generate_key()
+    secrets.PAYMENT_METHOD_OLD_SECRETS = [old_secret]
+
+    output = StringIO()
+    call_command('reencrypt_payment_methods_data', batch_size=1, stdout=output)
+    assert output.getvalue().strip() == 'Re-encrypted the data of 2 payment methods.'
+
+    secrets.PAYMENT_METHOD_OLD_SECRETS = []
+    rotated_ids = [payment_method.id for payment_method in payment_methods[:2]]
+    for payment_method in PaymentMethod.objects.filter(id__in=rotated_ids):
+        assert payment_method.decrypt_data(payment_method.data['token']) == 'token'
+        assert payment_method.decrypt_data(payment_method.data['cards'][0]['number']) == '4242'
+        assert payment_method.data['plain'] == 'text'
+
+    output = StringIO()
+    call_command('reencrypt_payment_methods_data', stdout=output)
+    assert output.getvalue().strip() == 'Re-encrypted the data of 0 payment methods.'
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from mock import MagicMock
+
+from silver import payment_processors
+from silver.fixtures.factories import PaymentMethodFactory
+from silver.fixtures.test_fixtures import (
+    PAYMENT_PROCESSORS, TriggeredProcessor, manual_processor, triggered_processor
+)
+from silver.models import PaymentMethod
+
+
+class SessionProcessor(TriggeredProcessor):
+    payment_method_class = None
+
+    def create_session(self):
+        return MagicMock()
+
+
+def test_get_instance_instantiates_each_processor_once(settings):
+    assert payment_processors.get_instance(triggered_processor) is \
+        payment_processors.get_instance(triggered_processor)
+
+    settings.PAYMENT_PROCESSORS = dict(PAYMENT_PROCESSORS, **{
+        triggered_processor: {'class': 'silver.fixtures.test_fixtures.ManualProcessor'}
+    })
+
+    assert payment_processors.get_instance(triggered_processor).type == \
+        payment_processors.Types.Manual
+
+
+def test_processor_sessions_are_reused_per_thread(monkeypatch):
+    monkeypatch.setitem(PAYMENT_PROCESSORS, 'session', {
+        'class': 'silver.tests.unit.test_payment_processors_registry.SessionProcessor'
+    })
+    payment_processors.clear_instances()
+
+    processor = payment_processors.get_instance('session')
+    session = processor.session
+    assert processor.session is session
+
+    thread_sessions = []
+    thread = threading.Thread(target=lambda: thread_sessions.append(processor.session))
+    thread.start()
+    thread.join()
+    assert thread_sessions[0] is not session
+
+    payment_processors.clear_instances()
+
+    assert session.close.call_count == 1
+    assert thread_sessions[0].close.call_count == 1
+    assert payment_processors.get_instance('session').session is not session
+
+
+@pytest.mark.django_db
+def test_payment_method_class_resolution_does_not_instantiate_processors(monkeypatch):
+    payment_method = PaymentMethodFactory.create(payment_processor=manual_processor)
+
+    payment_processors.get_payment_method_class(manual_processor)
+    import_string = MagicMock()
+    monkeypatch.setattr('silver.payment_processors.base.import_string', import_string)
+
+    assert PaymentMethod.objects.get(id=payment_method.id) == payment_method
+    assert not import_string.called
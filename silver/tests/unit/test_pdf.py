@@ -18,9 +18,12 @@ import pytest
 
 from mock import patch
 
+from django.db import connection
 from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext
 
-from silver.models import PDF
+from silver.fixtures.factories import InvoiceFactory, ProviderFactory
+from silver.models import BillingDocumentBase, Invoice, PDF
 
 
 @pytest.mark.django_db
@@ -97,3 +100,83 @@ def test_pdf_mark_as_clean_min_value():
     pdf.refresh_from_db()
 
     assert pdf.dirty == 0
+
+
+@pytest.mark.django_db
+def test_generate_pdf_skips_unchanged_content(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+
+    pdf = PDF.objects.create(dirty=1, upload_path='documents/invoice.pdf')
+    template = get_template('billing_documents/invoice_pdf.html')
+    context = {'filename': 'invoice.pdf'}
+
+    assert pdf.generate(template=template, context=context)
+    assert pdf.content_hash
+
+    pdf.mark_as_dirty()
+    with patch('silver.models.documents.pdf.render_pdf') as render_pdf_mock, \
+            patch('django.db.models.fields.files.FieldFile.save') as save_mock:
+        assert pdf.generate(template=template, context=context) is None
+
+    assert not render_pdf_mock.called
+    assert not save_mock.called
+    pdf.refresh_from_db()
+    assert pdf.dirty == 0
+
+    pdf.mark_as_dirty()
+    with patch('django.db.models.fields.files.FieldFile.save', autospec=True) as save_mock:
+        assert pdf.generate(template=template, context={'filename': 'renamed_invoice.pdf'})
+
+    assert save_mock.call_count == 1
+
+
+@pytest.mark.django_db
+def test_pdfs_bulk_mark_as_dirty_and_clean():
+    pdfs = [PDF.objects.create(dirty=dirty) for dirty in (0, 1, 3)]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert PDF.objects.filter(pk__in=[pdf.pk for pdf in pdfs]).mark_as_dirty() == 3
+    assert len(queries) == 1
+    assert list(PDF.objects.order_by('pk').values_list('dirty', flat=True)) == [1, 2, 4]
+
+    # the in-memory dirty counters (0, 1, 3) were rendered; the PDFs marked dirty since stay dirty
+    with CaptureQueriesContext(connection) as queries:
+        assert PDF.objects.mark_as_clean(pdfs) == 2
+    assert len(queries) == 1
+    assert list(PDF.objects.order_by('pk').values_list('dirty', flat=True)) == [1, 1, 1]
+
+    assert PDF.objects.mark_as_clean([PDF(pk=pdfs[0].pk, dirty=5)]) == 1
+    assert PDF.objects.get(pk=pdfs[0].pk).dirty == 0
+
+
+@pytest.mark.django_db
+def test_documents_mark_pdfs_for_generation():
+    invoices = InvoiceFactory.create_batch(3)
+    for invoice in invoices[:2]:
+        invoice.issue()
+    PDF.objects.update(dirty=0)
+
+    with CaptureQueriesContext(connection) as queries:
+        marked_count = BillingDocumentBase.objects.filter(
+            pk__in=[invoice.pk for invoice in invoices]
+        ).mark_pdfs_for_generation()
+
+    assert marked_count == 2
+    assert len(queries) == 1
+    assert list(PDF.objects.values_list('dirty', flat=True)) == [1, 1]
+
+
+@pytest.mark.django_db
+def test_provider_series_change_marks_draft_documents_pdfs_for_generation():
+    provider = ProviderFactory.create(invoice_series='OLD')
+    draft_invoice = InvoiceFactory.create(provider=provider,
+                                          pdf=PDF.objects.create(dirty=0, upload_path='x.pdf'))
+    issued_invoice = InvoiceFactory.create(provider=provider)
+    issued_invoice.issue()
+    PDF.objects.filter(pk=issued_invoice.pdf.pk).update(dirty=0)
+
+    provider.invoice_series = 'NEW'
+    provider.save()
+
+    assert Invoice.objects.get(pk=draft_invoice.pk).pdf.dirty == 1
+    assert Invoice.objects.get(pk=issued_invoice.pk).pdf.dirty == 0
@@ -0,0 +1,77 @@
+from io import StringIO
+
+import pytest
+from PyPDF2 import PdfFileReader
+
+from django.core.management import call_command
+
+from silver.management.commands.benchmark_pdf_backends import Command
+from silver.models.documents.pdf import PDF, render_pdf
+from silver.pdf_backends import ReportLabBackend, XHTML2PDFBackend, get_pdf_backend
+
+
+@pytest.mark.parametrize('backend_class', [XHTML2PDFBackend, ReportLabBackend])
+def test_backends_render_the_bundled_templates(backend_class):
+    invoice_html, proforma_html = Command().get_html_documents(2, 3)
+
+    for html in (invoice_html, proforma_html):
+        pdf_file_object, error = backend_class().render(html)
+
+        assert not error
+        assert pdf_file_object.getvalue().startswith(b'%PDF')
+
+
+def test_reportlab_backend_renders_the_document_content():
+    invoice_html, = Command().get_html_documents(1, 2)
+
+    pdf_file_object, error = ReportLabBackend().render(invoice_html)
+    text = PdfFileReader(pdf_file_object).getPage(0).extractText()
+
+    assert not error
+    for content in ('invoice IS-1', 'Customer SRL', 'Entry 2 of invoice 1', '29.75 USD'):
+        assert content in text
+
+
+def test_reportlab_backend_renders_nested_tables_and_spans():
+    html = '<html><body><h1>Title</h1><hr color="#86ba49" size="0.5mm">' \
+           '<table><tr><td width="30%">a <strong>b</strong><br>c</td>' \
+           '<td><table><tr><td colspan="2">nested</td></tr><tr><td>x</td><td>y</td></tr>' \
+           '</table></td></tr></table></body></html>'
+
+    pdf_file_object, error = ReportLabBackend().render(html)
+
+    assert not error
+    assert 'nested' in PdfFileReader(pdf_file_object).getPage(0).extractText()
+
+
+def test_get_pdf_backend_uses_the_setting(settings):
+    assert isinstance(get_pdf_backend(), XHTML2PDFBackend)
+
+    settings.SILVER_PDF_BACKEND = 'silver.pdf_backends.ReportLabBackend'
+
+    assert isinstance(get_pdf_backend(), ReportLabBackend)
+    assert get_pdf_backend() is get_pdf_backend()
+
+    pdf_file_object, error = render_pdf('<html><body><p>text</p></body></html>')
+    assert not error
+    assert pdf_file_object.getvalue().startswith(b'%PDF')
+
+
+def test_pdf_content_hash_depends_on_the_backend(settings):
+    pdf = PDF(upload_path='documents/invoice.pdf')
+    html = '<html><body><p>text</p></body></html>'
+    content_hash = pdf.get_content_hash(html, 'invoice.pdf')
+
+    settings.SILVER_PDF_BACKEND = 'silver.pdf_backends.ReportLabBackend'
+
+    assert pdf.get_content_hash(html, 'invoice.pdf') != content_hash
+
+
+def test_benchmark_pdf_backends_command():
+    output = StringIO()
+
+    call_command('benchmark_pdf_backends', documents=2, entries=2, memory=True,
+                 backends=['silver.pdf_backends.ReportLabBackend'], stdout=output)
+
+    assert output.getvalue().startswith('reportlab: rendered 2 PDFs in ')
+    assert 'peak memory' in output.getvalue()
@@ -0,0 +1,127 @@
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from mock import patch
+from PyPDF2 import PdfFileReader
+from reportlab.pdfgen.canvas import Canvas
+
+from silver.fixtures.factories import InvoiceFactory, PDFFactory
+from silver.pdf_export import (
+    get_documents_export_storage, get_export_report, iter_documents_pdfs, merge_documents_pdfs,
+    open_pdf_file, stream_documents_pdfs_zip
+)
+from silver.tasks import export_documents_pdfs
+
+
+def _issued_invoices_with_pdfs(count):
+    invoices = []
+    for index in range(count):
+        invoice = InvoiceFactory.create()
+        invoice.issue()
+
+        pdf_file_object = BytesIO()
+        canvas = Canvas(pdf_file_object)
+        canvas.drawString(100, 100, 'Invoice %d' % index)
+        canvas.save()
+        invoice.pdf.upload(pdf_file_object, invoice.get_pdf_filename())
+
+        invoices.append(invoice)
+
+    return invoices
+
+
+def _pages_text(pdf_file):
+    reader = PdfFileReader(pdf_file)
+
+    return [reader.getPage(index).extractText().strip() for index in range(reader.getNumPages())]
+
+
+@pytest.mark.django_db
+def test_iter_documents_pdfs_keeps_the_documents_order(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoices = _issued_invoices_with_pdfs(5)
+    draft_invoice = InvoiceFactory.create()
+
+    def read(document):
+        if document == invoices[1]:
+            raise IOError('unreadable')
+
+        with open_pdf_file(document) as pdf_file:
+            return pdf_file.read()
+
+    results = list(iter_documents_pdfs(invoices + [draft_invoice], read, threads=2))
+
+    assert [document for document, _, _ in results] == invoices
+    assert [content is None for _, content, _ in results] == [False, True, False, False, False]
+    assert isinstance(results[1][2], IOError)
+
+
+@pytest.mark.django_db
+def test_merge_documents_pdfs(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoices = _issued_invoices_with_pdfs(3)
+
+    output_file = BytesIO()
+    merged_documents, errors = merge_documents_pdfs(invoices, output_file, threads=2)
+
+    assert merged_documents == invoices
+    assert not errors
+    assert _pages_text(output_file) == ['Invoice 0', 'Invoice 1', 'Invoice 2']
+
+
+@pytest.mark.django_db
+def test_export_documents_pdfs_task(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoices = _issued_invoices_with_pdfs(2)
+
+    export_documents_pdfs([invoices[1].id, invoices[0].id], 'exports/merged.pdf')
+
+    with get_documents_export_storage().open('exports/merged.pdf', 'rb') as merged_file:
+        assert _pages_text(merged_file) == ['Invoice 1', 'Invoice 0']
+
+
+@pytest.mark.django_db
+def test_export_documents_pdfs_task_report(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoices = _issued_invoices_with_pdfs(2)
+    invoices[1].pdf.upload(BytesIO(b'not a PDF'), invoices[1].get_pdf_filename())
+    # the storage saves the export under another name
+    get_documents_export_storage().save('exports/merged.pdf', BytesIO(b'older export'))
+
+    reports = {}
+    with patch('silver.pdf_export.redis') as redis_mock:
+        redis_mock.set.side_effect = lambda key, value, ex: reports.update({key: value})
+        redis_mock.get.side_effect = reports.get
+
+        assert get_export_report('export') is None
+
+        name = export_documents_pdfs([invoice.id for invoice in invoices], 'exports/merged.pdf',
+                                     'export')
+        report = get_export_report('export')
+
+    assert name != 'exports/merged.pdf'
+    assert report == {'name': name, 'left_out': [invoices[1].series_number]}
+    assert json.loads(reports['silver:pdf-exports:export']) == report
+    assert redis_mock.set.call_args[1] == {'ex': 60 * 60 * 24}
+
+    with get_documents_export_storage().open(name, 'rb') as merged_file:
+        assert _pages_text(merged_file) == ['Invoice 0']
+
+
+@pytest.mark.django_db
+def test_stream_documents_pdfs_zip_deduplicates_names(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoices = [
+        InvoiceFactory.create(series='IS', number=None,
+                              pdf=PDFFactory.create(upload_path='drafts/%d.pdf' % index))
+        for index in range(2)
+    ]
+    for invoice in invoices:
+        invoice.pdf.upload(BytesIO(b'%%PDF %d' % invoice.id), invoice.get_pdf_filename())
+
+    archive = zipfile.ZipFile(BytesIO(b''.join(stream_documents_pdfs_zip(invoices))))
+
+    assert archive.namelist() == ['Invoice_IS-None.pdf', 'Invoice_IS-None_%d.pdf' % invoices[1].id]
+    assert archive.read(archive.namelist()[1]) == b'%%PDF %d' % invoices[1].id
@@ -0,0 +1,254 @@
+import pytest
+
+from mock import MagicMock, patch
+from redis.exceptions import ConnectionError
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from silver.fixtures.factories import AdminUserFactory, InvoiceFactory, ProformaFactory
+from silver.models import PDF
+from silver.models.documents.pdf import render_pdf
+from silver.pdf_rendering import PDFRenderingPool, get_up_to_date_pdf
+
+
+def _issued_documents():
+    invoice = InvoiceFactory.create()
+    invoice.issue()
+    proforma = ProformaFactory.create()
+    proforma.issue()
+
+    return [invoice, proforma]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('processes', [0, 2])
+def test_pool_renders_documents(processes):
+    documents = _issued_documents()
+
+    with PDFRenderingPool(processes=processes) as pool:
+        rendered_documents = pool.render(documents)
+
+    assert [rendered_document.document for rendered_document in rendered_documents] == documents
+    for rendered_document in rendered_documents:
+        assert not rendered_document.error
+        assert rendered_document.render_time > 0
+        assert rendered_document.pdf_file_object.getvalue().startswith(b'%PDF')
+
+
+@pytest.mark.django_db
+def test_pool_generates_pdfs_in_batches(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    documents = _issued_documents()
+
+    with PDFRenderingPool(processes=0, batch_size=1) as pool:
+        rendered_documents = list(pool.generate_pdfs(documents))
+
+    assert len(rendered_documents) == 2
+    for document in documents:
+        document.pdf.refresh_from_db()
+        assert not document.pdf.dirty
+        assert document.pdf.url == settings.MEDIA_URL + document.get_pdf_upload_path()
+
+
+@pytest.mark.django_db
+def test_pool_reports_template_errors(monkeypatch):
+    document = _issued_documents()[0]
+    monkeypatch.setattr(document, 'get_template_context',
+                        lambda state: 1 / 0)
+
+    with PDFRenderingPool(processes=0) as pool:
+        rendered_document, = pool.render([document])
+
+    assert 'ZeroDivisionError' in rendered_document.error
+    assert rendered_document.pdf_file_object is None
+
+
+@pytest.mark.django_db
+def test_generate_pdfs_command(settings, tmpdir, capsys):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    documents = _issued_documents()
+
+    call_command('generate_pdfs', processes=0, verbosity=2)
+
+    output = capsys.readouterr().out
+    assert 'Generated 2 PDFs' in output
+    for document in documents:
+        assert 'with id=%s in' % document.id in output
+
+        document.pdf.refresh_from_db()
+        assert not document.pdf.dirty
+
+
+@pytest.mark.django_db
+def test_generate_pdfs_command_keeps_running_with_the_same_pool(settings, tmpdir, capsys):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    _issued_documents()
+
+    with patch('silver.management.commands.generate_pdfs.time.sleep',
+               side_effect=[None, KeyboardInterrupt]) as sleep_mock, \
+            patch.object(PDFRenderingPool, 'start', autospec=True,
+                         side_effect=PDFRenderingPool.start) as start_mock:
+        call_command('generate_pdfs', processes=0, interval=5)
+
+    assert start_mock.call_count == 1
+    assert sleep_mock.call_count == 2
+    sleep_mock.assert_called_with(5)
+
+    # The dirty PDFs are rendered on the first run only
+    output = capsys.readouterr().out.splitlines()
+    assert [line.split(' in ')[0] for line in output] == \
+        ['Generated 2 PDFs', 'Generated 0 PDFs']
+
+
+@pytest.mark.django_db
+def test_pool_skips_unchanged_pdfs(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    documents = _issued_documents()
+
+    with PDFRenderingPool(processes=0) as pool:
+        list(pool.generate_pdfs(documents))
+
+        for document in documents:
+            document.pdf.mark_as_dirty()
+
+        with patch('silver.pdf_rendering.render_pdf') as render_pdf_mock:
+            rendered_documents = list(pool.generate_pdfs(documents))
+
+    assert not render_pdf_mock.called
+    assert all(rendered_document.unchanged for rendered_document in rendered_documents)
+    for document in documents:
+        document.pdf.refresh_from_db()
+        assert not document.pdf.dirty
+
+
+@pytest.mark.django_db
+def test_get_up_to_date_pdf_renders_dirty_pdfs_under_a_lock(settings, tmpdir, monkeypatch):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoice = _issued_documents()[0]
+    lock_mock = MagicMock()
+    lock_mock.return_value.acquire.return_value = True
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock_mock)
+
+    pdf = get_up_to_date_pdf(invoice)
+
+    assert lock_mock.call_args[0] == ('silver_pdf_%s' % pdf.id, )
+    assert lock_mock.return_value.release.called
+    assert not PDF.objects.get(pk=pdf.pk).dirty
+    assert pdf.url == settings.MEDIA_URL + invoice.get_pdf_upload_path()
+
+    lock_mock.reset_mock()
+    assert get_up_to_date_pdf(invoice) == pdf
+    assert not lock_mock.called
+
+
+@pytest.mark.django_db
+def test_get_up_to_date_pdf_waits_for_a_single_rendering(monkeypatch):
+    invoice = _issued_documents()[0]
+
+    def acquire(**kwargs):
+        # another requester rendered the PDF while this one was waiting for the lock
+        PDF.objects.filter(pk=invoice.pdf.pk).update(dirty=0, pdf_file='rendered.pdf')
+        return True
+
+    lock_mock = MagicMock()
+    lock_mock.return_value.acquire.side_effect = acquire
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock_mock)
+
+    with patch.object(invoice, 'generate_pdf') as generate_pdf_mock:
+        pdf = get_up_to_date_pdf(invoice)
+
+    assert not generate_pdf_mock.called
+    assert pdf.pdf_file.name == 'rendered.pdf'
+
+
+@pytest.mark.django_db
+def test_get_up_to_date_pdf_lock_timeout_and_redis_errors(monkeypatch):
+    invoice = _issued_documents()[0]
+    lock_mock = MagicMock()
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock_mock)
+
+    lock_mock.return_value.acquire.return_value = False
+    with patch.object(invoice, 'generate_pdf') as generate_pdf_mock:
+        assert get_up_to_date_pdf(invoice) == invoice.pdf
+    assert not generate_pdf_mock.called
+
+    lock_mock.return_value.acquire.side_effect = ConnectionError
+    with patch.object(invoice, 'generate_pdf') as generate_pdf_mock:
+        get_up_to_date_pdf(invoice)
+    assert generate_pdf_mock.called
+    assert not lock_mock.return_value.release.called
+
+
+@pytest.mark.django_db
+def test_pdf_views_render_dirty_pdfs(settings, tmpdir, monkeypatch):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoice, proforma = _issued_documents()
+    lock_mock = MagicMock()
+    lock_mock.return_value.acquire.return_value = True
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock_mock)
+
+    client = Client()
+    client.force_login(AdminUserFactory.create())
+
+    response = client.get(reverse('invoice-pdf', kwargs={'invoice_id': invoice.id}))
+    assert response.status_code == 302
+    assert response['Location'] == settings.MEDIA_URL + invoice.get_pdf_upload_path()
+
+    response = client.get(reverse('pdf', kwargs={'pdf_pk': proforma.pdf.pk}))
+    assert response.status_code == 302
+    assert response['Location'] == settings.MEDIA_URL + proforma.get_pdf_upload_path()
+
+    draft_invoice = InvoiceFactory.create()
+    response = client.get(reverse('invoice-pdf', kwargs={'invoice_id': draft_invoice.id}))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_pdf_views_serve_the_existing_pdf_when_rendering_fails(settings, monkeypatch):
+    invoice, proforma = _issued_documents()
+    PDF.objects.filter(pk=invoice.pdf.pk).update(pdf_file='previous.pdf')
+    lock_mock = MagicMock()
+    lock_mock.return_value.acquire.return_value = True
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock_mock)
+    monkeypatch.setattr('silver.models.documents.pdf.render_pdf',
+                        MagicMock(side_effect=Exception('This happened.')))
+
+    client = Client()
+    client.force_login(AdminUserFactory.create())
+
+    response = client.get(reverse('invoice-pdf', kwargs={'invoice_id': invoice.id}))
+    assert response.status_code == 302
+    assert response['Location'] == settings.MEDIA_URL + 'previous.pdf'
+
+    response = client.get(reverse('proforma-pdf', kwargs={'proforma_id': proforma.id}))
+    assert response.status_code == 404
+    assert lock_mock.return_value.release.call_count == 2
+
+
+@pytest.mark.django_db
+def test_pdf_generation_paths_share_the_pdfs_lock(settings, tmpdir, monkeypatch):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    invoice, proforma = _issued_documents()
+
+    # the invoice's PDF is being generated elsewhere
+    def lock(name, **kwargs):
+        lock = MagicMock()
+        lock.acquire.return_value = name != 'silver_pdf_%s' % invoice.pdf.id
+        return lock
+
+    monkeypatch.setattr('silver.models.documents.pdf.redis.lock', lock)
+    render_pdf_mock = MagicMock(wraps=render_pdf)
+    monkeypatch.setattr('silver.models.documents.pdf.render_pdf', render_pdf_mock)
+
+    assert invoice.generate_pdf() is None
+    assert not render_pdf_mock.called
+
+    with PDFRenderingPool(processes=0) as pool:
+        rendered_documents = list(pool.generate_pdfs([invoice, proforma]))
+
+    assert [rendered_document.document for rendered_document in rendered_documents] == \
+        [proforma]
+    assert PDF.objects.get(pk=invoice.pdf.pk).dirty
+    assert not PDF.objects.get(pk=proforma.pdf.pk).dirty
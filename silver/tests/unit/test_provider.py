@@ -0,0 +1,66 @@
+import pytest
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from silver.fixtures.factories import InvoiceFactory, ProformaFactory, ProviderFactory
+from silver.models import Invoice, Proforma
+
+
+@pytest.mark.django_db
+def test_series_change_updates_draft_documents():
+    provider = ProviderFactory.create(invoice_series='OLD', proforma_series='OLDP')
+    draft_invoices = InvoiceFactory.create_batch(2, provider=provider)
+    issued_invoice = InvoiceFactory.create(provider=provider, state=Invoice.STATES.ISSUED)
+    draft_proforma = ProformaFactory.create(provider=provider)
+
+    provider.invoice_series = 'NEW'
+    provider.save()
+
+    assert set(
+        Invoice.objects.filter(pk__in=[invoice.pk for invoice in draft_invoices])
+        .values_list('series', 'number')
+    ) == {('NEW', None)}
+    assert Invoice.objects.get(pk=issued_invoice.pk).series == 'OLD'
+    assert Proforma.objects.get(pk=draft_proforma.pk).series == 'OLDP'
+
+
+@pytest.mark.django_db
+def test_series_change_queries_do_not_depend_on_the_number_of_drafts():
+    provider = ProviderFactory.create()
+
+    def count_queries(series):
+        with CaptureQueriesContext(connection) as queries:
+            provider.invoice_series = series
+            provider.save()
+
+        return len(queries)
+
+    InvoiceFactory.create_batch(2, provider=provider)
+    two_drafts_queries = count_queries('FIRST')
+
+    InvoiceFactory.create_batch(8, provider=provider)
+    assert count_queries('SECOND') == two_drafts_queries
+
+
+@pytest.mark.django_db
+def test_series_change_sends_post_save_for_draft_documents():
+    provider = ProviderFactory.create()
+    draft_invoices = InvoiceFactory.create_batch(3, provider=provider)
+
+    saved_invoices = []
+
+    def receiver(sender, instance, update_fields, **kwargs):
+        saved_invoices.append((instance.pk, instance.series, update_fields))
+
+    post_save.connect(receiver, sender=Invoice)
+    try:
+        provider.invoice_series = 'NEW'
+        provider.save()
+    finally:
+        post_save.disconnect(receiver, sender=Invoice)
+
+    assert sorted(saved_invoices) == [
+        (invoice.pk, 'NEW', frozenset(['series', 'number'])) for invoice in draft_invoices
+    ]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from silver.utils.pdf import StaticAssetCache, fetch_resources, static_asset_cache
+
+
+@pytest.fixture
+def static_dirs(settings, tmpdir):
+    static_root, static_dir = tmpdir.mkdir('static_root'), tmpdir.mkdir('static_dir')
+    settings.STATIC_URL = '/app_static/'
+    settings.STATIC_ROOT = static_root.strpath
+    settings.STATICFILES_DIRS = [static_dir.strpath]
+
+    static_asset_cache.clear()
+    yield static_root, static_dir
+    static_asset_cache.clear()
+
+
+def test_fetch_resources_resolves_static_files(static_dirs):
+    static_root, static_dir = static_dirs
+    static_dir.join('logo.png').write_binary(b'logo')
+
+    assert fetch_resources('/app_static/logo.png', None) == static_dir.join('logo.png').strpath
+
+    static_root.join('logo.png').write_binary(b'collected logo')
+    # the cached entry is still valid
+    assert fetch_resources('/app_static/logo.png', None) == static_dir.join('logo.png').strpath
+
+    static_dir.join('logo.png').remove()
+    assert fetch_resources('/app_static/logo.png', None) == static_root.join('logo.png').strpath
+
+
+def test_fetch_resources_does_not_probe_cached_paths_again(static_dirs, monkeypatch):
+    static_root, static_dir = static_dirs
+    static_dir.join('font.ttf').write_binary(b'font')
+
+    fetch_resources('/app_static/font.ttf', None)
+
+    stat_calls = []
+    original_stat = os.stat
+
+    def stat(path, *args, **kwargs):
+        stat_calls.append(path)
+        return original_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr('silver.utils.pdf.os.stat', stat)
+    for _ in range(10):
+        assert fetch_resources('/app_static/font.ttf', None) == \
+            static_dir.join('font.ttf').strpath
+
+    assert stat_calls == [static_dir.join('font.ttf').strpath] * 10
+
+
+def test_fetch_resources_keeps_missing_files_paths(static_dirs):
+    static_root, static_dir = static_dirs
+
+    assert fetch_resources('/app_static/missing.png', None) == \
+        static_dir.join('missing.png').strpath
+    assert fetch_resources('http://example.com/logo.png', None) == 'http://example.com/logo.png'
+
+
+def test_cache_finds_files_added_after_a_miss(tmpdir):
+    cache = StaticAssetCache()
+
+    assert cache.get_path('style.css', [tmpdir.strpath]) is None
+
+    tmpdir.join('style.css').write_binary(b'style')
+
+    assert cache.get_path('style.css', [tmpdir.strpath]) == tmpdir.join('style.css').strpath
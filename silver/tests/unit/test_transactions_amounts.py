@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from silver.fixtures.factories import (
+    DocumentEntryFactory, InvoiceFactory, PaymentMethodFactory, TransactionFactory
+)
+from silver.models import BillingDocumentBase, Invoice, Proforma, Transaction
+from silver.models.documents.base import bulk_create_transactions_for_documents
+
+
+def _amounts(document):
+    return (document.amount_paid_in_transaction_currency,
+            document.amount_pending_in_transaction_currency,
+            document.amount_to_be_charged_in_transaction_currency)
+
+
+@pytest.fixture
+def invoice():
+    invoice = InvoiceFactory.create(invoice_entries=[DocumentEntryFactory(quantity=1,
+                                                                          unit_price=100)])
+    invoice.issue()
+
+    payment_method = PaymentMethodFactory.create(customer=invoice.customer)
+    for state, amount in [(Transaction.States.Settled, 10), (Transaction.States.Pending, 20),
+                          (Transaction.States.Initial, 30), (Transaction.States.Failed, 40)]:
+        TransactionFactory.create(invoice=invoice, payment_method=payment_method,
+                                  amount=amount, state=state)
+
+    return invoice
+
+
+@pytest.mark.django_db
+def test_transactions_amounts_are_computed_with_a_single_query(invoice):
+    invoice = Invoice.objects.get(id=invoice.id)
+    invoice.total_in_transaction_currency
+
+    with CaptureQueriesContext(connection) as queries:
+        assert invoice.get_transactions_amounts() == {
+            'settled_transactions_amount': Decimal('10.00'),
+            'pending_transactions_amount': Decimal('20.00'),
+            'chargeable_transactions_amount': Decimal('60.00'),
+        }
+
+    assert len(queries) == 1
+    assert _amounts(invoice) == (Decimal('10.00'), Decimal('20.00'),
+                                 invoice.total_in_transaction_currency - Decimal('60.00'))
+
+
+@pytest.mark.django_db
+def test_annotated_transactions_amounts(invoice):
+    proforma = invoice.related_document
+    expected_amounts = {invoice.id: _amounts(Invoice.objects.get(id=invoice.id)),
+                        proforma.id: _amounts(Proforma.objects.get(id=proforma.id))}
+
+    documents = list(BillingDocumentBase.objects.filter(
+        id__in=expected_amounts.keys()
+    ).with_transactions_amounts())
+
+    with CaptureQueriesContext(connection) as queries:
+        assert {document.id: _amounts(document) for document in documents} == expected_amounts
+
+    assert len(queries) == 0
+
+
+@pytest.mark.django_db
+def test_annotated_transactions_amounts_are_invalidated_by_bulk_created_transactions(invoice):
+    invoice = Invoice.objects.with_transactions_amounts().get(id=invoice.id)
+    payment_method = invoice.transactions.first().payment_method
+    amount_to_be_charged = invoice.amount_to_be_charged_in_transaction_currency
+
+    transactions = bulk_create_transactions_for_documents(
+        [invoice], {invoice.customer_id: [payment_method]}
+    )
+
+    assert [transaction.amount for transaction in transactions] == [amount_to_be_charged]
+    assert invoice.amount_to_be_charged_in_transaction_currency == Decimal('0.00')
+
+
+@pytest.mark.django_db
+def test_settling_a_transaction_of_an_annotated_document_pays_it(invoice):
+    invoice = Invoice.objects.with_transactions_amounts().get(id=invoice.id)
+    payment_method = invoice.transactions.first().payment_method
+
+    transaction = TransactionFactory.create(
+        invoice=invoice, proforma=invoice.related_document, payment_method=payment_method,
+        amount=invoice.amount_to_be_charged_in_transaction_currency,
+        state=Transaction.States.Pending
+    )
+    transaction.settle()
+    transaction.save()
+
+    assert invoice.state == Invoice.STATES.PAID
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+import pytest
+
+from mock import MagicMock
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from silver.fixtures.factories import (
+    CustomerFactory, DocumentEntryFactory, InvoiceFactory, PaymentMethodFactory,
+    ProformaFactory, TransactionFactory
+)
+from silver.fixtures.test_fixtures import triggered_processor
+from silver.models import Invoice, Proforma, Transaction
+from silver.models.documents.base import create_transaction_for_document
+
+
+def _issued_invoice(customer, transaction_currency='USD'):
+    return InvoiceFactory.create(
+        customer=customer, transaction_currency=transaction_currency,
+        transaction_xe_rate=Decimal('1.0'), state=Invoice.STATES.ISSUED,
+        invoice_entries=[DocumentEntryFactory(quantity=1, unit_price=100)]
+    )
+
+
+@pytest.mark.django_db
+def test_verifying_a_payment_method_creates_the_transactions_in_bulk():
+    customer = CustomerFactory.create()
+    invoices = [_issued_invoice(customer) for _ in range(10)]
+    proforma = ProformaFactory.create(customer=customer, transaction_currency='USD',
+                                      transaction_xe_rate=Decimal('1.0'),
+                                      state=Proforma.STATES.ISSUED)
+    # Not allowed by the triggered processor
+    eur_invoice = _issued_invoice(customer, transaction_currency='EUR')
+
+    payment_method = PaymentMethodFactory.create(payment_processor=triggered_processor,
+                                                 customer=customer, verified=False)
+    TransactionFactory.create(invoice=invoices[0], payment_method=payment_method,
+                              amount=invoices[0].total_in_transaction_currency / 4,
+                              state=Transaction.States.Settled)
+
+    receiver = MagicMock()
+    post_save.connect(receiver, sender=Transaction)
+    try:
+        payment_method.verified = True
+        with CaptureQueriesContext(connection) as queries:
+            payment_method.save()
+    finally:
+        post_save.disconnect(receiver, sender=Transaction)
+
+    assert len(queries) < 20
+    assert receiver.call_count == 11
+    assert all(call[1]['created'] and call[1]['instance'].pk
+               for call in receiver.call_args_list)
+
+    initial_transactions = Transaction.objects.filter(payment_method=payment_method,
+                                                      state=Transaction.States.Initial)
+    assert {(transaction.invoice_id, transaction.proforma_id, transaction.amount)
+            for transaction in initial_transactions} == \
+        {(invoices[0].id, invoices[0].related_document_id,
+          invoices[0].total_in_transaction_currency * 3 / 4)} | \
+        {(invoice.id, invoice.related_document_id, invoice.total_in_transaction_currency)
+         for invoice in invoices[1:]} | \
+        {(None, proforma.id, proforma.total_in_transaction_currency)}
+    assert not eur_invoice.transactions.exists()
+
+
+@pytest.mark.django_db
+def test_create_transaction_for_document_picks_a_usable_payment_method():
+    customer = CustomerFactory.create()
+    invoice = _issued_invoice(customer, transaction_currency='EUR')
+    payment_methods = [
+        PaymentMethodFactory.create(payment_processor=triggered_processor, customer=customer),
+        PaymentMethodFactory.create(customer=customer),
+    ]
+
+    transaction = create_transaction_for_document(invoice, payment_methods)
+
+    assert transaction.pk
+    assert transaction.payment_method == payment_methods[1]
+    assert transaction.amount == invoice.total_in_transaction_currency
+    assert transaction.currency == 'EUR'
+
+    assert not create_transaction_for_document(invoice, payment_methods[:1])
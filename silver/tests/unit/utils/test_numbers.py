@@ -0,0 +1,143 @@
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from silver.utils.numbers import (
+    as_fraction, div_round_half_even, from_minor_units, multiply_to_minor_units, quantize_fraction,
+    quantize_product, to_minor_units
+)
+
+
+def legacy_quantize_fraction(f: Fraction, decimals=4) -> Decimal:
+    return (Decimal(f.numerator) / Decimal(f.denominator)).quantize(Decimal(f".{'0'*decimals}"))
+
+
+# Golden corpus, generated with the string based Fraction arithmetic previously used when billing:
+# - plan: quantize_fraction(Fraction(str(plan.amount)) * proration_fraction)
+# - discount: quantize_fraction(Fraction(str(discount.as_additive)) * Fraction(str(entry.amount)) * fraction)
+PRICES_CORPUS = [
+    ('plan', '10.00', None, Fraction(29, 366), '0.7923'),
+    ('plan', '10.00', None, Fraction(17, 28), '6.0714'),
+    ('plan', '10.00', None, Fraction(1, 3), '3.3333'),
+    ('plan', '99.99', None, Fraction(1, 1), '99.9900'),
+    ('plan', '99.99', None, Fraction(45, 92), '48.9082'),
+    ('plan', '99.99', None, Fraction(2, 7), '28.5686'),
+    ('plan', '0.01', None, Fraction(17, 28), '0.0061'),
+    ('plan', '0.01', None, Fraction(13, 31), '0.0042'),
+    ('plan', '0.01', None, Fraction(2, 7), '0.0029'),
+    ('plan', '1234.5678', None, Fraction(1, 1), '1234.5678'),
+    ('plan', '1234.5678', None, Fraction(2, 7), '352.7337'),
+    ('plan', '1234.5678', None, Fraction(17, 28), '749.5590'),
+    ('plan', '0.0005', None, Fraction(1, 1), '0.0005'),
+    ('plan', '0.0005', None, Fraction(45, 92), '0.0002'),
+    ('plan', '0.0005', None, Fraction(1, 3), '0.0002'),
+    ('plan', '0.0015', None, Fraction(1, 2), '0.0008'),
+    ('plan', '0.0015', None, Fraction(1, 1), '0.0015'),
+    ('plan', '0.0015', None, Fraction(17, 28), '0.0009'),
+    ('plan', '-12.34', None, Fraction(17, 28), '-7.4921'),
+    ('plan', '-12.34', None, Fraction(2, 7), '-3.5257'),
+    ('plan', '-12.34', None, Fraction(1, 3), '-4.1133'),
+    ('plan', '150', None, Fraction(1, 1), '150.0000'),
+    ('plan', '150', None, Fraction(1, 2), '75.0000'),
+    ('plan', '150', None, Fraction(2, 7), '42.8571'),
+    ('plan', '7.77', None, Fraction(17, 28), '4.7175'),
+    ('plan', '7.77', None, Fraction(45, 92), '3.8005'),
+    ('plan', '7.77', None, Fraction(29, 366), '0.6157'),
+    ('plan', '100000.00', None, Fraction(1, 1), '100000.0000'),
+    ('plan', '100000.00', None, Fraction(2, 7), '28571.4286'),
+    ('plan', '100000.00', None, Fraction(1, 2), '50000.0000'),
+    ('discount', '10.00', '0.01', Fraction(1, 3), '0.0003'),
+    ('discount', '10.00', '25.00', Fraction(1, 1), '2.5000'),
+    ('discount', '99.99', '99.99', Fraction(2, 7), '28.5657'),
+    ('discount', '99.99', '33.33', Fraction(1, 2), '16.6633'),
+    ('discount', '0.01', '33.33', Fraction(17, 28), '0.0020'),
+    ('discount', '0.01', '99.99', Fraction(2, 7), '0.0029'),
+    ('discount', '1234.5678', '99.99', Fraction(17, 28), '749.4841'),
+    ('discount', '1234.5678', '33.33', Fraction(1, 3), '137.1605'),
+    ('discount', '0.0005', '10', Fraction(17, 28), '0.0000'),
+    ('discount', '0.0005', '25.00', Fraction(1, 1), '0.0001'),
+    ('discount', '0.0015', '99.99', Fraction(45, 92), '0.0007'),
+    ('discount', '0.0015', '33.33', Fraction(1, 2), '0.0002'),
+    ('discount', '-12.34', '10', Fraction(45, 92), '-0.6036'),
+    ('discount', '-12.34', '0.01', Fraction(29, 366), '-0.0001'),
+    ('discount', '150', '10', Fraction(13, 31), '6.2903'),
+    ('discount', '150', '33.33', Fraction(1, 3), '16.6650'),
+    ('discount', '7.77', '25.00', Fraction(2, 7), '0.5550'),
+    ('discount', '7.77', '99.99', Fraction(45, 92), '3.8002'),
+    ('discount', '100000.00', '10', Fraction(2, 7), '2857.1429'),
+    ('discount', '100000.00', '0.01', Fraction(17, 28), '6.0714'),
+]
+
+# (included_units, proration_fraction, bonus amount, bonus amount_percentage, bonus_proration_fraction, result)
+INCLUDED_UNITS_CORPUS = [
+    ('100.0000', Fraction(17, 28), '10.0000', None, Fraction(1, 1), '70.7143'),
+    ('100.0000', Fraction(17, 28), None, '25.00', Fraction(13, 31), '67.0795'),
+    ('0.0000', Fraction(1, 1), '5.5000', None, Fraction(2, 7), '1.5714'),
+    ('33.3333', Fraction(1, 3), None, '33.33', Fraction(1, 3), '12.3455'),
+    ('1000.0000', Fraction(29, 366), '0.0001', None, Fraction(45, 92), '79.2350'),
+    ('7.0000', Fraction(1, 2), None, '50.00', Fraction(1, 1), '5.2500'),
+]
+
+
+@pytest.mark.parametrize("kind, amount, percentage, fraction, expected", PRICES_CORPUS)
+def test_quantize_product_golden_corpus(kind, amount, percentage, fraction, expected):
+    factors = [Decimal(amount), fraction]
+    if percentage:
+        factors.append(Decimal(percentage) / Decimal(100))
+
+    result = quantize_product(*factors)
+
+    assert str(result) == expected
+    assert from_minor_units(multiply_to_minor_units(*factors)) == result
+
+
+@pytest.mark.parametrize("included_units, fraction, amount, percentage, bonus_fraction, expected",
+                         INCLUDED_UNITS_CORPUS)
+def test_included_units_golden_corpus(included_units, fraction, amount, percentage, bonus_fraction, expected):
+    included = fraction * as_fraction(Decimal(included_units))
+    bonus = as_fraction(Decimal(amount)) if amount else as_fraction(Decimal(percentage)) / 100 * included
+
+    assert str(quantize_fraction(included + bonus * bonus_fraction)) == expected
+
+
+def test_quantize_fraction_matches_legacy_implementation():
+    rng = random.Random(42)
+
+    for _ in range(5000):
+        fraction = Fraction(rng.randint(-10 ** 9, 10 ** 9), rng.randint(1, 10 ** 6))
+        decimals = rng.choice([2, 4])
+
+        assert quantize_fraction(fraction, decimals) == legacy_quantize_fraction(fraction, decimals)
+        assert str(quantize_fraction(fraction, decimals)) == str(legacy_quantize_fraction(fraction, decimals))
+
+
+def test_div_round_half_even():
+    assert div_round_half_even(5, 2) == 2
+    assert div_round_half_even(7, 2) == 4
+    assert div_round_half_even(-5, 2) == -2
+    assert div_round_half_even(-7, 2) == -4
+    assert div_round_half_even(5, -2) == -2
+    assert div_round_half_even(1, 3) == 0
+    assert div_round_half_even(2, 3) == 1
+
+
+def test_minor_units_round_trip():
+    assert to_minor_units(Decimal('12.3456')) == 123456
+    assert to_minor_units(Decimal('0.00005')) == 0
+    assert to_minor_units(Decimal('0.00015')) == 2
+    assert to_minor_units(Fraction(1, 3), decimals=2) == 33
+    assert to_minor_units(0.1) == 1000
+
+    assert from_minor_units(123456) == Decimal('12.3456')
+    assert str(from_minor_units(0)) == '0.0000'
+    assert str(from_minor_units(-5, decimals=2)) == '-0.05'
+
+
+def test_as_fraction_does_not_lose_precision():
+    assert as_fraction(Decimal('0.1')) == Fraction(1, 10)
+    assert as_fraction(Decimal('1234567890.123456789')) == Fraction('1234567890.123456789')
+
+    with pytest.raises(TypeError):
+        as_fraction('1.0')
@@ -0,0 +1,118 @@
+# Copyright (c) 2024 Pressinfra SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from django.conf import settings
+
+
+# The Fernet tokens start with the version byte (0x80), followed by a 64 bits timestamp
+FERNET_TOKEN_PREFIX = 'gAAAAA'
+
+
+@lru_cache(maxsize=16)
+def _get_fernet(key):
+    return Fernet(key)
+
+
+@lru_cache(maxsize=16)
+def _get_multi_fernet(keys):
+    return MultiFernet([_get_fernet(key) for key in keys])
+
+
+def get_payment_method_secrets():
+    """
+    :returns: the PAYMENT_METHOD_SECRET, used for encrypting, followed by the
+        PAYMENT_METHOD_OLD_SECRETS, which can still be used for decrypting.
+    """
+
+    return (settings.PAYMENT_METHOD_SECRET,) + tuple(
+        getattr(settings, 'PAYMENT_METHOD_OLD_SECRETS', ())
+    )
+
+
+def get_payment_method_cipher():
+    """
+    :returns: a MultiFernet of the payment methods' secrets, built once per set of secrets.
+    """
+
+    return _get_multi_fernet(get_payment_method_secrets())
+
+
+def looks_encrypted(value):
+    return isinstance(value, str) and value.startswith(FERNET_TOKEN_PREFIX)
+
+
+def iter_encrypted_values(data):
+    """
+    :returns: a generator of the (possibly nested) values of a payment method's data that look
+        like Fernet tokens.
+    """
+
+    values = data.values() if isinstance(data, dict) else data
+    for value in values:
+        if looks_encrypted(value):
+            yield value
+        elif isinstance(value, (dict, list)):
+            yield from iter_encrypted_values(value)
+
+
+def rotate_encrypted_data(data):
+    """
+    Re-encrypts the data's values encrypted with one of the PAYMENT_METHOD_OLD_SECRETS, using
+    the PAYMENT_METHOD_SECRET. The values which are not encrypted with one of the secrets are
+    left as they are.
+
+    :returns: a (rotated data, number of rotated values) tuple.
+    """
+
+    primary_fernet = _get_fernet(settings.PAYMENT_METHOD_SECRET)
+    cipher = get_payment_method_cipher()
+    rotated_values = 0
+
+    def rotate(value):
+        nonlocal rotated_values
+
+        if isinstance(value, dict):
+            return {key: rotate(item) for key, item in value.items()}
+
+        if isinstance(value, list):
+            return [rotate(item) for item in value]
+
+        if not looks_encrypted(value):
+            return value
+
+        token = value.encode('utf-8')
+        try:
+            primary_fernet.decrypt(token)
+        except InvalidToken:
+            pass
+        else:
+            return value
+
+        try:
+            rotated_value = cipher.rotate(token).decode('utf-8')
+        except InvalidToken:
+            return value
+
+        rotated_values += 1
+        return rotated_value
+
+    rotated_data = rotate(data)
+
+    return rotated_data, rotated_values
@@ -14,7 +14,15 @@
 
 from __future__ import absolute_import
 
+from collections import defaultdict
+from typing import FrozenSet, Iterable, List
+
+from django.apps import apps
 from django.db import models
+from django.db.models import Func, Q, Value
+from django.db.models.functions import Cast
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 
@@ -27,6 +35,35 @@ class AutoDateTimeField(models.DateTimeField):
         return timezone.now()
 
 
+class RoundHalfEven(Func):
+    """
+    Rounds a decimal expression to an integral value, half to even, since the databases' ROUND
+    rounds half away from zero: a tie is rounded back towards zero when ROUND's result is odd.
+    """
+
+    template = ('(ROUND({x}) - SIGN(ROUND({x}) - {x}) * (1 - ABS(SIGN(ABS(ROUND({x}) - {x}) - 0.5))) * '
+                'ABS(MOD(ROUND({x}), 2)))')
+    output_field = models.DecimalField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+
+        return self.template.format(x=sql), tuple(params) * self.template.count('{x}')
+
+
+def to_minor_units_expression(expression, decimals):
+    """
+    :returns: the SQL counterpart of `silver.utils.numbers.to_minor_units`, for a decimal
+        expression. The arithmetic is done in DECIMAL, where it can't overflow, and only the
+        rounded result is cast to an integer.
+    """
+
+    scaled = models.ExpressionWrapper(expression * Value(10 ** decimals),
+                                      output_field=models.DecimalField())
+
+    return Cast(RoundHalfEven(scaled), models.BigIntegerField())
+
+
 class AutoCleanModelMixin:
     def _init_states(self):
         self.initial_state = self.current_state
@@ -106,3 +143,260 @@ class AutoCleanModelMixin:
         super().full_clean(*args, **kwargs)
 
         self.is_cleaned = True
+
+
+class FilterSetsMixin:
+    """
+    Exposes the `filter_*` many-to-many relations (used by Discounts and Bonuses to restrict
+    what they apply to) as cached frozensets of primary keys, so that matching is done in memory.
+    """
+
+    FILTER_FIELDS = ('filter_customers', 'filter_subscriptions', 'filter_plans', 'filter_product_codes')
+
+    @property
+    def _filter_ids_cache(self):
+        return self.__dict__.setdefault('_filter_ids', {})
+
+    def _get_filter_ids(self, field_name) -> FrozenSet:
+        cache = self._filter_ids_cache
+
+        if field_name not in cache:
+            prefetched = getattr(self, '_prefetched_objects_cache', {})
+            manager = getattr(self, field_name)
+
+            if field_name in prefetched:
+                cache[field_name] = frozenset(obj.pk for obj in manager.all())
+            else:
+                cache[field_name] = frozenset(manager.values_list('pk', flat=True))
+
+        return cache[field_name]
+
+    def invalidate_filter_ids(self):
+        self.__dict__.pop('_filter_ids', None)
+
+    @property
+    def filter_customer_ids(self) -> FrozenSet:
+        return self._get_filter_ids('filter_customers')
+
+    @property
+    def filter_subscription_ids(self) -> FrozenSet:
+        return self._get_filter_ids('filter_subscriptions')
+
+    @property
+    def filter_plan_ids(self) -> FrozenSet:
+        return self._get_filter_ids('filter_plans')
+
+    @property
+    def filter_product_code_ids(self) -> FrozenSet:
+        return self._get_filter_ids('filter_product_codes')
+
+    @classmethod
+    def prefetch_filters(cls, instances: Iterable) -> List:
+        """
+        Populates the filter ids of all the given instances using one query per filter relation.
+
+        :returns: the instances, as a list.
+        """
+
+        instances = list(instances)
+
+        instances_by_pk = defaultdict(list)
+        for instance in instances:
+            instances_by_pk[instance.pk].append(instance)
+
+        if not instances_by_pk:
+            return instances
+
+        for field_name in cls.FILTER_FIELDS:
+            field = cls._meta.get_field(field_name)
+            through = field.remote_field.through
+            source_attname = through._meta.get_field(field.m2m_field_name()).attname
+            target_attname = through._meta.get_field(field.m2m_reverse_field_name()).attname
+
+            ids = defaultdict(set)
+            rows = through.objects.filter(
+                **{f'{source_attname}__in': list(instances_by_pk.keys())}
+            ).values_list(source_attname, target_attname)
+
+            for source_id, target_id in rows:
+                ids[source_id].add(target_id)
+
+            for pk, pk_instances in instances_by_pk.items():
+                for instance in pk_instances:
+                    instance._filter_ids_cache[field_name] = frozenset(ids[pk])
+
+        return instances
+
+    def matches_subscription(self, subscription, product_code_ids: FrozenSet) -> bool:
+        """
+        In memory equivalent of `matching_subscriptions()`, for a single subscription.
+
+        :param product_code_ids: the ids of the product codes of the subscription's plan and
+            of the plan's metered features.
+        """
+
+        if self.filter_subscription_ids and subscription.pk not in self.filter_subscription_ids:
+            return False
+
+        if self.filter_customer_ids and subscription.customer_id not in self.filter_customer_ids:
+            return False
+
+        if self.filter_plan_ids and subscription.plan_id not in self.filter_plan_ids:
+            return False
+
+        if self.filter_product_code_ids and not self.filter_product_code_ids & product_code_ids:
+            return False
+
+        return True
+
+    @classmethod
+    def _matched_subscriptions_through(cls):
+        field = cls._meta.get_field('matched_subscriptions')
+        through = field.remote_field.through
+
+        return (
+            through,
+            through._meta.get_field(field.m2m_field_name()).attname,
+            through._meta.get_field(field.m2m_reverse_field_name()).attname,
+        )
+
+    def refresh_matched_subscriptions(self):
+        """
+        Brings the materialized `matched_subscriptions` relation up to date with the
+        `matching_subscriptions()` query.
+        """
+
+        through, source_attname, target_attname = self._matched_subscriptions_through()
+
+        matching_ids = set(self.matching_subscriptions().values_list('pk', flat=True))
+        matched_ids = set(
+            through.objects.filter(**{source_attname: self.pk}).values_list(target_attname, flat=True)
+        )
+
+        removed_ids = matched_ids - matching_ids
+        if removed_ids:
+            through.objects.filter(**{source_attname: self.pk, f'{target_attname}__in': removed_ids}).delete()
+
+        through.objects.bulk_create([
+            through(**{source_attname: self.pk, target_attname: subscription_id})
+            for subscription_id in matching_ids - matched_ids
+        ])
+
+    @classmethod
+    def _candidates_for_subscriptions(cls, subscriptions, product_code_ids):
+        """
+        Narrows down the instances which may match any of the given subscriptions: each of their
+        filters is either empty or holds one of the subscriptions' values.
+        """
+
+        values = {
+            'filter_subscriptions': set(subscription.pk for subscription in subscriptions),
+            'filter_customers': set(subscription.customer_id for subscription in subscriptions),
+            'filter_plans': set(subscription.plan_id for subscription in subscriptions),
+            'filter_product_codes': product_code_ids,
+        }
+
+        queryset = cls.objects.all()
+        for field_name in cls.FILTER_FIELDS:
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__isnull': True}) | Q(**{f'{field_name}__in': values[field_name]})
+            )
+
+        return queryset.distinct()
+
+    @classmethod
+    def refresh_matches_for_subscriptions(cls, subscriptions):
+        """
+        Brings the materialized `matched_subscriptions` relation up to date for the given
+        subscriptions, across all the instances of this model.
+        """
+
+        subscriptions = list(subscriptions)
+        if not subscriptions:
+            return
+
+        through, source_attname, target_attname = cls._matched_subscriptions_through()
+
+        MeteredFeature = apps.get_model('silver.MeteredFeature')
+        plan_ids = set(subscription.plan_id for subscription in subscriptions)
+
+        product_code_ids = defaultdict(set)
+        for plan_id, product_code_id in MeteredFeature.objects.filter(
+            plan__in=plan_ids
+        ).values_list('plan', 'product_code'):
+            product_code_ids[plan_id].add(product_code_id)
+
+        Plan = apps.get_model('silver.Plan')
+        for plan_id, product_code_id in Plan.objects.filter(id__in=plan_ids).values_list('id', 'product_code'):
+            product_code_ids[plan_id].add(product_code_id)
+
+        instances = cls.prefetch_filters(cls._candidates_for_subscriptions(
+            subscriptions, set().union(*product_code_ids.values())
+        ))
+
+        matching = set(
+            (instance.pk, subscription.pk)
+            for subscription in subscriptions
+            for instance in instances
+            if instance.matches_subscription(subscription, frozenset(product_code_ids[subscription.plan_id]))
+        )
+
+        matched = set(through.objects.filter(
+            **{f'{target_attname}__in': [subscription.pk for subscription in subscriptions]}
+        ).values_list(source_attname, target_attname))
+
+        removed = defaultdict(set)
+        for instance_id, subscription_id in matched - matching:
+            removed[instance_id].add(subscription_id)
+
+        for instance_id, subscription_ids in removed.items():
+            through.objects.filter(**{source_attname: instance_id, f'{target_attname}__in': subscription_ids}).delete()
+
+        through.objects.bulk_create([
+            through(**{source_attname: instance_id, target_attname: subscription_id})
+            for instance_id, subscription_id in matching - matched
+        ])
+
+
+def filter_sets_models():
+    return [model for model in apps.get_app_config('silver').get_models() if issubclass(model, FilterSetsMixin)]
+
+
+def _filter_field_name(model, through):
+    for field_name in model.FILTER_FIELDS:
+        if model._meta.get_field(field_name).remote_field.through is through:
+            return field_name
+
+    return None
+
+
+@receiver(m2m_changed)
+def invalidate_filter_ids(sender, instance, **kwargs):
+    if isinstance(instance, FilterSetsMixin) and kwargs.get('action', '').startswith('post_'):
+        instance.invalidate_filter_ids()
+
+
+@receiver(m2m_changed)
+def refresh_matched_subscriptions_on_filters_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if isinstance(instance, FilterSetsMixin) and _filter_field_name(type(instance), sender):
+            instance.refresh_matched_subscriptions()
+
+        return
+
+    if not (issubclass(model, FilterSetsMixin) and _filter_field_name(model, sender)):
+        return
+
+    # The affected instances are not known after a reverse clear
+    queryset = model.objects.all() if action == 'post_clear' else model.objects.filter(pk__in=pk_set)
+    for filtering_instance in queryset:
+        filtering_instance.refresh_matched_subscriptions()
+
+
+@receiver(post_save)
+def refresh_matched_subscriptions_on_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and isinstance(instance, FilterSetsMixin):
+        instance.refresh_matched_subscriptions()
@@ -1,6 +1,85 @@
+"""
+Money and quantity arithmetic on scaled integers.
+
+Amounts and quantities are handled as an integer number of minor units (10 ** -decimals),
+while intermediary products (prices, percentages, proration fractions) are kept as exact
+integer ratios. Rounding only happens once, when converting back to minor units, and it is
+always ROUND_HALF_EVEN, the same rounding `quantize_fraction` has always used.
+"""
+
 from decimal import Decimal
 from fractions import Fraction
+from typing import Tuple, Union
+
+DEFAULT_DECIMALS = 4
+
+Number = Union[int, float, Decimal, Fraction]
+
+
+def as_ratio(value: Number) -> Tuple[int, int]:
+    """
+    :returns: the exact (numerator, denominator) pair of the given value, without going
+        through its string representation.
+    """
+
+    if isinstance(value, int):
+        return value, 1
+
+    if isinstance(value, Fraction):
+        return value.numerator, value.denominator
+
+    if isinstance(value, Decimal):
+        return value.as_integer_ratio()
+
+    if isinstance(value, float):
+        # Floats are taken at their shortest representation, e.g. 0.1 is 1/10
+        return Decimal(repr(value)).as_integer_ratio()
+
+    raise TypeError(f"Unsupported number type: {type(value).__name__}.")
+
+
+def as_fraction(value: Number) -> Fraction:
+    return Fraction(*as_ratio(value))
+
+
+def div_round_half_even(numerator: int, denominator: int) -> int:
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+
+    quotient, remainder = divmod(numerator, denominator)
+
+    double_remainder = 2 * remainder
+    if double_remainder > denominator or (double_remainder == denominator and quotient % 2):
+        quotient += 1
+
+    return quotient
+
+
+def to_minor_units(value: Number, decimals=DEFAULT_DECIMALS) -> int:
+    numerator, denominator = as_ratio(value)
+
+    return div_round_half_even(numerator * 10 ** decimals, denominator)
+
+
+def from_minor_units(units: int, decimals=DEFAULT_DECIMALS) -> Decimal:
+    return Decimal(units).scaleb(-decimals)
+
+
+def multiply_to_minor_units(*factors: Number, decimals=DEFAULT_DECIMALS) -> int:
+    numerator, denominator = 10 ** decimals, 1
+
+    for factor in factors:
+        factor_numerator, factor_denominator = as_ratio(factor)
+
+        numerator *= factor_numerator
+        denominator *= factor_denominator
+
+    return div_round_half_even(numerator, denominator)
+
+
+def quantize_product(*factors: Number, decimals=DEFAULT_DECIMALS) -> Decimal:
+    return from_minor_units(multiply_to_minor_units(*factors, decimals=decimals), decimals)
 
 
-def quantize_fraction(f: Fraction, decimals=4) -> Decimal:
-    return (Decimal(f.numerator) / Decimal(f.denominator)).quantize(Decimal(f".{'0'*decimals}"))
+def quantize_fraction(f: Fraction, decimals=DEFAULT_DECIMALS) -> Decimal:
+    return from_minor_units(to_minor_units(f, decimals), decimals)
@@ -23,23 +23,93 @@ class UnsupportedMediaPathException(Exception):
     pass
 
 
+class StaticAssetCache(object):
+    """
+    A process-level cache of the resolved paths of the local assets used by the PDF templates
+    (fonts, logos, stylesheets). An entry is checked with a single `os.stat` of its path and
+    dropped when the file was modified or removed, instead of probing every static directory
+    for every rendered document.
+    """
+
+    def __init__(self):
+        # {(relative path, search directories): (path, (mtime, size))}
+        self._entries = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _get_stamp(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get_entry(self, relative_path, directories):
+        key = (relative_path, directories)
+
+        entry = self._entries.get(key)
+        if entry and self._get_stamp(entry[0]) == entry[1]:
+            return entry
+
+        for directory in directories:
+            path = os.path.join(directory, relative_path)
+            stamp = self._get_stamp(path)
+            if stamp:
+                entry = self._entries[key] = (path, stamp)
+                return entry
+
+        # Missing files aren't cached, so they are found as soon as they are added
+        self._entries.pop(key, None)
+        return None
+
+    def get_path(self, relative_path, directories):
+        """
+        :param relative_path: the asset's path, relative to the directories.
+        :param directories: the directories the asset is searched in, in order.
+        :returns: the path of the first existing file, or None.
+        """
+
+        entry = self._get_entry(relative_path, tuple(directories))
+
+        return entry[0] if entry else None
+
+
+static_asset_cache = StaticAssetCache()
+
+
+def get_resource_directories(uri):
+    """
+    :returns: a (path relative to the directories, directories) tuple for a media or static
+        URI, or None for other URIs.
+    """
+
+    if settings.MEDIA_URL and uri.startswith(settings.MEDIA_URL):
+        return uri.replace(settings.MEDIA_URL, ""), (settings.MEDIA_ROOT, )
+    elif settings.STATIC_URL and uri.startswith(settings.STATIC_URL):
+        return uri.replace(settings.STATIC_URL, ""), (
+            (settings.STATIC_ROOT, ) + tuple(settings.STATICFILES_DIRS)
+        )
+
+    return None
+
+
 def fetch_resources(uri, rel):
     """
     Callback to allow xhtml2pdf/reportlab to retrieve Images,Stylesheets, etc.
     `uri` is the href attribute from the html link element.
     `rel` gives a relative path, but it's not used here.
+    The local files' paths are cached in `static_asset_cache`.
     """
-    if settings.MEDIA_URL and uri.startswith(settings.MEDIA_URL):
-        path = os.path.join(settings.MEDIA_ROOT,
-                            uri.replace(settings.MEDIA_URL, ""))
-    elif settings.STATIC_URL and uri.startswith(settings.STATIC_URL):
-        path = os.path.join(settings.STATIC_ROOT,
-                            uri.replace(settings.STATIC_URL, ""))
-        if not os.path.exists(path):
-            for d in settings.STATICFILES_DIRS:
-                path = os.path.join(d, uri.replace(settings.STATIC_URL, ""))
-                if os.path.exists(path):
-                    break
+    resource = get_resource_directories(uri)
+    if resource:
+        relative_path, directories = resource
+        path = static_asset_cache.get_path(relative_path, directories)
+        if path is None:
+            # Keeps returning the last probed path for missing files
+            path = os.path.join(directories[-1], relative_path)
     elif uri.startswith("http://") or uri.startswith("https://"):
         path = uri
     else:
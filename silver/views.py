@@ -39,19 +39,30 @@ from silver.models.transactions import Transaction
 from silver.models.documents import Proforma, Invoice
 from silver.models.transactions.codes import FAIL_CODES
 from silver.payment_processors import get_instance
+from silver.pdf_rendering import get_up_to_date_pdf
 from silver.utils.decorators import get_transaction_from_token
 
 
 @login_required
 def proforma_pdf(request, proforma_id):
     proforma = get_object_or_404(Proforma, id=proforma_id)
-    return HttpResponseRedirect(proforma.pdf.url)
+
+    pdf = get_up_to_date_pdf(proforma)
+    if not (pdf and pdf.url):
+        raise Http404
+
+    return HttpResponseRedirect(pdf.url)
 
 
 @login_required
 def invoice_pdf(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
-    return HttpResponseRedirect(invoice.pdf.url)
+
+    pdf = get_up_to_date_pdf(invoice)
+    if not (pdf and pdf.url):
+        raise Http404
+
+    return HttpResponseRedirect(pdf.url)
 
 
 @csrf_exempt